@@ -1,6 +1,8 @@
 from fastapi import FastAPI
 
 from .v1.v1 import router as v1_router
+from core.executor import inference_executor
+from core import weights
 from config import import_class
 import os
 config = import_class(os.environ['APP_SETTINGS'])
@@ -29,3 +31,22 @@ def heartbeat():
     route added to act as a probe
     """
     return {"status": "OK"}
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    route exposing the inference executor queue depth and wait times, and the model weights snapshot state
+    """
+    return {"inference": inference_executor.metrics(), "weights": weights.status()}
+
+
+@app.on_event("startup")
+def start_model_config_polling():
+    weights.start_polling()
+
+
+@app.on_event("shutdown")
+def shutdown_background_workers():
+    weights.stop_polling()
+    inference_executor.shutdown()
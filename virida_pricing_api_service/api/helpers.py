@@ -1,4 +1,4 @@
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Callable
 
 from fastapi import Depends, Security, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
@@ -7,6 +7,7 @@ from jwt import ExpiredSignatureError
 
 import crud.api_key
 import security
+from core.executor import inference_executor, InferenceQueueFullException, InferenceTimeoutException
 from core.static import API_RESPONSE_ERROR_CODE_STRING, API_RESPONSE_ERROR_MESSAGE_STRING, \
     get_error_string_by_error_code, USERNAME_REQUIRED, ORGANIZATION_REQUIRED
 from database import DatabaseContextManager
@@ -123,3 +124,27 @@ def authorize_limit_delete(limit_delete: LimitDelete):
     :return:
     """
     authorize_limit_object(limit_delete.limit_type, limit_delete.username, limit_delete.orgname)
+
+
+def _with_own_session(fn: Callable, *args, **kwargs):
+    with DatabaseContextManager() as db:
+        return fn(*args, db=db, **kwargs)
+
+
+async def run_inference(fn: Callable, *args, **kwargs):
+    """
+    Run the blocking pricing function on the inference executor and map its failures to HTTP errors
+
+    :param fn: The synchronous function to run (model forward pass and related database work). It gets its own session
+               as db, opened and closed in the worker thread: a timed out task keeps running after the request's
+               session is closed, so it must not use that one
+    :return: The value returned by fn
+    """
+    try:
+        return await inference_executor.run(_with_own_session, fn, *args, **kwargs)
+    except InferenceQueueFullException as ex:
+        print("[-]", ex)
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "Service is busy right now, please retry later")
+    except InferenceTimeoutException as ex:
+        print("[-]", ex)
+        raise HTTPException(status.HTTP_504_GATEWAY_TIMEOUT, "Pricing took too long to complete")
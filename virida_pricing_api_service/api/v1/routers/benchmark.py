@@ -1,10 +1,12 @@
 import datetime as dt
 from typing import List
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from schemas.benchmark import Benchmark, BenchmarkCreate, BenchmarkUpdate, BenchmarkDelete, BenchmarkMetric, BenchmarkCreateResponse, BenchmarkUpdateResponse, BenchmarkDeleteResponse
 from schemas.permission import Permission
 from api.helpers import Authorize
+from helpers.columnar import columnar_media_type, columnar_response
+from core import market_data
 
 import crud
 from sqlalchemy.orm import Session
@@ -25,7 +27,11 @@ def get_latest_metrics(db: Session = Depends(get_db)):
 
 
 @router.get("/all/{start_date}/{end_date}", response_model=List[Benchmark], dependencies=[Depends(Authorize(permissions))], tags=["benchmark"])
-def get_benchmarks(start_date: dt.date, end_date: dt.date, db: Session=Depends(get_db)):
+def get_benchmarks(request: Request, start_date: dt.date, end_date: dt.date, db: Session=Depends(get_db)):
+    # Accept: application/vnd.apache.arrow.stream or application/vnd.apache.parquet returns one columnar table
+    media_type = columnar_media_type(request)
+    if media_type is not None:
+        return columnar_response(crud.benchmark.read_columns(db, start_date, end_date), media_type)
     return crud.benchmark.read(db, start_date, end_date)
 
 
@@ -38,6 +44,8 @@ def create_benchmarks(benchmarks: List[BenchmarkCreate], db: Session=Depends(get
             response.success.append(created_benchmark)
         else:
             response.error.append(benchmark)
+    # pricing requests of this pod see the new rows right away, the other pods once their snapshot expires
+    market_data.invalidate()
     return response
 
 
@@ -50,6 +58,7 @@ def update_benchmarks(benchmarks: List[BenchmarkUpdate], db: Session=Depends(get
             response.success.append(updated_benchmark)
         else:
             response.error.append(benchmark)
+    market_data.invalidate()
     return response
 
 
@@ -61,4 +70,5 @@ def delete_benchmarks(benchmarks: List[BenchmarkDelete], db: Session=Depends(get
             response.success.append(benchmark)
         else:
             response.error.append(benchmark)
+    market_data.invalidate()
     return response
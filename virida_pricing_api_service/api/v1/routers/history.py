@@ -12,7 +12,7 @@ from fastapi.exceptions import HTTPException
 from starlette.routing import BaseRoute
 from starlette import status
 from starlette.types import ASGIApp
-from starlette.responses import Response
+from starlette.responses import Response, StreamingResponse
 from pydantic import parse_obj_as
 from sqlalchemy.orm import Session
 from aiohttp import ClientSession
@@ -24,16 +24,19 @@ from schemas.request import RequestCreate, RequestType
 from schemas.interest_curve import InterestCurve
 from schemas.api_key import AuthDetail, AuthType, APIKeyType
 from schemas.permission import Permission
-from helpers.pricing import get_mappings, get_platts_mappings, validate
-from helpers.pricing import run_model, run_platts_model
+from helpers.pricing import get_mappings, get_platts_mappings, load_mapping_columns, validate
+from helpers.pricing import model_inputs, run_platts_model
+from helpers.history import History, price_vre_history, price_platts_history, run_models, serialize_vre_history, \
+    serialize_platts_history, ndjson_lines, history_columns, vintage_discount, NDJSON_MEDIA_TYPE
+from helpers.columnar import columnar_media_type, columnar_response
+from helpers.history_cache import cached_history, fingerprint
 from helpers.database import get_user_daily_utilization, get_user_monthly_utilization, get_user_lifetime_utilization
-from api.helpers import authenticate, Authorize
+from api.helpers import authenticate, Authorize, run_inference
 
 from database import get_db
 from httpclient import aiohttp_session
 from core import weights
-from core.interpolate import Interpolate
-from core.static import API_RESPONSE_ERROR_CODE_STRING, \
+from core.static import HISTORY_CACHE_ENABLED, API_RESPONSE_ERROR_CODE_STRING, \
     INSTRUMENT_NO_BID_OR_ASK, API_RESPONSE_ERROR_MESSAGE_STRING, get_error_string_by_error_code, \
     API_RESPONSE_ERROR_CODE_STRING, API_RESPONSE_ERROR_MESSAGE_STRING, \
     USER_SUBSCRIPTION_NOT_EXIST, get_error_string_by_error_code, ORGANIZATION_SUBSCRIPTION_NOT_EXIST, \
@@ -41,156 +44,6 @@ from core.static import API_RESPONSE_ERROR_CODE_STRING, \
     ORGANIZATION_MONTHLY_LIMIT_EXCEED, ORGANIZATION_LIFETIME_LIMIT_EXCEED, USER_LIFETIME_LIMIT_EXCEED
 
 
-def calculate_platts_price(row: pd.Series, position: int, index: str):
-    benchmarks = json.loads(row["outputs"].replace("\'", "\""))["beta"]
-    drifts = json.loads(row["drift"].replace("\'", "\""))
-    beta_tensor = row["output"]["beta"][position]
-
-    beta = 0.0
-    for i in range(len(beta_tensor)):
-        if not benchmarks[i] in row._index:
-            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE,
-                                "We're unable to price your project(s) due to missing support data")
-
-        benchmark = row[benchmarks[i]]
-        beta_benchmark = float(beta_tensor[i])
-        beta = beta + (benchmark * beta_benchmark)
-
-    sigma = np.exp((row["output"]["sigma"].numpy()[position] ** 2.) / 2.)
-    drift = drifts[index]
-    return float(beta * sigma * drift)
-
-
-def calculate_price(db: Session, row: pd.Series, position: int, project_pricing: ProjectPricing) -> tuple:
-    benchmarks = json.loads(row["outputs"].replace("\'", "\""))["beta"]
-    drifts = json.loads(row["drift"].replace("\'", "\""))
-    beta = row["output"]["beta"][position]
-    sigma = row["output"]["sigma"].numpy()[position]
-
-    interest_rate = 0
-
-    if project_pricing.horizon != 'spot':
-        pricing_date = row.name
-        if project_pricing.horizon < pricing_date:
-            raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Horizon date must be greater-than or inside the pricing date range")
-
-        curve = row["eua_curve"]
-
-        times = np.array(curve["times"])
-        rates = np.array(curve["rates"])
-
-        try:
-            r = Interpolate(times, rates)
-        except ValueError as ex:
-            print("[-]", ex)
-            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "We're unable to price your project(s) due to missing support data")
-
-        t = (project_pricing.horizon - pricing_date).days / 365
-
-        row[benchmarks[0]] = row[benchmarks[0]] * (1 + r(t))
-        row[benchmarks[2]] = row[benchmarks[2]] * (1 + r(t))
-        interest_rate = r(t)
-
-    beta_benchmarks = []
-    for i in range(len(beta)):
-        if not benchmarks[i] in row._index:
-            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "We're unable to price your project(s) due to missing support data")
-        beta_benchmarks.append(row[benchmarks[i]])
-
-    B = np.sum(np.multiply(beta, beta_benchmarks))
-    S = np.exp((sigma ** 2.) / 2.)
-
-    # project category based approach for vintage
-    project_categories = [x.split('.')[0] for x in project_pricing.project.project]
-    t = (dt.datetime.now() - dt.datetime(int(project_pricing.project.vintage), 12, 31, 23, 59)).days / 365
-    vintage_discount_factor = np.average([_gbm_expectation(t, json.loads(row["vintage_disc_fact"].replace("\'", "\""))[category]) for category in project_categories])
-
-    project_drift = np.mean([drifts["project"][category] for category in project_pricing.project.project])
-    sdg_drift = np.prod([drifts["sdg"][sdg] for sdg in project_pricing.project.sdg]) 
-    drift = project_drift * sdg_drift
-
-    mid = vintage_discount_factor * B * S * drift
-
-    # CORSIA modelling disabled (i.e. we get price from transaction price stored in standardized_instrument instead of modelling price)
-    if project_pricing.project.corsia == 1 and int(project_pricing.project.vintage) >= int(row["corsia_min_year"]):
-        # retrieve latest bid, ask, and date from Series
-        bid = row[InstrumentType.BID]
-        ask = row[InstrumentType.ASK]
-        
-        if bid is None or ask is None:
-            raise HTTPException(status.HTTP_404_NOT_FOUND, {
-                API_RESPONSE_ERROR_CODE_STRING: INSTRUMENT_NO_BID_OR_ASK,
-                API_RESPONSE_ERROR_MESSAGE_STRING: get_error_string_by_error_code(INSTRUMENT_NO_BID_OR_ASK)
-            })
-        mid = 0.5 * (bid + ask)
-    else:
-        # bid-ask spread (common logic for non CORSIA eligible assets)
-        bid_ask_spread = row["bid_ask_spread"]
-        if abs(bid_ask_spread) > 0:
-            bid_mult = 1 - (bid_ask_spread / 2.) * (np.exp(sigma ** 2.) - 1) ** 0.5
-            ask_mult = 1 + (bid_ask_spread / 2.) * (np.exp(sigma ** 2.) - 1) ** 0.5
-            bid = bid_mult * mid
-            ask = ask_mult * mid
-        else:
-            bid, ask = mid, mid
-    return (
-        float(mid),
-        float(bid),
-        float(ask),
-        float(vintage_discount_factor),
-        float(drift),
-        float(project_drift),
-        float(sdg_drift),
-        float(interest_rate)
-    )
-
-
-def get_platts_pricing_dict(date: dt.date, position: int, index: str, row: pd.Series, verbose: bool = False):
-    pricing = {
-        "date": date,
-        "price": row[f"mid{position}"]
-    }
-    if verbose:
-        benchmarks = json.loads(row["outputs"].replace("\'", "\""))["beta"]
-        drifts = json.loads(row["drift"].replace("\'", "\""))
-        beta_tensor = row["output"]["beta"][position]
-        pricing["indexes"] = row[benchmarks].to_dict()
-        pricing["beta"] = {benchmarks[i]: float(beta_tensor[i]) for i in range(len(beta_tensor))}
-        pricing["sigma"] = float(row["output"]["sigma"].numpy()[position][0])
-        pricing["drift"] = drifts[index]
-        pricing["weights"] = row["weights"]
-    return pricing
-
-
-def get_pricing_dict(date: dt.date, position: int, row: pd.Series, corsia: int, verbose: bool = False):
-    bid = row[f"bid{position}"]
-    ask = row[f"ask{position}"]
-
-    pricing = {
-        "date": date,
-        "bid": bid if not np.isnan(bid) else None,
-        "ask": ask if not np.isnan(ask) else None
-    }
-    if verbose:
-        benchmarks = json.loads(row["outputs"].replace("\'", "\""))["beta"]
-        beta_tensor = row["output"]["beta"][position]
-        pricing["indexes"] = row[benchmarks].to_dict()
-        pricing["beta"] = {benchmarks[i]: float(beta_tensor[i]) for i in range(len(beta_tensor))}
-        pricing["sigma"] = float(row["output"]["sigma"].numpy()[position][0])
-        pricing["weights"] = row["weights"]
-
-        mid = float(row[f"mid{position}"])
-        pricing["mid"] = mid if not np.isnan(mid) else None
-
-        pricing["vintage_discount_factor"] = row[f"vintage_discount_factor{position}"]
-        pricing["bid_ask_spread"] = row[f"bid_ask_spread"]
-        pricing["drift"] = row[f"drift{position}"]
-        pricing["drift_breakdown"] = {"project": row[f"project_drift{position}"], "sdg": row[f"sdg_drift{position}"]}
-        pricing["corsia"] = {"date": row["corsia_date"] if corsia else ""}
-        pricing["interest_rate"] = row[f"interest_rate{position}"]
-    return pricing
-
-
 def check_limit(db: Session, auth_detail: AuthDetail, project_pricings: List[ProjectPricing]):
     # check if need to check user limit or organization limit
     check_user_limit: bool = \
@@ -295,7 +148,7 @@ def check_limit(db: Session, auth_detail: AuthDetail, project_pricings: List[Pro
         )
 
 
-def log_request(db: Session, auth_detail: AuthDetail, model_name: str, project_pricings: List[ProjectPricing], pricings: list, valid_pricings_count: int):
+def log_request(db: Session, auth_detail: AuthDetail, model_name: str, project_pricings: List[ProjectPricing], response: str, valid_pricings_count: int):
     # check if need to check user limit or organization limit
     check_user_limit: bool = \
         (auth_detail.type == AuthType.ACCESS_TOKEN and
@@ -320,17 +173,267 @@ def log_request(db: Session, auth_detail: AuthDetail, model_name: str, project_p
         username=username,
         orgname=orgname,
         body=json.dumps(project_pricings, default=str),
-        response=json.dumps(pricings, default=str),
+        response=response,
         time=dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         projects_requested_count=len(project_pricings),
         projects_priced_count=valid_pricings_count
     ))
 
 
-def _gbm_expectation(t, mu):
-    return np.exp(mu * t)
+def _price_window(
+    db: Session,
+    model_name: str,
+    model_version: str,
+    pricing: HistoricalPricing,
+    mappings: list,
+    start_date: dt.date,
+    end_date: dt.date,
+    now: dt.datetime,
+    discount: bool = True
+) -> Optional[History]:
+    """
+    Run the models and price every mapped project for every date between start_date and end_date
+
+    :param discount: False leaves VRE prices before the vintage discount, see helpers.history.vintage_discount
+    :return: The History arrays, None when no project is mapped
+    """
+    is_platts_request: bool = model_name == "platts"
+
+    try:
+        df = weights.get(model_name, model_version, start_date, end_date)
+    except weights.WeightReadingException as ex:
+        print(ex)
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "We're unable to price your project(s) due to missing support data")
+
+    # the mapping matrices are built once, the drifts are read from them too
+    inputs = None if is_platts_request else model_inputs(mappings)
+    df["output"] = run_models(df["model"], lambda model: run_platts_model([mapping for mapping in mappings if mapping is not None], model)
+                    if is_platts_request else (model(inputs) if inputs is not None else None))
+
+    try:
+        indexes_df = crud.benchmark_index.read_dataframe(db, start_date, end_date)
+        df = pd.concat([df, indexes_df], axis=1).sort_index().fillna(method="pad")
+    except crud.benchmark_index.BenchmarkIndexException as ex:
+        print(ex)
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "We're unable to price your project(s) due to missing support data")
+
+    if not is_platts_request:
+        try:
+            bidask_df = crud.standardized_instrument.read_dataframe(db, start_date, end_date)
+            df = pd.concat([df, bidask_df], axis=1).sort_index().fillna(method="pad")
+        except crud.standardized_instrument.StandardizedInstrumentException as ex:
+            print(ex)
+            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "We're unable to price your project(s) due to missing support data")
+        
+        try:
+            interest_curve_df = crud.interest_curve.read_dataframe(db, start_date, end_date)
+            df = pd.concat([df, interest_curve_df], axis=1).sort_index().fillna(method="pad")
+        except crud.interest_curve.InterestCurveException as ex:
+            print(ex)
+            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "We're unable to price your project(s) due to missing support data")
+
+    # price every mapped project for every date at once, project i of the model output is column i
+    if is_platts_request:
+        indexes = [pricing.scenarios[position].project.index for position, mapping in enumerate(mappings) if mapping]
+        if indexes:
+            return price_platts_history(df, indexes)
+    else:
+        project_pricings = [pricing.scenarios[position] for position, mapping in enumerate(mappings) if mapping.mapping]
+        if project_pricings:
+            return price_vre_history(df, project_pricings, now, inputs, discount)
+    return None
+
+
+def _metadata_of_days(model_name: str, model_version: str, dates: list) -> pd.Series:
+    try:
+        df = weights.get(model_name, model_version, dates[0], dates[-1])
+    except weights.WeightReadingException as ex:
+        print(ex)
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "We're unable to price your project(s) due to missing support data")
+    return df["metadata"].reindex(dates, method="pad")
+
+
+def compute_history(
+    db: Session,
+    model_name: str,
+    model_version: str,
+    pricing: HistoricalPricing,
+    mappings: list,
+    verbose: bool = False
+) -> Optional[History]:
+    """
+    Price every mapped project for every date of the request. Non-verbose requests only need the prices, so the
+    dates already priced for the same scenarios are read from the history_cache table instead of being recomputed.
+
+    :return: The History arrays, None when no project is mapped
+    """
+    is_platts_request: bool = model_name == "platts"
+    now = dt.datetime.now()
+
+    def compute(start_date: dt.date, end_date: dt.date, discount: bool = True) -> Optional[History]:
+        return _price_window(db, model_name, model_version, pricing, mappings, start_date, end_date, now, discount)
+
+    if verbose or not HISTORY_CACHE_ENABLED:
+        return compute(pricing.start_date, pricing.end_date)
+
+    if is_platts_request:
+        scenarios = [
+            fingerprint(pricing.scenarios[position].project.index, mapping)
+            for position, mapping in enumerate(mappings) if mapping
+        ]
+    else:
+        # VRE prices are cached before the vintage discount, the only part moving with now, so entries stay valid across days
+        scenarios = [
+            fingerprint(mapping.mapping, pricing.scenarios[position].project.dict(), pricing.scenarios[position].horizon)
+            for position, mapping in enumerate(mappings) if mapping.mapping
+        ]
+    if not scenarios:
+        return None
+
+    weights.load()
+    history = cached_history(
+        db,
+        model_name=model_name,
+        model_version=model_version,
+        generation=weights.status()["generation"],
+        scenarios=scenarios,
+        start_date=pricing.start_date,
+        end_date=pricing.end_date,
+        system_date=crud.system.read(db).date,
+        compute=compute if is_platts_request else lambda start_date, end_date: compute(start_date, end_date, discount=False),
+        platts=is_platts_request
+    )
+    if is_platts_request:
+        return history
+
+    project_pricings = [pricing.scenarios[position] for position, mapping in enumerate(mappings) if mapping.mapping]
+    factor = vintage_discount(_metadata_of_days(model_name, model_version, history.dates), project_pricings, now)
+    return history._replace(fields={field: np.asfortranarray(values * factor) for field, values in history.fields.items()})
+
+
+def history_records(model_name: str, pricing: HistoricalPricing, mappings: list, history: Optional[History], verbose: bool = False):
+    """
+    Response record of each requested project, in request order, serialized only when it is pulled
+    """
+    is_platts_request: bool = model_name == "platts"
+
+    index = 0
+    for position, mapping in enumerate(mappings):
+        if is_platts_request:
+            project = pricing.scenarios[position].project
+            if not mapping:
+                yield {
+                    "project": project.dict(exclude_unset=True),
+                    "history": None
+                }
+                continue
+
+            yield {
+                "project": project.dict(exclude_unset=True),
+                "history": serialize_platts_history(history, index, verbose)
+            }
+        else:
+            project_pricing = pricing.scenarios[position]
+            if not mapping.mapping:
+                yield {
+                    "project": project_pricing.project,
+                    "horizon": project_pricing.horizon,
+                    "status": mapping.status,
+                    "description": mapping.description,
+                    "history": None
+                }
+                continue
+
+            yield {
+                "project": project_pricing.project,
+                "horizon": project_pricing.horizon,
+                "status": mapping.status,
+                "description": mapping.description,
+                "history": serialize_vre_history(history, index, project_pricing.project.corsia, verbose)
+            }
+        index += 1
+
+
+def price_history(
+    db: Session,
+    auth_detail: AuthDetail,
+    model_name: str,
+    model_version: str,
+    pricing: HistoricalPricing,
+    mappings: list,
+    verbose: bool = False
+) -> list:
+    history = compute_history(db, model_name, model_version, pricing, mappings, verbose)
+    pricings = list(history_records(model_name, pricing, mappings, history, verbose))
+
+    valid_pricings_count = history.valid_count() if history is not None else 0
+
+    log_request(db=db, auth_detail=auth_detail, model_name=model_name, project_pricings=pricing.scenarios,
+                response=json.dumps(pricings, default=str), valid_pricings_count=valid_pricings_count)
+    return pricings
+
+
+def price_history_table(
+    db: Session,
+    auth_detail: AuthDetail,
+    model_name: str,
+    model_version: str,
+    pricing: HistoricalPricing,
+    mappings: list,
+    media_type: str,
+    verbose: bool = False
+) -> Response:
+    """
+    History of every mapped scenario as one long format table (scenario, date, prices...) in a columnar format;
+    "scenario" is the position of the scenario in the request, unmapped scenarios have no rows
+    """
+    history = compute_history(db, model_name, model_version, pricing, mappings, verbose)
+    scenarios = [position for position, mapping in enumerate(mappings) if (mapping if model_name == "platts" else mapping.mapping)]
+    columns = history_columns(history, scenarios, verbose) if history is not None else {"scenario": [], "date": []}
+
+    valid_pricings_count = history.valid_count() if history is not None else 0
+    log_request(db=db, auth_detail=auth_detail, model_name=model_name, project_pricings=pricing.scenarios,
+                response=response_summary(media_type, len(columns["scenario"]), pricing),
+                valid_pricings_count=valid_pricings_count)
+    return columnar_response(columns, media_type)
+
+
+def response_summary(media_type: str, rows: int, pricing: HistoricalPricing) -> str:
+    """
+    Request log response of the columnar and streamed formats, which is not kept in memory to be logged in full
+    """
+    return json.dumps({
+        "media_type": media_type,
+        "rows": rows,
+        "start_date": pricing.start_date,
+        "end_date": pricing.end_date,
+        "scenarios": len(pricing.scenarios)
+    }, default=str)
+
+
+def stream_history(
+    db: Session,
+    auth_detail: AuthDetail,
+    model_name: str,
+    pricing: HistoricalPricing,
+    mappings: list,
+    history: Optional[History],
+    verbose: bool = False
+) -> StreamingResponse:
+    """
+    NDJSON response of a history request: one line per project, each released once written. The request is logged
+    with a summary of the response before the first line is sent, so a client dropping the stream is still counted.
+    """
+    valid_pricings_count = history.valid_count() if history is not None else 0
+    log_request(db=db, auth_detail=auth_detail, model_name=model_name, project_pricings=pricing.scenarios,
+                response=response_summary(NDJSON_MEDIA_TYPE, len(mappings), pricing), valid_pricings_count=valid_pricings_count)
+
+    return StreamingResponse(
+        ndjson_lines(history_records(model_name, pricing, mappings, history, verbose)),
+        media_type=NDJSON_MEDIA_TYPE
+    )
+
 
-                    
 class HistoricalPricingRouter(APIRouter):
     def __init__(
         self,
@@ -365,7 +468,8 @@ class HistoricalPricingRouter(APIRouter):
             pricing: HistoricalPricing,
             auth_detail: AuthDetail = Depends(authenticate),
             db: Session=Depends(get_db),
-            aiohttp_session: ClientSession=Depends(aiohttp_session)
+            aiohttp_session: ClientSession=Depends(aiohttp_session),
+            stream: bool = False
         ) -> dict:
             model_name: str = self.config_data["model_name"]
             model_version: str = self.config_data["model_version"]
@@ -373,6 +477,7 @@ class HistoricalPricingRouter(APIRouter):
 
             authorize: Callable = Authorize(Permission.PLATTS if is_platts_request else Permission.VRE)
             authorize(request, auth_detail)
+            media_type = columnar_media_type(request)
 
             if pricing.start_date is None or pricing.end_date is None:
                 pricing.start_date = pricing.end_date = crud.system.read(db).date
@@ -389,6 +494,8 @@ class HistoricalPricingRouter(APIRouter):
                     auth_detail=auth_detail,
                     project_pricings=pricing.scenarios
                 )
+                # column order the drift tables are compiled against
+                await load_mapping_columns(aiohttp_session, auth_detail, pricing.scenarios)
 
                 if not Authorize(Permission.ADVANCED, raise_exception=False)(request, auth_detail):
                     mappings_json: List[dict] = validate(project_mappings=parse_obj_as(List[ProjectMapping], mappings_json))
@@ -396,94 +503,45 @@ class HistoricalPricingRouter(APIRouter):
                 response.status_code = status_code
                 mappings = parse_obj_as(List[ProjectMapping], mappings_json)
 
-            try:
-                df = weights.get(db, model_name, model_version, pricing.start_date, pricing.end_date)
-            except weights.WeightReadingException as ex:
-                print(ex)
-                raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "We're unable to price your project(s) due to missing support data")
-
-            df["output"] = df.apply(lambda row: run_platts_model([mapping for mapping in mappings if mapping is not None], row["model"])
-                            if is_platts_request else run_model(mappings, row["model"]), axis=1)
-
-            try:
-                indexes_df = crud.benchmark_index.read_dataframe(db, pricing.start_date, pricing.end_date)
-                df = pd.concat([df, indexes_df], axis=1).sort_index().fillna(method="pad")
-            except crud.benchmark_index.BenchmarkIndexException as ex:
-                print(ex)
-                raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "We're unable to price your project(s) due to missing support data")
-
-            if not is_platts_request:
-                try:
-                    bidask_df = crud.standardized_instrument.read_dataframe(db, pricing.start_date, pricing.end_date)
-                    df = pd.concat([df, bidask_df], axis=1).sort_index().fillna(method="pad")
-                except crud.standardized_instrument.StandardizedInstrumentException as ex:
-                    print(ex)
-                    raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "We're unable to price your project(s) due to missing support data")
-                
-                try:
-                    interest_curve_df = crud.interest_curve.read_dataframe(db, pricing.start_date, pricing.end_date)
-                    df = pd.concat([df, interest_curve_df], axis=1).sort_index().fillna(method="pad")
-                except crud.interest_curve.InterestCurveException as ex:
-                    print(ex)
-                    raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "We're unable to price your project(s) due to missing support data")
-
             verbose = True if Authorize(Permission.ADVANCED, raise_exception=False)(request, auth_detail) else False
-            pricings = []
-            index = 0
-            for position, mapping in enumerate(mappings):
-                if is_platts_request:
-                    project = pricing.scenarios[position].project
-                    if not mapping:
-                        pricings.append({
-                            "project": project.dict(exclude_unset=True),
-                            "history": None
-                        })
-                        continue
-                    
-                    df[f"mid{index}"] = df.apply(lambda row: calculate_platts_price(row, index, project.index), axis=1)
-                    pricings.append({
-                        "project": project.dict(exclude_unset=True),
-                        "history": [get_platts_pricing_dict(date, position, project.index, row, verbose) for date, row in df.iterrows()]
-                    })
-                else:
-                    project_pricing = pricing.scenarios[position]
-                    if not mapping.mapping:
-                        pricings.append({
-                            "project": project_pricing.project,
-                            "horizon": project_pricing.horizon,
-                            "status": mapping.status,
-                            "description": mapping.description,
-                            "history": None
-                        })
-                        continue
-
-                    (
-                        df[f"mid{index}"],
-                        df[f"bid{index}"],
-                        df[f"ask{index}"],
-                        df[f"vintage_discount_factor{index}"],
-                        df[f"drift{index}"],
-                        df[f"project_drift{index}"],
-                        df[f"sdg_drift{index}"],
-                        df[f"interest_rate{index}"]
-                    ) = zip(*df.apply(lambda row: calculate_price(db, row, index, project_pricing), axis=1))
-
-                    pricings.append({
-                        "project": project_pricing.project,
-                        "horizon": project_pricing.horizon,
-                        "status": mapping.status,
-                        "description": mapping.description,
-                        "history": [get_pricing_dict(date, position, row, project_pricing.project.corsia, verbose) for date, row in df.iterrows()]
-                    })
-                index += 1
-
-            valid_pricings_count = 0
-            for i in range(0, index):
-                length = len(df[~df[f"mid{i}"].isnull()])
-                valid_pricings_count = valid_pricings_count + length
-
-            log_request(db=db, auth_detail=auth_detail, model_name=model_name, project_pricings=pricing.scenarios, pricings=pricings, valid_pricings_count=valid_pricings_count)
-            return pricings
+
+            if media_type is not None:
+                table = await run_inference(
+                    price_history_table,
+                    auth_detail=auth_detail,
+                    model_name=model_name,
+                    model_version=model_version,
+                    pricing=pricing,
+                    mappings=mappings,
+                    media_type=media_type,
+                    verbose=verbose
+                )
+                table.status_code = response.status_code or status.HTTP_200_OK
+                return table
+
+            # opt-in streaming: one NDJSON line per project, sent as soon as it is serialized
+            if stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+                history = await run_inference(
+                    compute_history,
+                    model_name=model_name,
+                    model_version=model_version,
+                    pricing=pricing,
+                    mappings=mappings,
+                    verbose=verbose
+                )
+                streamed = stream_history(db, auth_detail, model_name, pricing, mappings, history, verbose)
+                streamed.status_code = response.status_code or status.HTTP_200_OK
+                return streamed
+
+            return await run_inference(
+                price_history,
+                auth_detail=auth_detail,
+                model_name=model_name,
+                model_version=model_version,
+                pricing=pricing,
+                mappings=mappings,
+                verbose=verbose
+            )
 
 
 def router(config_data: dict):
@@ -22,10 +22,10 @@ from schemas.project import ProjectPricing, ProjectMapping
 from schemas.api_key import APIKeyType, AuthDetail, AuthType
 from schemas.request import RequestCreate, RequestType
 from schemas.permission import Permission
-from helpers.pricing import validate, calculate, get_mappings
+from helpers.pricing import validate, calculate, get_mappings, load_mapping_columns
 from database import get_db
 from httpclient import aiohttp_session
-from api.helpers import Authorize
+from api.helpers import Authorize, run_inference
 from helpers.database import get_user_daily_utilization, get_user_monthly_utilization, \
     get_user_lifetime_utilization
 
@@ -184,13 +184,15 @@ class PricingRouter(APIRouter):
                 auth_detail=auth_detail,
                 project_pricings=project_pricings
             )
+            # column order the drift tables are compiled against
+            await load_mapping_columns(aiohttp_session, auth_detail, project_pricings)
 
             advanced = True if Authorize(Permission.ADVANCED, raise_exception=False)(request, auth_detail) else False
             if not advanced:
                 mappings_json: List[dict] = validate(project_mappings=parse_obj_as(List[ProjectMapping], mappings_json))
 
-            pricings, projects_priced_count = calculate(
-                db=db,
+            pricings, projects_priced_count = await run_inference(
+                calculate,
                 project_pricings=project_pricings,
                 project_mappings=parse_obj_as(List[ProjectMapping], mappings_json),
                 config_data=self.config_data,
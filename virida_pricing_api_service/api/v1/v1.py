@@ -1,7 +1,7 @@
 from fastapi import APIRouter
 from .routers import pricing, forex, interest_rate, benchmark, limit, utilization, api_key, standardized_instrument, config, history, model_config, benchmark_index 
-from core.models import ConditionalFactorEncoder
-from core.models import ViridaPrices
+from core.loader import load_model
+from core.batcher import batched
 
 router = APIRouter()
 
@@ -104,22 +104,20 @@ router.include_router(benchmark_index.router, prefix="/benchmark_index")
 inputs7_0_7_11 = {'project': 23, 'standard': 8, 'geography': 250, 'sdg': 17}
 outputs7_0_7_11 = {'beta': ['eua', 'co2', 'brent', 'treasury'], 'sigma': ['sigma']}
 units7_0_7_11 = {'input': 800, 'hidden': [800] * 8}
-model7_0_7_11 = ViridaPrices(inputs=inputs7_0_7_11, units=units7_0_7_11, outputs=outputs7_0_7_11)
 model7_0_7_11_identifier = '800-8x800-5_v7.0.7.11_weights'
-model7_0_7_11.load_weights(f"./core/data/{model7_0_7_11_identifier}")
+model7_0_7_11 = load_model("ViridaPrices", inputs=inputs7_0_7_11, units=units7_0_7_11, outputs=outputs7_0_7_11, weights=model7_0_7_11_identifier)
 
 # model v7 - 13-jul-2021
 inputs7_0_7_12 = {'project': 23, 'standard': 8, 'geography': 250, 'sdg': 17}
 outputs7_0_7_12 = {'beta': ['eua', 'co2', 'brent', 'treasury'], 'sigma': ['sigma']}
 units7_0_7_12 = {'input': 800, 'hidden': [800] * 8}
-model7_0_7_12 = ViridaPrices(inputs=inputs7_0_7_12, units=units7_0_7_12, outputs=outputs7_0_7_12)
 model7_0_7_12_identifier = '800-8x800-5_v7.0.7.12_weights'
-model7_0_7_12.load_weights(f"./core/data/{model7_0_7_12_identifier}")
+model7_0_7_12 = load_model("ViridaPrices", inputs=inputs7_0_7_12, units=units7_0_7_12, outputs=outputs7_0_7_12, weights=model7_0_7_12_identifier)
 
 router.include_router(
     pricing.router(
         config_data={
-            "model": model7_0_7_12,
+            "model": batched(model7_0_7_12),
             "model_id": model7_0_7_12_identifier,
             "model_name": "vre_model_v7",
             "formula": 4
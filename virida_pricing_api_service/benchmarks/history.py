@@ -0,0 +1,83 @@
+"""
+History pricing engine latency for a one-year window, and time plus peak memory of pricing and serializing
+200 scenarios over three years.
+
+Run from the service root:
+
+    python -m benchmarks.history
+"""
+import timeit
+import tracemalloc
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from core.weights import ModelMetadata
+from helpers.history import price_vre_history, serialize_vre_history
+from schemas.project import Project, ProjectPricing
+
+DAYS, PROJECTS = 365, 100
+BENCHMARKS = ["eua", "co2", "brent", "treasury"]
+
+
+def history_frame(rng, days: int = DAYS, projects: int = PROJECTS) -> pd.DataFrame:
+    metadata = ModelMetadata(
+        benchmarks=BENCHMARKS,
+        drift={"project": {"afolu.01": 1.1, "re.01": 0.9}, "sdg": {"13": 1.0, "7": 1.05}},
+        vintage_discount_factors={"afolu": -0.0375, "re": -0.0767},
+        corsia_min_year=2016,
+        bid_ask_spread=0.2,
+        weights="weights"
+    )
+    df = pd.DataFrame(index=[dt.date(2019, 1, 1) + dt.timedelta(days=i) for i in range(days)])
+    df["metadata"] = [metadata] * days
+    df["output"] = [{
+        "beta": rng.uniform(0, 2, (projects, 4)).astype(np.float32),
+        "sigma": rng.uniform(0, 1, (projects, 1)).astype(np.float32)
+    } for _ in range(days)]
+    for benchmark in BENCHMARKS:
+        df[benchmark] = rng.uniform(10, 50, days)
+    df["BID"] = rng.uniform(5, 10, days)
+    df["ASK"] = df["BID"] + 1
+    df["eua_curve"] = [{"times": [0.1, 0.5, 1., 2., 5.], "rates": [0.01, 0.02, 0.015, 0.03, 0.04]}] * days
+    return df
+
+
+def project_pricings(projects: int) -> list:
+    return [
+        ProjectPricing.construct(
+            project=Project.construct(project=["afolu.01", "re.01"][:1 + i % 2], sdg=["7", "13"], vintage=str(2012 + i % 10), corsia=0),
+            horizon="spot" if i % 2 else dt.date(2025, 12, 1)
+        ) for i in range(projects)
+    ]
+
+
+def price_and_serialize(df: pd.DataFrame, pricings: list) -> list:
+    history = price_vre_history(df, pricings)
+    return [serialize_vre_history(history, index, corsia=0) for index in range(len(pricings))]
+
+
+def scenarios(days: int = 3 * 365, projects: int = 200) -> None:
+    df = history_frame(np.random.default_rng(0), days, projects)
+    pricings = project_pricings(projects)
+
+    seconds = min(timeit.repeat(lambda: price_and_serialize(df, pricings), number=1, repeat=3))
+    tracemalloc.start()
+    price_and_serialize(df, pricings)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{days} days x {projects} scenarios, priced and serialized: {seconds * 1000.:.1f} ms, peak {peak / 2 ** 20:.1f} MiB")
+
+
+def main():
+    df = history_frame(np.random.default_rng(0))
+    pricings = project_pricings(PROJECTS)
+    seconds = min(timeit.repeat(lambda: price_vre_history(df, pricings), number=1, repeat=5))
+    print(f"{DAYS} days x {PROJECTS} projects: {seconds * 1000.:.1f} ms")
+
+    scenarios()
+
+
+if __name__ == "__main__":
+    main()
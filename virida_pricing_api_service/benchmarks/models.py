@@ -0,0 +1,42 @@
+"""
+Per-call latency of the ViridaPrices forward pass, eager vs graph-compiled.
+
+Run from the service root:
+
+    python -m benchmarks.models
+"""
+import timeit
+
+import numpy as np
+
+from core.models import ViridaPrices
+
+INPUTS = {'project': 23, 'standard': 8, 'geography': 250, 'sdg': 17}
+OUTPUTS = {'beta': ['eua', 'co2', 'brent', 'treasury'], 'sigma': ['sigma']}
+UNITS = {'input': 800, 'hidden': [800] * 8}
+BATCH_SIZES = [1, 10, 100, 1000]
+
+
+def batch(size: int) -> dict:
+    return {key: np.random.randint(0, 2, (size, width)).astype(np.float32) for key, width in INPUTS.items()}
+
+
+def latency(fn, inputs: dict, number: int) -> float:
+    return min(timeit.repeat(lambda: fn(inputs), number=number, repeat=3)) / number * 1000.
+
+
+def main():
+    model = ViridaPrices(inputs=INPUTS, units=UNITS, outputs=OUTPUTS, seed=1)
+    model.warmup()
+
+    print(f"{'batch':>6} {'eager (ms)':>12} {'graph (ms)':>12} {'speedup':>8}")
+    for size in BATCH_SIZES:
+        inputs = batch(size)
+        number = max(5, 200 // size)
+        eager = latency(model._forward, inputs, number)
+        graph = latency(model, inputs, number)
+        print(f"{size:>6} {eager:>12.3f} {graph:>12.3f} {eager / graph:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
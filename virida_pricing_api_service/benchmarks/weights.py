@@ -0,0 +1,69 @@
+"""
+model_config flattening: per-key .loc assignment (previous implementation) vs the vectorized core.weights._frames.
+
+Run from the service root:
+
+    python -m benchmarks.weights
+"""
+import timeit
+import datetime as dt
+from types import SimpleNamespace
+
+import pandas as pd
+
+from core.weights import _frames
+
+ROWS = 1000
+CONFIG = {
+    "class": "ViridaPrices",
+    "inputs": {"project": 23, "standard": 8, "geography": 250, "sdg": 17},
+    "structure": {"input": 800, "hidden": [800] * 8},
+    "outputs": {"beta": ["eua", "co2", "brent", "treasury"], "sigma": ["sigma"]},
+    "weights": "800-8x800-5_v7.0.7.12_weights",
+    "drift": {"project": {"afolu.01": 1.0}, "sdg": {"1": 1.0}},
+    "vintage_disc_fact": {"afolu": -0.0375, "eefs": -0.0767, "ga": -0.0768, "re": -0.0767},
+    "corsia_min_year": 2016,
+    "bid_ask_spread": 0.2
+}
+
+
+def configs(rows: int) -> list:
+    start = dt.date(2018, 1, 1)
+    return [
+        SimpleNamespace(date=start + dt.timedelta(days=i), model_name="virida", model_version="7.0.7", config=CONFIG)
+        for i in range(rows)
+    ]
+
+
+def loc_frames(configs: list) -> list:
+    df = pd.DataFrame([{
+            "date": config.date,
+            "name": config.model_name,
+            "version": config.model_version,
+            "config": config.config
+        } for config in configs]
+    ).set_index("date")
+
+    frames = []
+    for name, version in set([(config.model_name, config.model_version) for config in configs]):
+        new = df[(df["name"] == name) & (df["version"] == version)].copy()
+
+        for date, row in new.iterrows():
+            for key, value in row["config"].items():
+                new.loc[date, key] = str(value) if type(value) == dict else value
+
+        new.drop(['config'], axis='columns', inplace=True)
+        new.fillna(method="pad", inplace=True)
+        frames.append(new)
+    return frames
+
+
+def main():
+    rows = configs(ROWS)
+    loc = min(timeit.repeat(lambda: loc_frames(rows), number=1, repeat=3)) * 1000.
+    vectorized = min(timeit.repeat(lambda: _frames(rows), number=1, repeat=3)) * 1000.
+    print(f"{ROWS} config rows: .loc {loc:.1f} ms, vectorized {vectorized:.1f} ms ({loc / vectorized:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1 @@
-from . import helpers, models, static
+from . import helpers, static
@@ -0,0 +1,88 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from core.static import INFERENCE_BATCHING_ENABLED, INFERENCE_BATCHING_WINDOW_MS, INFERENCE_BATCHING_MAX_ROWS
+
+
+class DynamicBatcher:
+    """
+    Callable wrapper around a model that merges the input rows of concurrent callers into one forward pass.
+
+    Callers block until the pass containing their rows is done and receive only their own slice of the outputs.
+    """
+
+    def __init__(self, model, window_ms: float, max_rows: int) -> None:
+        """
+        :param model: The model to wrap, called with a dict of 2D float32 arrays sharing the batch dimension
+        :param window_ms: The number of milliseconds to wait for more callers after the first one arrived
+        :param max_rows: The number of rows after which a batch is run without waiting for the window to end
+        """
+        self.model = model
+        self.window = window_ms / 1000.
+        self.max_rows = max_rows
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="dynamic-batcher", daemon=True)
+        self._thread.start()
+
+    def __call__(self, inputs: dict) -> dict:
+        rows = len(next(iter(inputs.values())))
+        if rows == 0 or rows >= self.max_rows:
+            return self.model(inputs)
+
+        future = Future()
+        self._queue.put((inputs, rows, future))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            rows = batch[0][1]
+            deadline = time.perf_counter() + self.window
+
+            while rows < self.max_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += item[1]
+
+            # requests built against different mapping versions have different widths and cannot be stacked
+            groups = {}
+            for item in batch:
+                shape = tuple((key, value.shape[1:]) for key, value in sorted(item[0].items()))
+                groups.setdefault(shape, []).append(item)
+
+            for group in groups.values():
+                self._run(group)
+
+    def _run(self, batch: list):
+        try:
+            keys = batch[0][0].keys()
+            outputs = self.model({key: np.concatenate([inputs[key] for inputs, _, _ in batch]) for key in keys})
+        except Exception as ex:
+            for _, _, future in batch:
+                future.set_exception(ex)
+            return
+
+        start = 0
+        for _, rows, future in batch:
+            future.set_result({key: value[start:start + rows] for key, value in outputs.items()})
+            start = start + rows
+
+
+def batched(model):
+    """
+    Wrap the model in a DynamicBatcher when INFERENCE_BATCHING_ENABLED is set, otherwise return it unchanged
+    """
+    if not INFERENCE_BATCHING_ENABLED:
+        return model
+    return DynamicBatcher(model, window_ms=INFERENCE_BATCHING_WINDOW_MS, max_rows=INFERENCE_BATCHING_MAX_ROWS)
@@ -0,0 +1,86 @@
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import json
+
+import numpy as np
+
+
+class MappingColumns(NamedTuple):
+    """ Project classes and SDGs of a mapping version, in the column order of the static service's one-hot mapping """
+    project: Tuple[str, ...]
+    sdg: Tuple[str, ...]
+
+
+class DriftTable(NamedTuple):
+    """ Drift config as dense vectors, position i being column i of the static service's one-hot mapping """
+    project: np.ndarray
+    log_sdg: np.ndarray
+    # columns with no drift value in the config
+    missing_project: np.ndarray
+    missing_sdg: np.ndarray
+
+
+# column order of each mapping version, read from the static service's attribute table (see helpers.pricing)
+_mapping_columns: Dict[int, MappingColumns] = {}
+
+
+def set_mapping_columns(version: int, columns: MappingColumns) -> None:
+    _mapping_columns[version] = columns
+
+
+def mapping_columns(version: int) -> Optional[MappingColumns]:
+    """
+    :return: The column order of the mapping version, None while it has not been read from the static service
+    """
+    return _mapping_columns.get(version)
+
+
+def _vector(drift: dict, columns: List[str]) -> tuple:
+    values = np.array([drift.get(column, np.nan) for column in columns], dtype=np.float64)
+    missing = np.isnan(values)
+    return np.where(missing, 0., values), missing
+
+
+@lru_cache(maxsize=32)
+def _compile(drift_json: str, columns: MappingColumns) -> DriftTable:
+    drift = json.loads(drift_json)
+    project, missing_project = _vector(drift.get("project", {}), columns.project)
+    sdg, missing_sdg = _vector(drift.get("sdg", {}), columns.sdg)
+    return DriftTable(project=project, log_sdg=np.log(np.where(missing_sdg, 1., sdg)),
+                      missing_project=missing_project, missing_sdg=missing_sdg)
+
+
+def compile_drift(drift: dict, columns: MappingColumns) -> DriftTable:
+    """
+    Drift table of a drift config ({"project": {class: drift}, "sdg": {sdg: drift}}) aligned on the mapping columns,
+    compiled once per distinct config content and column order, so once per model_config generation or config row
+    """
+    return _compile(json.dumps({key: drift.get(key, {}) for key in ("project", "sdg")}, sort_keys=True), columns)
+
+
+def batch_drifts(drift: dict, projects: np.ndarray, sdgs: np.ndarray, versions: List[int]) -> Optional[tuple]:
+    """
+    Project drift (mean over the project classes) and SDG drift (product over the SDGs) of a whole batch, from the
+    project and sdg mapping matrices sent to the model. Repeated classes or SDGs are counts in the mapping, so they
+    weigh in the mean and the product as they did in the per-project lists.
+
+    :param projects: (projects, classes) project mapping matrix
+    :param sdgs: (projects, sdgs) sdg mapping matrix
+    :param versions: Mapping version of each project
+    :return: (project_drift, sdg_drift) float64 vectors, None when the column order of the mapping version is unknown,
+             does not match the mapping widths or has a column with no drift value, for the caller to fall back to the
+             per-project lookups
+    """
+    if len(set(versions)) != 1:
+        return None
+    columns = mapping_columns(versions[0])
+    if columns is None or projects.shape[1] != len(columns.project) or sdgs.shape[1] != len(columns.sdg):
+        return None
+
+    table = compile_drift(drift, columns)
+    projects = projects.astype(np.float64)
+    sdgs = sdgs.astype(np.float64)
+    if projects[:, table.missing_project].any() or sdgs[:, table.missing_sdg].any():
+        return None
+
+    return (projects @ table.project) / projects.sum(axis=1), np.exp(sdgs @ table.log_sdg)
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from core.static import INFERENCE_MAX_WORKERS, INFERENCE_MAX_QUEUE_DEPTH, INFERENCE_TIMEOUT_SECONDS
+
+
+class InferenceExecutorException(Exception):
+    pass
+
+
+class InferenceQueueFullException(InferenceExecutorException):
+    pass
+
+
+class InferenceTimeoutException(InferenceExecutorException):
+    pass
+
+
+class InferenceExecutor:
+    """
+    Bounded thread pool used to run the blocking pricing work (model forward passes and the
+    SQLAlchemy queries around them) outside of the uvicorn event loop
+    """
+
+    def __init__(self, max_workers: int, max_queue_depth: int, timeout: float) -> None:
+        """
+        :param max_workers: The number of threads running inference work concurrently
+        :param max_queue_depth: The number of submissions allowed to wait for a free worker
+        :param timeout: The number of seconds a caller waits (queue + run time) before giving up
+        """
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.timeout = timeout
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+
+        self._pending = 0
+        self._running = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """
+        Submit fn(*args, **kwargs) to the pool and await its result without blocking the event loop
+
+        :raises InferenceQueueFullException: when the queue is already at max_queue_depth
+        :raises InferenceTimeoutException: when the result is not available within timeout seconds; a task already
+                                           running cannot be cancelled and keeps its worker until it returns
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue_depth:
+                self._rejected += 1
+                raise InferenceQueueFullException(f"Inference queue is full ({self.max_queue_depth} pending submissions)")
+            self._pending += 1
+            self._submitted += 1
+
+        future: Future = self._pool.submit(self._task, time.perf_counter(), fn, args, kwargs)
+        future.add_done_callback(self._done)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self._timed_out += 1
+            raise InferenceTimeoutException(f"Inference did not complete within {self.timeout} seconds")
+
+    def _task(self, submitted_at: float, fn: Callable, args: tuple, kwargs: dict):
+        wait = time.perf_counter() - submitted_at
+        with self._lock:
+            self._running += 1
+            self._wait_last = wait
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _done(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self._failed += 1
+            else:
+                self._completed += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            started = self._completed + self._failed + self._running
+            return {
+                "max_workers": self.max_workers,
+                "max_queue_depth": self.max_queue_depth,
+                "timeout_seconds": self.timeout,
+                "queue_depth": self._pending - self._running,
+                "running": self._running,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "wait_seconds": {
+                    "last": self._wait_last,
+                    "max": self._wait_max,
+                    "mean": self._wait_total / started if started else 0.0
+                }
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+inference_executor = InferenceExecutor(
+    max_workers=INFERENCE_MAX_WORKERS,
+    max_queue_depth=INFERENCE_MAX_QUEUE_DEPTH,
+    timeout=INFERENCE_TIMEOUT_SECONDS
+)
@@ -0,0 +1,288 @@
+import datetime as dt
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+import crud
+from models import Benchmark
+from core.static import CO2_INDEX_LOOKBACK
+
+# treasury curve slope: 10Y minus 3M spread over the 9.75 years between the two tenors
+TREASURY_SLOPE_YEARS = 10. - 0.25
+
+
+class IndexSpec(NamedTuple):
+    index: str
+    name: str
+    symbol: str
+    kind: str  # "ratio", "slope" or "roc", see index_from_rows
+    frequency: str  # calendar of the series shown in the end of day email
+    ccy_convert: bool = False  # ratio of the USD converted closes
+    type: str = 'spot'
+
+
+# benchmark indices, an index is added by adding its spec
+INDEX_REGISTRY = [
+    # x['price'] = x['eua_spot'] / x['fx_usdeur'], x['index'] = x['price']/x['price'][k].values[0]
+    IndexSpec('eua', 'EUA', 'CKSPT', 'ratio', 'B', ccy_convert=True),
+    # y(t) = x(t) / x(t-365) of the co2 level in ppm, index(t) = exp(100.0 * (y(t) - y(t0))
+    IndexSpec('co2', 'CO2', 'CO2SM', 'roc', 'D'),
+    IndexSpec('brent', 'BRENTEU', 'BRENTEU', 'ratio', 'B'),
+    # US Treasury Curve Slope (10Y minus 3M): x['slope'] = x['10y3m']/dt, x['index'] = np.exp(x['slope']-x['slope'][k].values[0])
+    IndexSpec('treasury', 'T10Y3M', 'T10Y3M', 'slope', 'B'),
+    IndexSpec('oil', 'oil', 'PDB', 'ratio', 'B'),
+    IndexSpec('coal', 'coal', 'PTCWCI', 'ratio', 'B'),
+    IndexSpec('gas', 'gas', 'PTTFM1', 'ratio', 'B'),
+    IndexSpec('carbon', 'carbon', 'PCEC', 'ratio', 'B'),
+    IndexSpec('equity', 'equity', 'DJESG', 'ratio', 'B'),
+    IndexSpec('credit', 'credit', 'SNPGBI', 'ratio', 'B'),
+]
+
+# indices of the pricing market data
+MARKET_DATA_INDICES = [spec for spec in INDEX_REGISTRY if spec.index in ('eua', 'co2', 'brent', 'treasury')]
+
+
+class BenchmarkIndexValue(NamedTuple):
+    value: float
+    reference: float
+    latest: float
+    benchmark: Benchmark
+
+
+def reference_benchmark(db: Session, name: str, symbol: str, type: str, date: dt.date) -> Benchmark:
+    """
+    Benchmark value at date, forward filled (backward filled before the first row); computed once and then read
+    from the benchmark_anchor table
+    """
+    anchor = crud.benchmark_anchor.read(db, name, symbol, type, date)
+    if anchor is None:
+        benchmark = crud.benchmark.read_as_of(db, name, symbol, type, date, backfill=True)
+        if benchmark is None:
+            raise ValueError(f"No {name} {type} benchmark")
+        anchor = crud.benchmark_anchor.create(db, date, benchmark)
+    return Benchmark(name=anchor.name, symbol=anchor.symbol, type=anchor.type, date=anchor.source_date,
+                     close=anchor.close, currency=anchor.currency)
+
+
+def latest_benchmark(db: Session, name: str, symbol: str, type: str, date: Optional[dt.date] = None) -> Benchmark:
+    benchmark = crud.benchmark.read_as_of(db, name, symbol, type, date)
+    if benchmark is None:
+        raise ValueError(f"No {name} {type} benchmark")
+    return benchmark
+
+
+def exchange_rate(db: Session, currency: str, date: dt.date) -> Optional[float]:
+    """
+    Rate converting a close in currency to USD at date, None for USD
+    """
+    if currency == 'USD':
+        return None
+    forex = crud.forex.read_exchange_rate_as_of(db, currency, date)
+    if forex is None:
+        raise ValueError(f"No {currency} exchange rate")
+    return forex.close
+
+
+def lookback_benchmark(db: Session, name: str, symbol: str, type: str, date: dt.date, anchored: bool = False) -> Benchmark:
+    """
+    Benchmark value CO2_INDEX_LOOKBACK days before date, the start of its rate of change; anchored for reference dates
+    """
+    start_date = date - dt.timedelta(days=CO2_INDEX_LOOKBACK)
+    if anchored:
+        return reference_benchmark(db, name, symbol, type, start_date)
+    return crud.benchmark.read_as_of(db, name, symbol, type, start_date, backfill=True)
+
+
+def index_from_rows(kind: str, reference: Benchmark, latest: Benchmark,
+                    reference_fx: Optional[float] = None, latest_fx: Optional[float] = None,
+                    reference_start: Optional[float] = None, latest_start: Optional[float] = None) -> BenchmarkIndexValue:
+    """
+    Index of the latest benchmark row against the reference one
+
+    :param kind: "ratio" (latest / reference, in USD with the exchange rates), "slope" (exp of the treasury slope change)
+                 or "roc" (exp of 100 times the change in rate of change from the CO2_INDEX_LOOKBACK days earlier closes)
+    """
+    if kind == "ratio":
+        reference_value = reference.close / reference_fx if reference_fx else reference.close
+        latest_value = latest.close / latest_fx if latest_fx else latest.close
+        value = latest_value / reference_value
+    elif kind == "slope":
+        reference_value = reference.close / TREASURY_SLOPE_YEARS
+        latest_value = latest.close / TREASURY_SLOPE_YEARS
+        value = np.exp(latest_value - reference_value)
+    elif kind == "roc":
+        reference_value = reference.close / reference_start - 1.
+        latest_value = latest.close / latest_start - 1.
+        value = np.exp(100. * (latest_value - reference_value))
+    else:
+        raise ValueError(f"Unknown index kind {kind}")
+
+    return BenchmarkIndexValue(float(value), float(reference_value), float(latest_value), latest)
+
+
+def benchmark_index(db: Session, name: str, symbol: str, type: str, kind: str, reference_date: dt.date,
+                    date: Optional[dt.date] = None, ccy_convert: bool = False) -> BenchmarkIndexValue:
+    """
+    Index of a benchmark on date (its latest value without date) against reference_date, from O(1) rows.
+    The rate of change looks back from date, as the close of date is its latest close forward filled.
+    """
+    reference = reference_benchmark(db, name, symbol, type, reference_date)
+    latest = latest_benchmark(db, name, symbol, type, date)
+
+    inputs = dict()
+    if kind == "ratio" and ccy_convert:
+        inputs["reference_fx"] = exchange_rate(db, reference.currency, reference_date)
+        inputs["latest_fx"] = exchange_rate(db, latest.currency, latest.date)
+    if kind == "roc":
+        inputs["reference_start"] = lookback_benchmark(db, name, symbol, type, reference_date, anchored=True).close
+        inputs["latest_start"] = lookback_benchmark(db, name, symbol, type, date or latest.date).close
+    return index_from_rows(kind, reference, latest, **inputs)
+
+
+def read_indices(db: Session, specs: List[IndexSpec], reference_date: dt.date, date: Optional[dt.date] = None,
+                 queries: Optional[list] = None) -> Tuple[Dict[str, BenchmarkIndexValue], list]:
+    """
+    Indices of specs on date (their latest values without date) against reference_date, in two round-trips.
+    Anchors, exchange rates and lookback closes the union queries can't find (not yet anchored, or back filled) are
+    read one by one; indices that can't be computed are left out.
+
+    :param queries: more crud.market_data queries, read in the first round-trip
+    :return: the indices and the rows of queries
+    """
+    lookback = dt.timedelta(days=CO2_INDEX_LOOKBACK)
+
+    # reference anchors, latest rows and exchange rates at the reference date
+    anchor_keys = [(spec.name, spec.symbol, spec.type, reference_date) for spec in specs] + \
+                  [(spec.name, spec.symbol, spec.type, reference_date - lookback) for spec in specs if spec.kind == 'roc']
+    rows = crud.market_data.read_rows(db, [crud.market_data.anchors(anchor_keys),
+                                           crud.market_data.exchange_rates_as_of(reference_date)] +
+                                      [crud.market_data.benchmark_as_of(spec.name, spec.symbol, spec.type, date, part=spec.index) for spec in specs] +
+                                      (queries or []))
+    anchors = {(row.name, row.symbol, row.type, row.date): row for row in rows if row.part == 'anchor'}
+    reference_fx = {row.name: row.close for row in rows if row.part == 'forex'}
+    latest = {row.part: row for row in rows if row.part in {spec.index for spec in specs}}
+    parts = {'anchor', 'forex'} | set(latest)
+
+    # exchange rates at the latest dates and closes a lookback before them, which depend on the latest dates
+    as_of_queries = []
+    for spec in specs:
+        benchmark = latest.get(spec.index)
+        if benchmark is None:
+            continue
+        if spec.kind == 'ratio' and spec.ccy_convert and benchmark.currency != 'USD':
+            as_of_queries.append(crud.market_data.exchange_rates_as_of(benchmark.date, benchmark.currency, part=spec.index))
+        if spec.kind == 'roc':
+            as_of_queries.append(crud.market_data.benchmark_as_of(spec.name, spec.symbol, spec.type, (date or benchmark.date) - lookback, part=spec.index))
+    as_of = {row.part: row for row in crud.market_data.read_rows(db, as_of_queries)} if as_of_queries else dict()
+
+    indices = dict()
+    for spec in specs:
+        try:
+            benchmark = latest.get(spec.index)
+            if benchmark is None:
+                raise ValueError(f"No {spec.name} {spec.type} benchmark")
+            key = (spec.name, spec.symbol, spec.type)
+            reference = anchors.get(key + (reference_date,)) or reference_benchmark(db, *key, reference_date)
+            inputs = dict()
+            if spec.kind == 'ratio' and spec.ccy_convert:
+                inputs['reference_fx'] = reference_fx[reference.currency] if reference.currency != 'USD' and reference.currency in reference_fx \
+                    else exchange_rate(db, reference.currency, reference_date)
+                inputs['latest_fx'] = as_of[spec.index].close if spec.index in as_of else exchange_rate(db, benchmark.currency, benchmark.date)
+            if spec.kind == 'roc':
+                start = anchors.get(key + (reference_date - lookback,)) or lookback_benchmark(db, *key, reference_date, anchored=True)
+                inputs['reference_start'] = start.close
+                inputs['latest_start'] = as_of[spec.index].close if spec.index in as_of else lookback_benchmark(db, *key, date or benchmark.date).close
+            indices[spec.index] = index_from_rows(spec.kind, reference, benchmark, **inputs)
+        except Exception as ex:
+            print("[-] Exception while computing the {0} index - {1}".format(spec.index, str(ex)))
+
+    return indices, [row for row in rows if row.part not in parts]
+
+
+def read_index_series(db: Session, specs: List[IndexSpec], windows: List[Tuple[dt.date, dt.date]]) -> pd.DataFrame:
+    """
+    USD closes of specs in the date windows, read in one round-trip and aligned on one date index (the dates of the
+    spec frequencies); each close is forward filled within its window, backward filled before its first row there
+    """
+    keys = [(spec.name, spec.symbol, spec.type) for spec in specs]
+    queries = [crud.market_data.benchmark_series(keys, start, end) for start, end in windows] + \
+              [crud.market_data.exchange_rate_series(start, end) for start, end in windows]
+    rows = pd.DataFrame(crud.market_data.read_rows(db, queries),
+                        columns=['part', 'name', 'symbol', 'type', 'date', 'close', 'currency', 'expiry_date', 'source_date'])
+    rows['date'] = pd.to_datetime(rows['date'])
+    rows = rows.drop_duplicates(['part', 'name', 'symbol', 'type', 'date']).sort_values('date')
+    series = {key: group for key, group in rows[rows['part'] == 'series'].groupby(['name', 'symbol', 'type'])}
+    rates = {currency: group.set_index('date')['close'] for currency, group in rows[rows['part'] == 'forex'].groupby('name')}
+
+    frames = []
+    for start, end in windows:
+        days = pd.date_range(start, end, freq='D')
+        dates = pd.DatetimeIndex(sorted(set().union(*[pd.date_range(start, end, freq=spec.frequency) for spec in specs])))
+        window = pd.DataFrame(np.nan, index=days, columns=[spec.index for spec in specs])
+        for spec, key in zip(specs, keys):
+            if key not in series:
+                continue
+            group = series[key][(series[key]['date'] >= days[0]) & (series[key]['date'] <= days[-1])]
+            values = group.set_index('date')['close'].reindex(days, method='pad')
+            currency = group['currency'].iloc[0] if len(group) else 'USD'
+            if spec.ccy_convert and currency != 'USD':
+                rate = rates.get(currency, pd.Series(dtype=float))
+                values = values / rate[(rate.index >= days[0]) & (rate.index <= days[-1])].reindex(days, method='pad')
+            window[spec.index] = values.fillna(method='backfill')
+        frames.append(window.reindex(dates))
+
+    return pd.concat(frames) if frames else pd.DataFrame(columns=[spec.index for spec in specs])
+
+
+def read_index_history(db: Session, specs: List[IndexSpec], reference_date: dt.date, start_date: dt.date,
+                       end_date: dt.date) -> pd.DataFrame:
+    """
+    Daily indices of specs from start_date to end_date, each from the as-of closes of its day, computed at once.
+    Only the rows of the range are read (of the range a lookback earlier too for the rate of change indices), plus
+    the last ones before it whose values are carried forward into it.
+    """
+    references, _ = read_indices(db, specs, reference_date, date=end_date)
+    lookback = dt.timedelta(days=CO2_INDEX_LOOKBACK)
+    day = dt.timedelta(days=1)
+    keys = {spec.index: (spec.name, spec.symbol, spec.type) for spec in specs}
+
+    queries = [crud.market_data.benchmark_series(list(keys.values()), start_date, end_date)] + \
+              [crud.market_data.benchmark_as_of(*keys[spec.index], start_date - day, part='series') for spec in specs]
+    if any(spec.kind == 'roc' for spec in specs):
+        queries += [crud.market_data.benchmark_series([keys[spec.index] for spec in specs if spec.kind == 'roc'],
+                                                      start_date - lookback, end_date - lookback, part='lookback')] + \
+                   [crud.market_data.benchmark_as_of(*keys[spec.index], start_date - lookback - day, part='lookback')
+                    for spec in specs if spec.kind == 'roc']
+    if any(spec.ccy_convert for spec in specs):
+        queries += [crud.market_data.exchange_rate_series(start_date, end_date),
+                    crud.market_data.exchange_rates_as_of(start_date - day)]
+    rows = pd.DataFrame(crud.market_data.read_rows(db, queries),
+                        columns=['part', 'name', 'symbol', 'type', 'date', 'close', 'currency', 'expiry_date', 'source_date'])
+    rows['date'] = pd.to_datetime(rows['date'])
+    rows = rows.sort_values('date')
+
+    def as_of(part: str, key: tuple, dates: pd.DatetimeIndex) -> pd.Series:
+        selected = rows[(rows['part'] == part) & (rows['name'] == key[0]) & (rows['symbol'] == key[1]) & (rows['type'] == key[2])]
+        return selected.drop_duplicates('date', keep='last').set_index('date')['close'].reindex(dates, method='pad')
+
+    days = pd.date_range(start_date, end_date, freq='D')
+    history = pd.DataFrame(np.nan, index=days, columns=[spec.index for spec in specs])
+    for spec in specs:
+        if spec.index not in references:
+            continue
+        reference = references[spec.index].reference
+        latest = as_of('series', keys[spec.index], days).values
+        if spec.kind == 'ratio':
+            currency = references[spec.index].benchmark.currency
+            if spec.ccy_convert and currency != 'USD':
+                latest = latest / as_of('forex', (currency, '', 'forex'), days).values
+            history[spec.index] = latest / reference
+        elif spec.kind == 'slope':
+            history[spec.index] = np.exp(latest / TREASURY_SLOPE_YEARS - reference)
+        elif spec.kind == 'roc':
+            start = as_of('lookback', keys[spec.index], days - lookback).values
+            history[spec.index] = np.exp(100. * ((latest / start - 1.) - reference))
+
+    return history
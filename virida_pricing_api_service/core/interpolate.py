@@ -1,26 +1,40 @@
+import numpy as np
+
+
 class Interpolate:
+    """
+    Curve interpolator: flat left of the first point, linear between points, last slope extrapolated right.
+    Built once per curve; called with a scalar it returns a float, with an array the array of values.
+    """
+
     def __init__(self, x: list, y: list):
         if len(x) != len(y):
             raise ValueError("The number of values in x-axis must be the same as in y-axis")
 
         if any(x2 - x1 <= 0 for x1, x2 in zip(x, x[1:])):
             raise ValueError("Values in x-axis must be in strictly ascending order")
-      
+
         self.x = x
         self.y = y
-        self.intervals = list(zip(x, x[1:], y, y[1:]))
-        self.slopes = [(y2 - y1) / (x2 - x1) for x1, x2, y1, y2 in self.intervals]
-
+        self.times = np.asarray(x, dtype=np.float64)
+        self.rates = np.asarray(y, dtype=np.float64)
+        self.slopes = np.diff(self.rates) / np.diff(self.times)
 
     def __call__(self, x):
-        if x < 0:
+        values = np.asarray(x, dtype=np.float64)
+        if np.any(values < 0):
             raise ValueError("X must be a positive value")
-        
-        if x <= self.x[0]:
-            return self.y[0]
-        elif x > self.x[0] and x < self.x[-1]:
-            x1, x2, y1, y2 = next((x1, x2, y1, y2) for x1, x2, y1, y2 in self.intervals if x >= x1 and x <= x2)
-            return y1 + ((x - x1) / (x2 - x1)) * (y2 - y1)
+
+        if len(self.times) < 2:
+            if np.any(values > self.times[0]):
+                raise ValueError("At least two points are needed to extrapolate the curve")
+            result = np.full(values.shape, self.rates[0])
         else:
-            return self.slopes[-1] * (x - self.x[-1]) + self.y[-1]
+            # first interval [x1, x2] with x <= x2, so a point on a knot is interpolated from the interval left of it
+            i = np.clip(np.searchsorted(self.times[1:], values, side="left"), 0, len(self.times) - 2)
+            x1, x2, y1, y2 = self.times[i], self.times[i + 1], self.rates[i], self.rates[i + 1]
+            inside = y1 + ((values - x1) / (x2 - x1)) * (y2 - y1)
+            right = self.slopes[-1] * (values - self.times[-1]) + self.rates[-1]
+            result = np.where(values <= self.times[0], self.rates[0], np.where(values < self.times[-1], inside, right))
 
+        return float(result) if result.ndim == 0 else result
@@ -0,0 +1,35 @@
+import importlib
+
+from core import weight_store
+from core.static import MODEL_BACKEND
+
+
+class ModelBackendException(Exception):
+    pass
+
+
+def load_model(class_name: str, inputs: dict, units: dict, outputs: dict, weights: str):
+    """
+    Build the model class_name with the weights identifier loaded, using the configured MODEL_BACKEND
+
+    :param class_name: The model class name as stored in model_config ("ViridaPrices", "Platts")
+    :param weights: The weights identifier, i.e. the checkpoint name in MODEL_WEIGHTS_DIRECTORY
+    :return: A callable taking a dict of 2D arrays and returning a dict of output arrays
+    """
+    arrays = weight_store.get(weights)
+
+    if MODEL_BACKEND == "numpy":
+        from core import numpy_models
+        return numpy_models.CLASSES[class_name](inputs=inputs, units=units, outputs=outputs, weights=arrays)
+
+    if MODEL_BACKEND == "tensorflow":
+        # assign copies the arrays into the model's own variables: the memory of the weights is per process and
+        # is not shared through the weight store's mapping as it is with the numpy backend
+        from core.numpy_models import assign_weights
+        class_ = getattr(importlib.import_module("core.models"), class_name)
+        model = class_(inputs=inputs, units=units, outputs=outputs)
+        model.warmup()
+        assign_weights(model, arrays)
+        return model
+
+    raise ModelBackendException(f"Unknown model backend: {MODEL_BACKEND}")
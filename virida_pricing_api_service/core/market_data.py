@@ -0,0 +1,96 @@
+from typing import Callable, NamedTuple, Optional
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+import crud
+from core.helpers import read_market_data, fallback_market_data, read_market_data_v5_v6, fallback_market_data_v5_v6
+from core.static import MARKET_DATA_TTL_SECONDS
+
+
+class FrozenDict(dict):
+    """ Read-only dict, so a snapshot shared by every request can't be changed by one of them """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("The market data snapshot is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value):
+    """ Deep read-only copy of a JSON-like value: dicts become FrozenDict, lists become tuples """
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class Snapshot(NamedTuple):
+    data: FrozenDict
+    generation: int
+    checked_at: float
+
+
+class MarketDataCache:
+    """
+    Market data built once and served from memory to every pricing request.
+
+    Every benchmark, forex and interest_rate write bumps the market data generation in the database. Once the TTL
+    is over, the next request reads the generation and rebuilds the snapshot only if it moved, so requests do no
+    database work in between and see writes at most TTL seconds late (immediately for invalidate() callers).
+
+    :param read: Builds the market data dict, raising if it can't be read
+    :param fallback: Default market data served when it can't be read and there is no snapshot yet
+    """
+
+    def __init__(self, read: Callable, fallback: Callable, ttl: float = MARKET_DATA_TTL_SECONDS) -> None:
+        self.snapshot: Optional[Snapshot] = None
+        self._read = read
+        self._fallback = fallback
+        self._ttl = ttl
+        # one refresh at a time, concurrent requests wait for it instead of reading the database too
+        self._lock = threading.Lock()
+
+    def _fresh(self, snapshot: Optional[Snapshot]) -> bool:
+        return snapshot is not None and time.monotonic() - snapshot.checked_at < self._ttl
+
+    def get(self, db: Session) -> FrozenDict:
+        snapshot = self.snapshot
+        if self._fresh(snapshot):
+            return snapshot.data
+
+        with self._lock:
+            snapshot = self.snapshot
+            if self._fresh(snapshot):
+                return snapshot.data
+
+            try:
+                # read the generation first: a write racing with the build is picked up by the next check
+                generation = crud.market_data.read_generation(db)
+                if snapshot is not None and snapshot.generation == generation:
+                    self.snapshot = snapshot._replace(checked_at=time.monotonic())
+                else:
+                    self.snapshot = Snapshot(data=freeze(self._read(db)), generation=generation, checked_at=time.monotonic())
+                return self.snapshot.data
+            except Exception as ex:
+                print("[-] Exception while reading the market data - {0}".format(str(ex)))
+                # the last snapshot is still better than the defaults, retried on the next request
+                return snapshot.data if snapshot is not None else freeze(self._fallback())
+
+    def invalidate(self) -> None:
+        """ Rebuild on the next request, for writes made by this process """
+        self.snapshot = None
+
+
+market_data = MarketDataCache(read_market_data, fallback_market_data)
+market_data_v5_v6 = MarketDataCache(read_market_data_v5_v6, fallback_market_data_v5_v6)
+
+
+def invalidate() -> None:
+    market_data.invalidate()
+    market_data_v5_v6.invalidate()
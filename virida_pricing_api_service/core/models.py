@@ -1,3 +1,4 @@
+import numpy as np
 import tensorflow as tf
 
 
@@ -87,26 +88,35 @@ class ViridaPrices(tf.keras.Model):
                                                              name='output_layer',
                                                              dtype=tf.float32)]
 
-    ###
-    def __call__(self, inputs):
-        # inputs: dict, numpy arrays, onehot enconded conditions, prices and benchmark
+        # Graph-compiled forward pass, traced once per model (batch dimension left open)
+        self._concatenate = tf.keras.layers.Concatenate()
+        # Keras wraps dict attributes in tracked dicts, which tf.function cannot bind, so the signature stays local
+        self._widths = dict(inputs)
+        signature = {key: tf.TensorSpec(shape=[None, width], dtype=tf.float32) for key, width in inputs.items()}
+        self._inference = tf.function(self._forward, input_signature=[signature])
 
+    def _forward(self, inputs):
         # Inputs
-        x = []
-        for key in self._inputs:
-            x = x + [self._inputs[key](inputs[key])]
-        x = tf.keras.layers.Concatenate()(x)
+        x = self._concatenate([self._inputs[key](inputs[key]) for key in self._inputs])
 
         # Network
         for layer in self._layers:
             x = layer(x)
 
         # Outputs
-        n = list(self._outputs.values())
         x = tf.exp(x)
-        y = dict(zip(list(self._outputs.keys()), tf.split(x, n, axis=1)))
+        return dict(zip(self._outputs.keys(), tf.split(x, list(self._outputs.values()), axis=1)))
 
-        return y
+    def warmup(self):
+        # build the layers eagerly (restoring any pending checkpoint values) and trace the graph
+        inputs = {key: tf.zeros([1, width], dtype=tf.float32) for key, width in self._widths.items()}
+        self._forward(inputs)
+        self._inference(inputs)
+
+    ###
+    def __call__(self, inputs):
+        # inputs: dict, numpy arrays, onehot enconded conditions, prices and benchmark
+        return self._inference({key: np.asarray(inputs[key], dtype=np.float32) for key in self._widths})
 
 
 class Platts(tf.keras.Model):
@@ -129,16 +139,28 @@ class Platts(tf.keras.Model):
       self._layers = self._layers+[tf.keras.layers.Dense(units=n,activation='relu',name='hidden_layer_'+str(n),dtype=tf.float32)]
     n = sum(list(self._outputs.values()))
     self._layers = self._layers+[tf.keras.layers.Dense(units=n,activation='linear',name='output_layer',dtype=tf.float32)]
-###
-  def __call__(self,inputs):
-  # inputs: dict, numpy arrays, onehot enconded conditions, prices and benchmark
 
+    # Graph-compiled forward pass, traced once per model (batch dimension left open)
+    # signature kept local, as in ViridaPrices
+    self._width = sum(inputs.values())
+    signature = {'index': tf.TensorSpec(shape=[None,self._width],dtype=tf.float32)}
+    self._inference = tf.function(self._forward,input_signature=[signature])
+
+  def _forward(self,inputs):
     # Network
     x = inputs['index']
     for layer in self._layers:
       x = layer(x)
     # Outputs
-    n = list(self._outputs.values())
     x = tf.exp(x)
-    y = dict(zip(list(self._outputs.keys()),tf.split(x,n,axis=1)))
-    return y
+    return dict(zip(self._outputs.keys(),tf.split(x,list(self._outputs.values()),axis=1)))
+
+  def warmup(self):
+    # build the layers eagerly (restoring any pending checkpoint values) and trace the graph
+    inputs = {'index': tf.zeros([1,self._width],dtype=tf.float32)}
+    self._forward(inputs)
+    self._inference(inputs)
+###
+  def __call__(self,inputs):
+  # inputs: dict, numpy arrays, onehot enconded conditions, prices and benchmark
+    return self._inference({'index': np.asarray(inputs['index'],dtype=np.float32)})
@@ -0,0 +1,138 @@
+import threading
+
+import numpy as np
+
+
+def export_weights(model) -> dict:
+    """
+    Read the dense layer kernels and biases out of a loaded core.models model
+
+    :param model: A built ViridaPrices or Platts instance (TensorFlow backend)
+    :return: dict of float32 arrays keyed by "<group>/<name>/<kernel|bias>"
+    """
+    weights = {}
+    for key, layer in getattr(model, "_inputs", {}).items():
+        weights[f"input/{key}/kernel"] = layer.kernel.numpy()
+        weights[f"input/{key}/bias"] = layer.bias.numpy()
+    for i, layer in enumerate(model._layers):
+        weights[f"layer/{i}/kernel"] = layer.kernel.numpy()
+        weights[f"layer/{i}/bias"] = layer.bias.numpy()
+    return weights
+
+
+def assign_weights(model, weights: dict) -> None:
+    """
+    Inverse of export_weights: copy the arrays into a built core.models model
+    """
+    for key, layer in getattr(model, "_inputs", {}).items():
+        layer.kernel.assign(weights[f"input/{key}/kernel"])
+        layer.bias.assign(weights[f"input/{key}/bias"])
+    for i, layer in enumerate(model._layers):
+        layer.kernel.assign(weights[f"layer/{i}/kernel"])
+        layer.bias.assign(weights[f"layer/{i}/bias"])
+
+
+class _Dense:
+    """ Dense forward pass with per-thread preallocated output buffers """
+
+    def __init__(self, kernel: np.ndarray, bias: np.ndarray, relu: bool) -> None:
+        self.kernel = np.ascontiguousarray(kernel, dtype=np.float32)
+        self.bias = np.ascontiguousarray(bias, dtype=np.float32)
+        self.relu = relu
+        self.units = self.kernel.shape[1]
+
+    def __call__(self, x: np.ndarray, out: np.ndarray) -> np.ndarray:
+        np.matmul(x, self.kernel, out=out)
+        out += self.bias
+        if self.relu:
+            np.maximum(out, 0., out=out)
+        return out
+
+
+class _NumpyModel:
+    """ Base class for the NumPy-only inference models """
+
+    def __init__(self, outputs: dict, layers: list) -> None:
+        self._outputs = {key: len(value) for key, value in outputs.items()}
+        self._layers = layers
+        self._local = threading.local()
+
+    def _buffers(self, rows: int) -> list:
+        # buffers are grown on demand and kept per thread since models are shared across executor workers
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None or buffers[0].shape[0] < rows:
+            capacity = max(rows, 2 * buffers[0].shape[0] if buffers is not None else 1)
+            buffers = [np.empty((capacity, width), dtype=np.float32) for width in self._buffer_widths()]
+            self._local.buffers = buffers
+        return [buffer[:rows] for buffer in buffers]
+
+    def _buffer_widths(self) -> list:
+        return [layer.units for layer in self._layers[:-1]]
+
+    def _network(self, x: np.ndarray, buffers: list) -> dict:
+        for layer, out in zip(self._layers[:-1], buffers):
+            x = layer(x, out)
+
+        # the output layer gets a fresh array since its slices are handed back to the caller
+        output = self._layers[-1]
+        y = np.matmul(x, output.kernel)
+        y += output.bias
+        np.exp(y, out=y)
+
+        outputs, start = {}, 0
+        for key, n in self._outputs.items():
+            outputs[key] = y[:, start:start + n]
+            start = start + n
+        return outputs
+
+    def warmup(self):
+        pass
+
+
+class NumpyViridaPrices(_NumpyModel):
+    """ NumPy implementation of core.models.ViridaPrices (same math, float32, BLAS matmul) """
+
+    def __init__(self, inputs: dict, units: dict, outputs: dict, weights: dict) -> None:
+        self._inputs = {
+            key: _Dense(weights[f"input/{key}/kernel"], weights[f"input/{key}/bias"], relu=False) for key in inputs
+        }
+        layers = []
+        for i in range(len(units["hidden"]) + 1):
+            layers.append(_Dense(weights[f"layer/{i}/kernel"], weights[f"layer/{i}/bias"], relu=i < len(units["hidden"])))
+        super().__init__(outputs, layers)
+
+    def _buffer_widths(self) -> list:
+        return [sum(layer.units for layer in self._inputs.values())] + super()._buffer_widths()
+
+    def __call__(self, inputs: dict) -> dict:
+        rows = len(next(iter(inputs.values())))
+        buffers = self._buffers(rows)
+
+        # input layers write straight into their slice of the concatenated buffer
+        x, start = buffers[0], 0
+        for key, layer in self._inputs.items():
+            layer(np.asarray(inputs[key], dtype=np.float32), x[:, start:start + layer.units])
+            start = start + layer.units
+
+        return self._network(x, buffers[1:])
+
+
+class NumpyPlatts(_NumpyModel):
+    """ NumPy implementation of core.models.Platts """
+
+    def __init__(self, inputs: dict, units: dict, outputs: dict, weights: dict) -> None:
+        layers = []
+        for i in range(len(units["hidden"]) + 1):
+            layers.append(_Dense(weights[f"layer/{i}/kernel"], weights[f"layer/{i}/bias"], relu=i < len(units["hidden"])))
+        super().__init__(outputs, layers)
+
+    def __call__(self, inputs: dict) -> dict:
+        x = np.asarray(inputs["index"], dtype=np.float32)
+        return self._network(x, self._buffers(len(x)))
+
+
+CLASSES = {
+    "ViridaPrices": NumpyViridaPrices,
+    "Platts": NumpyPlatts
+}
+
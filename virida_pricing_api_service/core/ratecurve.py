@@ -1,3 +1,4 @@
+from functools import lru_cache
 import numpy as np
 import datetime as dt
 
@@ -66,6 +67,35 @@ class RatesCurve:
         else:
             raise Exception("Undefined interpolation space")
 
+    def get_rates(self, dates) -> np.ndarray:
+        """
+        Vectorized get_rate: the rates of an array of dates (datetime or datetime64), same values as get_rate
+        """
+        if self.interpolation_space == 'rate':
+            # whole days, floored as timedelta.days is
+            days = (np.asarray(dates, dtype='datetime64[us]') - np.datetime64(self.valuation_date, 'us')) // np.timedelta64(1, 'D')
+            if (days < 0).any():
+                raise Exception("Error. Date requested is before valuation_date")
+
+            return np.interp(days / 365., self.abscissas, self.ordinates)
+        else:
+            raise Exception("Undefined interpolation space")
+
+
+@lru_cache(maxsize=16)
+def _rates_curve(currency: str, tenor: tuple, rate: tuple, day: dt.date) -> RatesCurve:
+    return RatesCurve(valuation_date=dt.datetime.now(), currency=currency, tenor=list(tenor), rate=list(rate))
+
+
+def rates_curve(currency: str, interest_rates: list) -> RatesCurve:
+    """
+    Curve of the market data interest rates valued now, built once per rates snapshot, currency and day and shared by
+    every project and request (rates of whole-day dates do not change during the day the curve was built)
+
+    :param interest_rates: The market data interest_rates, [{"tenor": "3M", "rate": 0.01}, ...]
+    """
+    return _rates_curve(currency, tuple(x['tenor'] for x in interest_rates), tuple(x['rate'] for x in interest_rates), dt.date.today())
+
 
 if __name__ == "__main__":
 
@@ -77,6 +77,31 @@ CO2_INDEX_LOOKBACK = 365
 
 CORSIA_MIN_YEAR = 2016
 
+# inference executor (blocking pricing work is run outside of the event loop)
+INFERENCE_MAX_WORKERS = getattr(config, "INFERENCE_MAX_WORKERS", 4)
+INFERENCE_MAX_QUEUE_DEPTH = getattr(config, "INFERENCE_MAX_QUEUE_DEPTH", 32)
+INFERENCE_TIMEOUT_SECONDS = getattr(config, "INFERENCE_TIMEOUT_SECONDS", 120)
+
+# dynamic batching of concurrent /valuation forward passes (opt-in)
+INFERENCE_BATCHING_ENABLED = getattr(config, "INFERENCE_BATCHING_ENABLED", False)
+INFERENCE_BATCHING_WINDOW_MS = getattr(config, "INFERENCE_BATCHING_WINDOW_MS", 3)
+INFERENCE_BATCHING_MAX_ROWS = getattr(config, "INFERENCE_BATCHING_MAX_ROWS", 256)
+
+# model inference backend: "tensorflow" (core.models) or "numpy" (core.numpy_models)
+MODEL_BACKEND = getattr(config, "MODEL_BACKEND", "tensorflow")
+MODEL_WEIGHTS_DIRECTORY = "./core/data"
+# how often each pod checks the model_config generation for changes made by other pods
+MODEL_CONFIG_POLL_SECONDS = getattr(config, "MODEL_CONFIG_POLL_SECONDS", 30)
+
+# non-verbose /history requests read past dates already priced from the history_cache table
+HISTORY_CACHE_ENABLED = getattr(config, "HISTORY_CACHE_ENABLED", True)
+
+# in-process market data snapshot, the market_data generation is checked for writes once the TTL is over
+MARKET_DATA_TTL_SECONDS = getattr(config, "MARKET_DATA_TTL_SECONDS", 60)
+
+# the static service serves the one-hot column order of each mapping attribute, drift tables are aligned on it
+STATIC_ATTRIBUTES_URL = getattr(config, "STATIC_ATTRIBUTES_URL", config.STATIC_MAPPING_URL.rsplit("/projects/", 1)[0] + "/attributes")
+
 EUA_SPOT_REFERENCE_USD = 31.33  # Q4 2020 spot EUA (EUR) x fx to convert in USD
 SCALING_STD = 1.0
 SCALING_INTERCEPT = 0.5
@@ -0,0 +1,150 @@
+import os
+import glob
+import json
+import threading
+
+import numpy as np
+
+from core.static import MODEL_WEIGHTS_DIRECTORY
+
+# arrays are aligned so every kernel/bias view starts on a cache line
+_ALIGNMENT = 64
+
+# checkpoint attribute of the model -> artifact key group (see core.numpy_models.export_weights)
+_CHECKPOINT_GROUPS = {"_inputs": "input", "_layers": "layer"}
+
+_artifacts = {}
+_lock = threading.Lock()
+
+
+class WeightStoreException(Exception):
+    pass
+
+
+def _paths(weights: str) -> tuple:
+    path = f"{MODEL_WEIGHTS_DIRECTORY}/{weights}"
+    return f"{path}.weights", f"{path}.weights.json"
+
+
+def write(weights: str, arrays: dict) -> None:
+    """
+    Write arrays as one flat float32 file plus a JSON index of offsets and shapes
+
+    Both files are written to a temporary name and moved in place, so uvicorn workers
+    converting the same weights concurrently never observe a partial artifact.
+    """
+    data_path, index_path = _paths(weights)
+    index, offset = {}, 0
+    for key, array in arrays.items():
+        index[key] = {"offset": offset, "shape": list(array.shape)}
+        offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+    suffix = f".{os.getpid()}.tmp"
+    data = np.memmap(data_path + suffix, dtype=np.uint8, mode="w+", shape=(max(offset, 1),))
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array, dtype=np.float32)
+        start = index[key]["offset"]
+        data[start:start + array.nbytes] = array.view(np.uint8).ravel()
+    data.flush()
+    del data
+
+    with open(index_path + suffix, "w") as f:
+        json.dump(index, f)
+
+    os.replace(data_path + suffix, data_path)
+    os.replace(index_path + suffix, index_path)
+
+
+def _open(weights: str) -> dict:
+    data_path, index_path = _paths(weights)
+    with open(index_path) as f:
+        index = json.load(f)
+
+    # read-only mapping: pages come from the OS page cache and are shared by every process on the host, as long
+    # as the arrays are used in place (MODEL_BACKEND="numpy"; the tensorflow backend copies them, see core.loader)
+    data = np.memmap(data_path, dtype=np.uint8, mode="r")
+    arrays = {}
+    for key, entry in index.items():
+        shape = tuple(entry["shape"])
+        count = int(np.prod(shape))
+        arrays[key] = np.frombuffer(data, dtype=np.float32, count=count, offset=entry["offset"]).reshape(shape)
+    return arrays
+
+
+def _checkpoint_arrays(weights: str) -> dict:
+    """
+    Read the dense kernels and biases straight out of a TensorFlow checkpoint
+
+    The checkpoint variable names follow the model attributes ("_inputs/<name>/kernel", "_layers/<i>/bias"), so
+    no model needs to be built and the model_config row is not needed to convert.
+    """
+    import tensorflow as tf
+
+    reader = tf.train.load_checkpoint(f"{MODEL_WEIGHTS_DIRECTORY}/{weights}")
+    arrays = {}
+    for name in sorted(reader.get_variable_to_shape_map()):
+        parts = name.split("/")
+        # optimizer slots and save counters are not part of the forward pass
+        if parts[0] in _CHECKPOINT_GROUPS and parts[-2:] == [".ATTRIBUTES", "VARIABLE_VALUE"]:
+            arrays["/".join([_CHECKPOINT_GROUPS[parts[0]]] + parts[1:-2])] = reader.get_tensor(name)
+    if not arrays:
+        raise WeightStoreException(f"No model variables in checkpoint {weights}")
+    return arrays
+
+
+def convert(weights: str) -> None:
+    """
+    Convert the checkpoint weights in MODEL_WEIGHTS_DIRECTORY to its flat artifact
+    """
+    write(weights, _checkpoint_arrays(weights))
+
+
+def convert_all() -> list:
+    """
+    Convert every checkpoint in MODEL_WEIGHTS_DIRECTORY, run at image build time (see Dockerfile)
+
+    Checkpoints shipped as an index only (their data shards not in the build context) are skipped and left to
+    the conversion on first use.
+
+    :return: The converted weights identifiers
+    """
+    converted = []
+    for index_path in sorted(glob.glob(f"{MODEL_WEIGHTS_DIRECTORY}/*.index")):
+        weights = os.path.basename(index_path)[:-len(".index")]
+        if not glob.glob(f"{MODEL_WEIGHTS_DIRECTORY}/{weights}.data-*"):
+            print(f"[-] Skipping weights {weights}: no data shard")
+            continue
+        convert(weights)
+        converted.append(weights)
+        print(f"[+] Converted weights {weights}")
+    return converted
+
+
+def get(weights: str) -> dict:
+    """
+    Return the read-only weight arrays for the weights identifier
+
+    Artifacts are converted at image build time. A checkpoint with no artifact (e.g. weights added after the
+    image was built) is converted on first use and written next to it. Every model_config row referencing the
+    same identifier shares the one mapping held here.
+
+    :param weights: The weights identifier, i.e. the checkpoint name in MODEL_WEIGHTS_DIRECTORY
+    :return: dict of float32 arrays keyed by "<group>/<name>/<kernel|bias>"
+    """
+    with _lock:
+        if weights in _artifacts:
+            return _artifacts[weights]
+
+        data_path, index_path = _paths(weights)
+        if not (os.path.exists(data_path) and os.path.exists(index_path)):
+            try:
+                convert(weights)
+            except Exception as e:
+                raise WeightStoreException(f"Failed to convert weights {weights}: {e}")
+
+        _artifacts[weights] = _open(weights)
+        return _artifacts[weights]
+
+
+if __name__ == "__main__":
+    convert_all()
@@ -1,17 +1,21 @@
-from typing import List
+from typing import Callable, List, NamedTuple, Optional
+from dataclasses import dataclass
 import json
-import importlib
+import threading
+import time
 import datetime as dt
 
 import numpy as np
 import pandas as pd
-import tensorflow as tf
 from sqlalchemy.orm import Session
 
 import crud
+from core.loader import load_model
+from core.static import MODEL_CONFIG_POLL_SECONDS
 from database import DatabaseContextManager
 
-models = pd.DataFrame()
+MODEL_KEY_COLUMNS = ["class", "inputs", "structure", "outputs", "weights"]
+METADATA_COLUMNS = ["outputs", "drift", "vintage_disc_fact", "corsia_min_year", "bid_ask_spread", "weights"]
 
 
 class WeightsException(Exception):
@@ -26,90 +30,286 @@ class WeightReadingException(WeightsException):
     pass
 
 
+def _value(row: pd.Series, column: str):
+    value = row.get(column)
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+@dataclass(frozen=True)
+class ModelMetadata:
+    """ Config values used by the history pricing loop, parsed once per distinct model_config """
+    benchmarks: List[str]
+    drift: dict
+    vintage_discount_factors: dict
+    corsia_min_year: Optional[int]
+    bid_ask_spread: Optional[float]
+    weights: str
+
+    @classmethod
+    def from_row(cls, row: pd.Series) -> "ModelMetadata":
+        corsia_min_year = _value(row, "corsia_min_year")
+        bid_ask_spread = _value(row, "bid_ask_spread")
+        return cls(
+            benchmarks=list(row["outputs"]["beta"]),
+            drift=_value(row, "drift") or {},
+            vintage_discount_factors=_value(row, "vintage_disc_fact") or {},
+            corsia_min_year=int(corsia_min_year) if corsia_min_year is not None else None,
+            bid_ask_spread=float(bid_ask_spread) if bid_ask_spread is not None else None,
+            weights=row["weights"]
+        )
+
+
+class Snapshot(NamedTuple):
+    """ Immutable view of the loaded models for one model_config generation, replaced as a whole on reload """
+    frames: dict
+    generation: int
+    version: int
+
+
+def _frames(configs: list) -> List[pd.DataFrame]:
+    """
+    One frame per (name, version), indexed by date, with the JSON config expanded into columns in a single
+    vectorized pass. Nested values (inputs, outputs, drift, vintage_disc_fact, ...) are kept as parsed objects.
+    """
+    df = pd.concat([
+        pd.DataFrame({
+            "date": [config.date for config in configs],
+            "name": [config.model_name for config in configs],
+            "version": [config.model_version for config in configs]
+        }),
+        # one level only, same as pd.json_normalize(max_level=0) but without walking the nested values
+        pd.DataFrame([config.config for config in configs])
+    ], axis=1).set_index("date")
+
+    # keys only used by other models are all NaN within a group
+    return [
+        new.dropna(axis="columns", how="all").fillna(method="pad")
+        for _, new in df.groupby(["name", "version"], sort=False)
+    ]
+
+
 def _configs(db: Session) -> List[pd.DataFrame]:
     configs = crud.model_config.read(db)
     if not configs:
         raise WeightReadingException("No model_config data is available in the database")
+    return _frames(configs)
 
-    df = pd.DataFrame([{
-            "date": config.date,
-            "name": config.model_name,
-            "version": config.model_version,
-            "config": config.config
-        } for config in configs]
-    ).set_index("date")
 
-    for name, version in set([(config.model_name, config.model_version) for config in configs]):
-        new = df[(df["name"] == name) & (df["version"] == version)].copy()
+def _key(row: pd.Series) -> tuple:
+    return tuple(
+        json.dumps(row[column], sort_keys=True) if isinstance(row[column], (dict, list)) else row[column]
+        for column in MODEL_KEY_COLUMNS
+    )
 
-        for date, row in new.iterrows():
-            for key, value in row["config"].items():
-                new.loc[date, key] = str(value) if type(value) == dict else value
 
-        new.drop(['config'], axis='columns', inplace=True)  
-        new.fillna(method="pad", inplace=True)
-        yield new
+def _metadata(row: pd.Series, cache: dict) -> ModelMetadata:
+    # rows with identical config values share one ModelMetadata
+    key = tuple(json.dumps(_value(row, column), sort_keys=True, default=str) for column in METADATA_COLUMNS)
+    if key not in cache:
+        cache[key] = ModelMetadata.from_row(row)
+    return cache[key]
 
 
-def _model(row: pd.Series) -> tf.keras.Model:
-    class_ = getattr(importlib.import_module("core.models"), row["class"])
-    model = class_(
-        inputs = json.loads(row["inputs"].replace("\'", "\"")),
-        units = json.loads(row["structure"].replace("\'", "\"")),
-        outputs = json.loads(row["outputs"].replace("\'", "\""))
+def _build(row: pd.Series):
+    return load_model(
+        row["class"],
+        inputs = row["inputs"],
+        units = row["structure"],
+        outputs = row["outputs"],
+        weights = row["weights"]
     )
-    model.load_weights(f"./core/data/{row['weights']}")
-    return model
 
 
-def load() -> list:
-    global models
-    if not models.empty:
-        return
-    
-    with DatabaseContextManager() as db:
+class ModelRegistry:
+    """
+    Models for every model_config row, served from an in-memory snapshot per model_config generation.
+
+    Every model_config write bumps the generation in the database; each pod polls it on a timer and
+    reloads in the background when it moved, so get() does no database work.
+
+    :param session_factory: Context manager factory yielding a database Session
+    :param build: Builds the model of a model_config row
+    """
+
+    def __init__(self, session_factory: Callable = DatabaseContextManager, build: Callable = _build) -> None:
+        self.snapshot = None
+        # model instances keyed by (class, inputs, structure, outputs, weights), shared by every config row using them
+        self.instances = {}
+        self._session_factory = session_factory
+        self._build = build
+        # serialises snapshot builds (and every access to instances)
+        self._build_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._reload_requested = False
+        self._reloading = False
+        self._last_reload_seconds = None
+        self._last_reload_error = None
+        self._stop_polling = threading.Event()
+        self._poller = None
+
+    def _model(self, row: pd.Series):
+        key = _key(row)
+        if key not in self.instances:
+            self.instances[key] = self._build(row)
+        return self.instances[key]
+
+    def _build_frames(self, db: Session) -> dict:
+        frames = {}
+        metadata = {}
         for df in _configs(db):
-            df["model"] = df.apply(lambda row: _model(row), axis=1)
-            models = models.append(df)
-
-
-def reload() -> list:
-    global models
-    models = pd.DataFrame()
-    return load()
-
-
-def get(db: Session, name: str, version: str, start_date: dt.date, end_date: dt.date) -> pd.DataFrame:
-    if models.empty:
-        load()
-
-    df = models[(models["name"] == name) & (models["version"] == version)].copy()
-    if df.empty:
-        raise WeightReadingException(f"No weights found in the database for model with name: {name} and version: {version}")
-
-    # Read model_config data from database but use the cached model instance.
-    # Note: Although we perform the weight reloading, for now this is necessary due to the app running across multiple k8s pods
-    refreshed_df = next(df for df in _configs(db) if df.iloc[0]["name"] == name and df.iloc[0]["version"] == version)
-    df = pd.concat([df["model"], refreshed_df], axis=1).sort_index().fillna(method="pad")
-
-    first_date = df.index[0]
-    last_date = df.index[-1]
-
-    if end_date < first_date:
-        df.rename(index={first_date: start_date}, inplace=True)
-        return df[df.index == start_date]
-
-    if start_date > last_date:
-        df.rename(index={last_date: start_date}, inplace=True)
-        return df[df.index == start_date]
-    
-    if start_date < first_date:
-        df.rename(index={first_date: start_date}, inplace=True)
-    
-    if start_date not in df.index:
-        df.loc[start_date, df.columns] = np.nan
-        df.sort_index(inplace=True)
-        df.fillna(method="pad", inplace=True)
-    
-    df = df[(df.index >= start_date) & (df.index <= end_date)]
-    return df
+            # only model keys not already in instances are actually loaded
+            df["model"] = df.apply(lambda row: self._model(row), axis=1)
+            df["metadata"] = df.apply(lambda row: _metadata(row, metadata), axis=1)
+            frames[(df.iloc[0]["name"], df.iloc[0]["version"])] = df.sort_index()
+
+        # drop instances no longer referenced by any config row
+        used = set(key for df in frames.values() for key in df.apply(lambda row: _key(row), axis=1))
+        for key in set(self.instances) - used:
+            del self.instances[key]
+
+        return frames
+
+    def _swap(self) -> None:
+        start = time.perf_counter()
+        with self._session_factory() as db:
+            # read the generation first: a write racing with the build is picked up by the next poll
+            generation = crud.model_config.read_generation(db)
+            frames = self._build_frames(db)
+        self.snapshot = Snapshot(
+            frames=frames,
+            generation=generation,
+            version=self.snapshot.version + 1 if self.snapshot else 1
+        )
+        self._last_reload_seconds = time.perf_counter() - start
+
+    def load(self) -> None:
+        """
+        Build the first snapshot, blocking; concurrent callers wait for it instead of loading twice
+        """
+        if self.snapshot is not None:
+            return
+
+        with self._build_lock:
+            if self.snapshot is None:
+                self._swap()
+
+    def _reload_loop(self) -> None:
+        while True:
+            with self._state_lock:
+                if not self._reload_requested:
+                    self._reloading = False
+                    return
+                self._reload_requested = False
+
+            try:
+                with self._build_lock:
+                    self._swap()
+                self._last_reload_error = None
+            except Exception as ex:
+                self._last_reload_error = str(ex)
+                print("[-] Exception while reloading the model weights - {0}".format(str(ex)))
+
+    def reload(self) -> None:
+        """
+        Rebuild the snapshot in a background thread, readers keep using the current one until it is swapped.
+        Reloads requested while one is running are coalesced into a single follow-up reload.
+        """
+        with self._state_lock:
+            self._reload_requested = True
+            if self._reloading:
+                return
+            self._reloading = True
+
+        threading.Thread(target=self._reload_loop, name="weights-reload", daemon=True).start()
+
+    def poll(self) -> bool:
+        """
+        Reload when the model_config generation in the database differs from the snapshot's, purging the
+        history_cache rows of every other generation
+
+        :return: True if a reload was started
+        """
+        current = self.snapshot
+        with self._session_factory() as db:
+            generation = crud.model_config.read_generation(db)
+            if current is not None and current.generation == generation:
+                return False
+            # rows cached by pods under the previous generation
+            crud.history_cache.purge(db, generation)
+        self.reload()
+        return True
+
+    def _poll_loop(self, interval: float) -> None:
+        while not self._stop_polling.wait(interval):
+            try:
+                self.poll()
+            except Exception as ex:
+                print("[-] Exception while polling the model_config generation - {0}".format(str(ex)))
+
+    def start_polling(self, interval: float = MODEL_CONFIG_POLL_SECONDS) -> None:
+        if self._poller is not None:
+            return
+        self._stop_polling.clear()
+        self._poller = threading.Thread(target=self._poll_loop, args=(interval,), name="weights-poll", daemon=True)
+        self._poller.start()
+
+    def stop_polling(self) -> None:
+        if self._poller is None:
+            return
+        self._stop_polling.set()
+        self._poller.join()
+        self._poller = None
+
+    def status(self) -> dict:
+        current = self.snapshot
+        return {
+            "version": current.version if current else 0,
+            "generation": current.generation if current else None,
+            "models": len(self.instances),
+            "reloading": self._reloading,
+            "last_reload_seconds": self._last_reload_seconds,
+            "last_reload_error": self._last_reload_error
+        }
+
+    def get(self, name: str, version: str, start_date: dt.date, end_date: dt.date) -> pd.DataFrame:
+        self.load()
+
+        df = self.snapshot.frames.get((name, version))
+        if df is None:
+            raise WeightReadingException(f"No weights found in the database for model with name: {name} and version: {version}")
+        df = df.copy()
+
+        first_date = df.index[0]
+        last_date = df.index[-1]
+
+        if end_date < first_date:
+            df.rename(index={first_date: start_date}, inplace=True)
+            return df[df.index == start_date]
+
+        if start_date > last_date:
+            df.rename(index={last_date: start_date}, inplace=True)
+            return df[df.index == start_date]
+
+        if start_date < first_date:
+            df.rename(index={first_date: start_date}, inplace=True)
+
+        if start_date not in df.index:
+            df.loc[start_date, df.columns] = np.nan
+            df.sort_index(inplace=True)
+            df.fillna(method="pad", inplace=True)
+
+        df = df[(df.index >= start_date) & (df.index <= end_date)]
+        return df
+
+
+registry = ModelRegistry()
+
+load = registry.load
+reload = registry.reload
+poll = registry.poll
+start_polling = registry.start_polling
+stop_polling = registry.stop_polling
+status = registry.status
+get = registry.get
@@ -1 +1 @@
-from . import forex, benchmark, benchmark_index, request, limit, interest_rate, api_key, standardized_instrument, config, model_config, system, interest_curve
+from . import forex, benchmark_anchor, benchmark, benchmark_index, request, limit, interest_rate, api_key, standardized_instrument, config, model_config, system, interest_curve, history_cache, market_data
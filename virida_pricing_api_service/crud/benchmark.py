@@ -9,6 +9,7 @@ from pandas.tseries.offsets import BDay
 import datetime as dt
 from models import Benchmark
 from crud.forex import fetch_forex_data
+from crud import market_data, benchmark_anchor
 from schemas.benchmark import BenchmarkMetric, BenchmarkCreate, BenchmarkUpdate, BenchmarkDelete
 
 
@@ -157,6 +158,19 @@ def read(db: Session, start_date: dt.date, end_date: dt.date, name: str=None, ty
     return query.filter(Benchmark.date >= start_date).filter(Benchmark.date <= end_date).all()
 
 
+def read_columns(db: Session, start_date: dt.date, end_date: dt.date) -> dict:
+    """
+    Benchmarks between start_date and end_date as column name to list of values, without building ORM objects
+    """
+    columns = [column.name for column in Benchmark.__table__.columns]
+    rows = db.query(*[getattr(Benchmark, column) for column in columns]) \
+        .filter(Benchmark.date >= start_date) \
+        .filter(Benchmark.date <= end_date) \
+        .all()
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return {column: list(value) for column, value in zip(columns, values)}
+
+
 def read_before(db: Session, date: dt.date) -> List[Benchmark]:
     latest = db.query(Benchmark.name, func.max(Benchmark.date).label("max_date")) \
                 .filter(Benchmark.date <= date) \
@@ -176,6 +190,21 @@ def read_latest(db: Session, name: str, date: dt.date) -> Benchmark:
              .first()
 
 
+def read_as_of(db: Session, name: str, symbol: str, type: str, date: dt.date = None, backfill: bool = False) -> Benchmark:
+    """
+    Latest row of the benchmark on or before date (its latest row without date), read through the primary key;
+    with backfill, the first row after date when there is none before it
+    """
+    query = db.query(Benchmark).filter_by(name=name, symbol=symbol, type=type)
+    if date is None:
+        return query.order_by(Benchmark.date.desc()).first()
+
+    benchmark = query.filter(Benchmark.date <= date).order_by(Benchmark.date.desc()).first()
+    if benchmark is None and backfill:
+        benchmark = query.filter(Benchmark.date > date).order_by(Benchmark.date).first()
+    return benchmark
+
+
 def read_dataframe(db: Session, names: List[str], start_date: dt.date, end_date: dt.date):
     benchmarks = read(db, start_date, end_date)
     if not benchmarks:
@@ -206,6 +235,8 @@ def create(db: Session, benchmark: BenchmarkCreate):
     try:
         db_benchmark = Benchmark(**benchmark.dict())
         db.add(db_benchmark)
+        benchmark_anchor.invalidate(db, benchmark.name, benchmark.symbol, benchmark.type, benchmark.date)
+        market_data.bump_generation(db)
         db.commit()
         db.refresh(db_benchmark)
         return db_benchmark
@@ -227,6 +258,8 @@ def update(db: Session, benchmark: BenchmarkUpdate):
 
         for key, value in benchmark.dict(exclude_unset=True).items():
             setattr(db_benchmark, key, value)
+        benchmark_anchor.invalidate(db, benchmark.name, benchmark.symbol, benchmark.type, benchmark.date)
+        market_data.bump_generation(db)
         db.commit()
 
         return db_benchmark
@@ -247,6 +280,8 @@ def delete(db: Session, benchmark: BenchmarkDelete):
             return
         
         db.delete(db_benchmark)
+        benchmark_anchor.invalidate(db, benchmark.name, benchmark.symbol, benchmark.type, benchmark.date)
+        market_data.bump_generation(db)
         db.commit()
         return True
     except SQLAlchemyError:
@@ -0,0 +1,41 @@
+import datetime as dt
+from typing import Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from models import Benchmark, BenchmarkAnchor
+
+
+def read(db: Session, name: str, symbol: str, type: str, date: dt.date) -> Optional[BenchmarkAnchor]:
+    return db.query(BenchmarkAnchor).filter_by(name=name, symbol=symbol, type=type, date=date).first()
+
+
+def create(db: Session, date: dt.date, benchmark: Benchmark) -> BenchmarkAnchor:
+    """
+    Persist the value of benchmark as the anchor of date; an anchor written by a concurrent request makes it a no-op
+
+    :return: the anchor, persisted or not
+    """
+    db_anchor = BenchmarkAnchor(name=benchmark.name, symbol=benchmark.symbol, type=benchmark.type, date=date,
+                                source_date=benchmark.date, close=benchmark.close, currency=benchmark.currency)
+    try:
+        db.add(db_anchor)
+        db.commit()
+    except SQLAlchemyError as ex:
+        db.rollback()
+        print("[-] Exception while writing the benchmark anchor - {0}".format(str(ex)))
+    return db_anchor
+
+
+def invalidate(db: Session, name: str, symbol: str, type: str, date: dt.date) -> None:
+    """
+    Delete the anchors of the benchmark a row written on date can change: the ones on or after date, filled forward
+    from it, and the ones filled backward from a row on or after date.
+    Runs in the caller's transaction, so the anchors are dropped together with the write that makes them stale.
+    """
+    db.query(BenchmarkAnchor) \
+        .filter_by(name=name, symbol=symbol, type=type) \
+        .filter(or_(BenchmarkAnchor.date >= date, BenchmarkAnchor.source_date >= date)) \
+        .delete(synchronize_session=False)
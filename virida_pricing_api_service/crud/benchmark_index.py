@@ -7,7 +7,9 @@ from sqlalchemy import func, or_
 from sqlalchemy.exc import SQLAlchemyError
 import numpy as np
 import pandas as pd
+import database
 from models import BenchmarkIndex
+from crud import history_cache
 
 
 class BenchmarkIndexException(Exception):
@@ -48,6 +50,19 @@ def read_benchmark_names(db: Session) -> List[str]:
     return [name_tuple[0] for name_tuple in db.query(BenchmarkIndex.benchmark).distinct().all()]
 
 
+def read_series_dates(db: Session, start_date: Optional[dt.date] = None, end_date: Optional[dt.date] = None, first: bool = True) -> dict:
+    """
+    First (or last) date of each benchmark between start_date and end_date
+    """
+    aggregate = func.min if first else func.max
+    query = db.query(BenchmarkIndex.benchmark, aggregate(BenchmarkIndex.date))
+    if start_date:
+        query = query.filter(BenchmarkIndex.date >= start_date)
+    if end_date:
+        query = query.filter(BenchmarkIndex.date <= end_date)
+    return dict(query.group_by(BenchmarkIndex.benchmark).all())
+
+
 def min_date(db: Session) -> dt.date:
     min_dates_query = db.query(func.min(BenchmarkIndex.date)) \
                         .group_by(BenchmarkIndex.benchmark) \
@@ -114,10 +129,28 @@ def read_dataframe(db: Session, start_date: dt.date, end_date: dt.date) -> pd.Da
     return df
 
 
+def upsert(db: Session, indexes: list, commit: bool = True) -> None:
+    """
+    Write the indexes in one statement, overwriting the stored ones of the same date and benchmark, so reruns are safe;
+    commit=False leaves the transaction to the caller
+    """
+    if not indexes:
+        return
+    try:
+        database.upsert(db, BenchmarkIndex.__table__, [index.dict() for index in indexes])
+        history_cache.invalidate(db, min(index.date for index in indexes))
+        if commit:
+            db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise e
+
+
 def create(db: Session, index: BenchmarkIndex):
     try:
         db_index = BenchmarkIndex(**index.dict())
         db.add(db_index)
+        history_cache.invalidate(db, index.date)
         db.commit()
         db.refresh(db_index)
         return db_index
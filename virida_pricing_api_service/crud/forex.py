@@ -3,11 +3,20 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from schemas.forex import ForexCreate
 from models import Forex
+from crud import market_data
 import pandas as pd
 
 def read_euro_exchange_rate_by_date(db: Session, date: dt.date):
     return db.query(Forex).filter(Forex.date <= date).filter(Forex.currency == "EUR").order_by(Forex.date.desc()).first()
 
+def read_exchange_rate_as_of(db: Session, currency: str, date: dt.date):
+    """
+    Latest rate of currency on or before date, the first one after date when there is none before it
+    """
+    query = db.query(Forex).filter(Forex.currency == currency)
+    return query.filter(Forex.date <= date).order_by(Forex.date.desc()).first() or \
+        query.filter(Forex.date > date).order_by(Forex.date).first()
+
 def read_latest_euro_exchange_rate(db: Session):
     max_date = db.query(func.max(Forex.date))
     return db.query(Forex).filter(Forex.date == max_date).filter(Forex.currency == "EUR").one()
@@ -41,6 +50,7 @@ def fetch_forex_data(db: Session, currency=None, start_date=None):
 def create(db: Session, forex: ForexCreate):
     db_forex = Forex(**forex.dict())
     db.add(db_forex)
+    market_data.bump_generation(db)
     db.commit()
     db.refresh(db_forex)
     return db_forex
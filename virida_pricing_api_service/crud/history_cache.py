@@ -0,0 +1,65 @@
+from typing import List, Optional
+import datetime as dt
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from models import HistoryCache
+
+
+def read(db: Session, model_name: str, model_version: str, generation: int, scenarios: List[str],
+         start_date: dt.date, end_date: dt.date) -> list:
+    """
+    Cached (scenario, date, mid, bid, ask) rows of the scenario fingerprints between start_date and end_date
+    """
+    return db.query(HistoryCache.scenario, HistoryCache.date, HistoryCache.mid, HistoryCache.bid, HistoryCache.ask) \
+        .filter(HistoryCache.model_name == model_name) \
+        .filter(HistoryCache.model_version == model_version) \
+        .filter(HistoryCache.generation == generation) \
+        .filter(HistoryCache.scenario.in_(scenarios)) \
+        .filter(HistoryCache.date >= start_date) \
+        .filter(HistoryCache.date <= end_date) \
+        .all()
+
+
+def create(db: Session, rows: List[dict]) -> bool:
+    """
+    Insert cache rows in one statement; rows already written by a concurrent request make it a no-op
+
+    :return: False if the rows could not be written
+    """
+    if not rows:
+        return True
+    try:
+        db.execute(HistoryCache.__table__.insert(), rows)
+        db.commit()
+        return True
+    except SQLAlchemyError as ex:
+        db.rollback()
+        print("[-] Exception while writing the history cache - {0}".format(str(ex)))
+        return False
+
+
+def invalidate(db: Session, date: Optional[dt.date] = None) -> None:
+    """
+    Delete the cached prices of date and every later date, as they are forward filled from it; all of them without date.
+    Runs in the caller's transaction, so the cache is dropped together with the write that makes it stale.
+    """
+    query = db.query(HistoryCache)
+    if date is not None:
+        query = query.filter(HistoryCache.date >= date)
+    query.delete(synchronize_session=False)
+
+
+def purge(db: Session, generation: int) -> None:
+    """
+    Delete the cached prices of every model_config generation but the current one. Model_config writes drop the
+    whole cache, but pods still pricing from their previous snapshot keep writing rows of the old generation until
+    they reload, and those rows are never read again.
+    """
+    try:
+        db.query(HistoryCache).filter(HistoryCache.generation != generation).delete(synchronize_session=False)
+        db.commit()
+    except SQLAlchemyError as ex:
+        db.rollback()
+        print("[-] Exception while purging the history cache - {0}".format(str(ex)))
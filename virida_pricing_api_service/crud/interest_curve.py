@@ -3,9 +3,12 @@ import datetime as dt
 
 import pandas as pd
 from sqlalchemy import desc, func
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
+import database
 from models import InterestCurve
+from crud import history_cache
 
 
 class InterestCurveException(Exception):
@@ -21,6 +24,20 @@ def read(db: Session, start_date: Optional[dt.date] = None, end_date: Optional[d
     return query.all()
 
 
+def read_series_dates(db: Session, start_date: Optional[dt.date] = None, end_date: Optional[dt.date] = None, first: bool = True,
+                      curve: Optional[str] = "eua_curve") -> dict:
+    """
+    First (or last) date of the curve between start_date and end_date, as {curve: date}
+    """
+    aggregate = func.min if first else func.max
+    query = db.query(InterestCurve.curve, aggregate(InterestCurve.date)).filter(InterestCurve.curve == curve)
+    if start_date:
+        query = query.filter(InterestCurve.date >= start_date)
+    if end_date:
+        query = query.filter(InterestCurve.date <= end_date)
+    return dict(query.group_by(InterestCurve.curve).all())
+
+
 def _read_date(db: Session, first_date: bool=True):
     if first_date:
         result = db.query(func.min(InterestCurve.date)).first()
@@ -62,9 +79,27 @@ def read_dataframe(db: Session, start_date: dt.date, end_date: dt.date) -> pd.Da
     return _create_df(curves, start_date, end_date)
 
 
+def upsert(db: Session, interest_curves: list, commit: bool = True) -> None:
+    """
+    Write the curves in one statement, overwriting the stored ones of the same date and curve, so reruns are safe;
+    commit=False leaves the transaction to the caller
+    """
+    if not interest_curves:
+        return
+    try:
+        database.upsert(db, InterestCurve.__table__, [interest_curve.dict() for interest_curve in interest_curves])
+        history_cache.invalidate(db, min(interest_curve.date for interest_curve in interest_curves))
+        if commit:
+            db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise e
+
+
 def create(db: Session, interest_curve: InterestCurve):
     db_interest_curve = InterestCurve(**interest_curve.dict())
     db.add(db_interest_curve)
+    history_cache.invalidate(db, interest_curve.date)
     db.commit()
     db.refresh(db_interest_curve)
     return db_interest_curve
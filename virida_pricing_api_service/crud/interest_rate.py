@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from schemas.interest_rate import InterestRateCreate
 from models import InterestRate
+from crud import market_data
 import pandas as pd
 
 
@@ -33,6 +34,7 @@ def read_latest_interest_rates(db: Session):
 def create(db: Session, interest_rate: InterestRateCreate):
     db_interest_rate = InterestRate(**interest_rate.dict())
     db.add(db_interest_rate)
+    market_data.bump_generation(db)
     db.commit()
     db.refresh(db_interest_rate)
     return db_interest_rate
@@ -0,0 +1,139 @@
+import datetime as dt
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Date, String, and_, func, literal, null, or_, select, type_coerce, union_all
+from sqlalchemy.orm import Session, aliased
+
+import database
+from models import Benchmark, BenchmarkAnchor, Forex, InterestRate, MarketDataGeneration
+
+
+def read_generation(db: Session) -> int:
+    """
+    Current market data generation, bumped on every benchmark, forex and interest_rate write so the in-process
+    market data snapshots of every pod can detect changes
+    """
+    db_generation = db.query(MarketDataGeneration).filter_by(id=1).first()
+    return db_generation.generation if db_generation else 0
+
+
+def bump_generation(db: Session) -> None:
+    """
+    Atomic increment, in the caller's transaction so it is committed (or rolled back) together with the write. The row
+    is seeded first with database.insert_missing, so concurrent first writers do not fail on its duplicate key.
+    """
+    database.insert_missing(db, MarketDataGeneration.__table__, [{"id": 1, "generation": 0}])
+    db.query(MarketDataGeneration).filter_by(id=1).update(
+        {MarketDataGeneration.generation: MarketDataGeneration.generation + 1}, synchronize_session=False
+    )
+
+
+def _rows(part: str, name, symbol, type, date, close, currency, expiry_date=None, source_date=None):
+    """
+    Select of market data rows, labelled with the columns shared by every part of the union read by read_rows
+    """
+    return select([
+        literal(part, String).label("part"),
+        name.label("name"),
+        symbol.label("symbol"),
+        type.label("type"),
+        date.label("date"),
+        close.label("close"),
+        currency.label("currency"),
+        (expiry_date if expiry_date is not None else type_coerce(null(), Date)).label("expiry_date"),
+        (source_date if source_date is not None else type_coerce(null(), Date)).label("source_date"),
+    ])
+
+
+def _benchmark_rows(part: str):
+    return _rows(part, Benchmark.name, Benchmark.symbol, Benchmark.type, Benchmark.date, Benchmark.close,
+                 Benchmark.currency, expiry_date=Benchmark.expiry_date)
+
+
+def _max_benchmark_date(**filters):
+    return select([func.max(Benchmark.date)]) \
+        .where(and_(*[getattr(Benchmark, key) == value for key, value in filters.items()])) \
+        .correlate(None)
+
+
+def anchors(keys: List[Tuple[str, str, str, dt.date]]):
+    """
+    benchmark_anchor rows of the (name, symbol, type, date) keys
+    """
+    return _rows("anchor", BenchmarkAnchor.name, BenchmarkAnchor.symbol, BenchmarkAnchor.type, BenchmarkAnchor.date,
+                 BenchmarkAnchor.close, BenchmarkAnchor.currency, source_date=BenchmarkAnchor.source_date) \
+        .where(or_(*[and_(BenchmarkAnchor.name == name, BenchmarkAnchor.symbol == symbol, BenchmarkAnchor.type == type,
+                          BenchmarkAnchor.date == date) for name, symbol, type, date in keys]))
+
+
+def benchmark_as_of(name: str, symbol: str, type: str, date: Optional[dt.date] = None, part: str = "latest"):
+    """
+    Latest row of the benchmark on or before date (its latest row without date)
+    """
+    max_date = _max_benchmark_date(name=name, symbol=symbol, type=type)
+    if date is not None:
+        max_date = max_date.where(Benchmark.date <= date)
+    return _benchmark_rows(part) \
+        .where(and_(Benchmark.name == name, Benchmark.symbol == symbol, Benchmark.type == type)) \
+        .where(Benchmark.date == max_date.as_scalar())
+
+
+def latest_benchmarks(name: str, type: str):
+    """
+    Latest rows of every symbol of the benchmark, like crud.benchmark.read_latest_benchmarks
+    """
+    return _benchmark_rows(type) \
+        .where(and_(Benchmark.name == name, Benchmark.type == type)) \
+        .where(Benchmark.date == _max_benchmark_date(name=name, type=type).as_scalar())
+
+
+def latest_interest_rates():
+    """
+    Latest rate of every currency and tenor, like crud.interest_rate.read_latest_interest_rates
+    """
+    latest = aliased(InterestRate)
+    max_date = select([func.max(latest.date)]) \
+        .where(and_(latest.currency == InterestRate.currency, latest.tenor == InterestRate.tenor))
+    return _rows("interest_rate", literal("interest_rate", String), InterestRate.tenor, literal("rate", String),
+                 InterestRate.date, InterestRate.rate, InterestRate.currency) \
+        .where(InterestRate.date == max_date.as_scalar())
+
+
+def exchange_rates_as_of(date: dt.date, currency: Optional[str] = None, part: str = "forex"):
+    """
+    Latest rate of currency (of every currency without it) on or before date
+    """
+    latest = aliased(Forex)
+    max_date = select([func.max(latest.date)]).where(latest.currency == Forex.currency).where(latest.date <= date)
+    query = _rows(part, Forex.currency, literal("", String), literal("forex", String), Forex.date, Forex.close,
+                  Forex.currency) \
+        .where(Forex.date == max_date.as_scalar())
+    if currency is not None:
+        query = query.where(Forex.currency == currency)
+    return query
+
+
+def benchmark_series(keys: List[Tuple[str, str, str]], start_date: dt.date, end_date: dt.date, part: str = "series"):
+    """
+    Rows of the (name, symbol, type) benchmarks between start_date and end_date
+    """
+    return _benchmark_rows(part) \
+        .where(or_(*[and_(Benchmark.name == name, Benchmark.symbol == symbol, Benchmark.type == type) for name, symbol, type in keys])) \
+        .where(and_(Benchmark.date >= start_date, Benchmark.date <= end_date))
+
+
+def exchange_rate_series(start_date: dt.date, end_date: dt.date, part: str = "forex"):
+    """
+    Rates of every currency between start_date and end_date
+    """
+    return _rows(part, Forex.currency, literal("", String), literal("forex", String), Forex.date, Forex.close,
+                 Forex.currency) \
+        .where(and_(Forex.date >= start_date, Forex.date <= end_date))
+
+
+def read_rows(db: Session, queries: list) -> list:
+    """
+    Rows of every query in a single round-trip: (part, name, symbol, type, date, close, currency, expiry_date,
+    source_date) tuples, part telling which query a row comes from
+    """
+    return db.execute(union_all(*queries)).fetchall()
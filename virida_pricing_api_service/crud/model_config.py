@@ -1,5 +1,8 @@
 from sqlalchemy.orm import Session
-from models import ModelConfig
+
+import database
+from models import ModelConfig, ModelConfigGeneration
+from crud import history_cache
 from schemas.model_config import ModelConfigDelete
 
 
@@ -12,9 +15,29 @@ def read(db: Session, **kwargs):
     return query.all()
 
 
+def read_generation(db: Session) -> int:
+    """
+    Current model_config generation, bumped on every model_config write so other pods can detect changes
+    """
+    db_generation = db.query(ModelConfigGeneration).filter_by(id=1).first()
+    return db_generation.generation if db_generation else 0
+
+
+def _bump_generation(db: Session) -> None:
+    # atomic increment in the same transaction as the model_config write; the row is seeded first, a concurrent
+    # seed being ignored rather than failing the write on its duplicate key
+    database.insert_missing(db, ModelConfigGeneration.__table__, [{"id": 1, "generation": 0}])
+    db.query(ModelConfigGeneration).filter_by(id=1).update(
+        {ModelConfigGeneration.generation: ModelConfigGeneration.generation + 1}, synchronize_session=False
+    )
+
+
 def create(db: Session, model_config: ModelConfig):
     db_model_config = ModelConfig(**model_config.dict())
     db.add(db_model_config)
+    _bump_generation(db)
+    # cached prices are keyed by generation, the bump makes every one of them unreachable
+    history_cache.invalidate(db)
     db.commit()
     db.refresh(db_model_config)
     return db_model_config
@@ -32,7 +55,10 @@ def update(db: Session, model_config: ModelConfig) -> ModelConfig:
 
     for key, value in model_config.dict(exclude_unset=True).items():
         setattr(db_model_config, key, value)
-    
+
+    _bump_generation(db)
+    # cached prices are keyed by generation, the bump makes every one of them unreachable
+    history_cache.invalidate(db)
     db.commit()
     return db_model_config
 
@@ -44,6 +70,9 @@ def delete(db: Session, model_config: ModelConfigDelete):
         return None
 
     db.delete(db_model_config)
+    _bump_generation(db)
+    # cached prices are keyed by generation, the bump makes every one of them unreachable
+    history_cache.invalidate(db)
     db.commit()
 
     return True
@@ -1,5 +1,5 @@
 import datetime as dt
-from typing import List
+from typing import List, Optional
 
 import pandas as pd
 from fastapi import Query
@@ -7,6 +7,7 @@ from sqlalchemy import desc, func
 from sqlalchemy.orm import Session
 
 from models import StandardizedInstrument
+from crud import history_cache
 from schemas.standardized_instrument import StandardizedInstrumentCreate, StandardizedInstrumentBase
 
 
@@ -29,6 +30,19 @@ def read_instruments_by_period(start_date: dt.date, end_date: dt.date, db: Sessi
     return query.all()
 
 
+def read_series_dates(db: Session, start_date: Optional[dt.date] = None, end_date: Optional[dt.date] = None, first: bool = True) -> dict:
+    """
+    First (or last) date of each instrument type (BID, ASK) between start_date and end_date
+    """
+    aggregate = func.min if first else func.max
+    query = db.query(StandardizedInstrument.type, aggregate(StandardizedInstrument.date))
+    if start_date:
+        query = query.filter(StandardizedInstrument.date >= start_date)
+    if end_date:
+        query = query.filter(StandardizedInstrument.date <= end_date)
+    return dict(query.group_by(StandardizedInstrument.type).all())
+
+
 def read_latest_bid_ask(db: Session):
     db_bid_and_dates = db.query(StandardizedInstrument.price, StandardizedInstrument.date).filter_by(instrument="CET")\
         .filter_by(source="ACX").filter_by(type="BID").order_by(desc(StandardizedInstrument.date)).all()
@@ -96,6 +110,7 @@ def create(instrument_create: StandardizedInstrumentCreate, db: Session) -> Stan
     try:
         db_instrument = StandardizedInstrument(**instrument_create.dict())
         db.add(db_instrument)
+        history_cache.invalidate(db, instrument_create.date)
         db.commit()
     except Exception as e:
         db.rollback()
@@ -114,9 +129,11 @@ def update(instruments: List[StandardizedInstrument], db: Session)\
                 failed_instruments.append(instrument)
 
             else:
+                date = db_instrument.date
                 for key, value in instrument.dict(exclude_unset=True).items():
                     setattr(db_instrument, key, value)
 
+                history_cache.invalidate(db, min(date, db_instrument.date))
                 db.commit()
                 succeed_instruments.append(instrument)
         except Exception as e:
@@ -139,6 +156,7 @@ def delete(instruments: List[StandardizedInstrument], db: Session)\
                 db.query(StandardizedInstrument).filter_by(instrument=instrument.instrument).\
                     filter_by(source=instrument.source).filter_by(date=instrument.date).\
                     filter_by(type=instrument.type).delete()
+                history_cache.invalidate(db, instrument.date)
                 db.commit()
                 succeed_instruments.append(db_instrument)
         except Exception as e:
@@ -44,3 +44,35 @@ class DatabaseContextManager:
 def get_db():
     with DatabaseContextManager() as session:
         yield session
+
+
+# rows per statement of upsert, under the bound parameter limits of the drivers
+UPSERT_CHUNK_ROWS = 1000
+
+
+def upsert(db: Session, table, rows: list) -> None:
+    """
+    Multi-row insert where rows with an existing primary key overwrite it: INSERT ... ON DUPLICATE KEY UPDATE on MySQL,
+    INSERT OR REPLACE on SQLite. Runs in the caller's transaction, one statement per UPSERT_CHUNK_ROWS rows.
+    """
+    dialect = db.get_bind().dialect.name
+    for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+        chunk = rows[start:start + UPSERT_CHUNK_ROWS]
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert
+            statement = insert(table).values(chunk)
+            statement = statement.on_duplicate_key_update(
+                {column.name: statement.inserted[column.name] for column in table.columns if not column.primary_key}
+            )
+        else:
+            statement = table.insert().values(chunk).prefix_with("OR REPLACE")
+        db.execute(statement)
+
+
+def insert_missing(db: Session, table, rows: list) -> None:
+    """
+    Multi-row insert skipping the rows whose primary key already exists, also when a concurrent transaction inserts it:
+    INSERT IGNORE on MySQL, INSERT OR IGNORE on SQLite. Runs in the caller's transaction.
+    """
+    prefix = "IGNORE" if db.get_bind().dialect.name == "mysql" else "OR IGNORE"
+    db.execute(table.insert().values(rows).prefix_with(prefix))
@@ -1,18 +1,18 @@
 import os
 import sys
+import argparse
 import datetime as dt
 import math
 from typing import Tuple
 
-import numpy as np
 import pandas as pd
 from sqlalchemy.orm import Session
 from pydantic import parse_obj_as
 
 import crud
 import email_client
-from crud.benchmark import fetch_benchmark_dataframe
-from core.static import CO2_INDEX_LOOKBACK, INDEX_HISTORY_REFERENCE_DATE, FILL_FORWARD_LOOKBACK
+from core.indexes import INDEX_REGISTRY, read_index_history, read_index_series
+from core.static import INDEX_HISTORY_REFERENCE_DATE, FILL_FORWARD_LOOKBACK
 from schemas.benchmark_index import BenchmarkIndex
 from schemas.email import BenchmarkIndexEmailTemplate
 from schemas.system import System
@@ -27,160 +27,47 @@ ENV = os.environ["APP_SETTINGS"].replace("config.", "").replace("Config", "").lo
 
 
 
-def get_indexes(db: Session, end_date: dt.date) -> Tuple[pd.DataFrame, dict]:
-    market_data = dict()
-    start_date = INDEX_HISTORY_REFERENCE_DATE - dt.timedelta(days=FILL_FORWARD_LOOKBACK)
-    benchmarks_df = pd.DataFrame(columns=["date"]).set_index("date")
-
-    try:
-        eua_df = fetch_benchmark_dataframe(db, name='EUA', symbol='CKSPT', type='spot', start_date=start_date, end_date=end_date, frequency='B', ccy_convert=True)
-        eua_index_ref_date_price_usd = eua_df.loc[INDEX_HISTORY_REFERENCE_DATE]['value_usd']
-        eua_last_date_price_usd = eua_df.iloc[-1]['value_usd']
-        eua_index = eua_last_date_price_usd / eua_index_ref_date_price_usd
-        market_data["eua"] = float(eua_index)
-        benchmarks_df = pd.concat([benchmarks_df, eua_df["value_usd"].rename("eua")], axis=1)
-    except Exception as ex:
-        print(ex)
-        market_data["eua"] = -1.0
-
-    try:
-        co2_df = fetch_benchmark_dataframe(db, name='CO2', symbol='CO2SM', type='spot', start_date=(start_date - dt.timedelta(days=370)), end_date=end_date, frequency='D')
-        co2_df['roc'] = co2_df['value'].pct_change(periods=CO2_INDEX_LOOKBACK)
-        co2_ref_date_roc = co2_df[co2_df.index >= INDEX_HISTORY_REFERENCE_DATE].loc[INDEX_HISTORY_REFERENCE_DATE]['roc']
-        co2_last_date_roc = co2_df.iloc[-1]['roc']
-        co2_index = co2_last_date_roc / co2_ref_date_roc
-        co2_index = np.exp(100. * (co2_last_date_roc - co2_ref_date_roc))
-        market_data["co2"] = float(co2_index)
-        benchmarks_df = pd.concat([benchmarks_df, co2_df["value_usd"].rename("co2")], axis=1)
-    except Exception as ex:
-        print(ex)
-        market_data["co2"] = -1.0
-
-    try:
-        brent_df = fetch_benchmark_dataframe(db, name='BRENTEU', symbol='BRENTEU', type='spot', start_date=start_date, end_date=end_date, frequency='B')
-        brent_ref_date_price = brent_df.loc[INDEX_HISTORY_REFERENCE_DATE]['value']
-        brent_last_date_price = brent_df.iloc[-1]['value']
-        brent_index = brent_last_date_price / brent_ref_date_price
-        market_data["brent"] = float(brent_index)
-        benchmarks_df = pd.concat([benchmarks_df, brent_df["value_usd"].rename("brent")], axis=1)
-    except Exception as ex:
-        print(ex)
-        market_data["brent"] = -1.0
-
-
-    try:
-        treasury_df = fetch_benchmark_dataframe(db, name='T10Y3M', symbol='T10Y3M', type='spot', start_date=start_date, end_date=end_date, frequency='B')
-        change = 10. - 0.25
-        treasury_df['slope'] = treasury_df['value'] / change
-        treasury_ref_date_slope = treasury_df.loc[INDEX_HISTORY_REFERENCE_DATE]['slope']
-        treasury_last_date_slope = treasury_df.iloc[-1]['slope']
-        treasury_index = np.exp(treasury_last_date_slope - treasury_ref_date_slope)
-        market_data["treasury"] = float(treasury_index)
-        benchmarks_df = pd.concat([benchmarks_df, treasury_df["value_usd"].rename("treasury")], axis=1)
-    except Exception as ex:
-        print(ex)
-        market_data["treasury"] = -1.0
-
-
-    try:
-        oil_df = fetch_benchmark_dataframe(db, name='oil', symbol='PDB', type='spot', start_date=start_date, end_date=end_date, frequency='B')
-        oil_ref_date_price = oil_df.loc[INDEX_HISTORY_REFERENCE_DATE]['value']
-        oil_last_date_price = oil_df.iloc[-1]['value']
-        oil_index = oil_last_date_price / oil_ref_date_price
-        market_data["oil"] = float(oil_index)
-        benchmarks_df = pd.concat([benchmarks_df, oil_df["value_usd"].rename("oil")], axis=1)
-        print("---------OIL-----------")
-        print("REF_DATE_PRICE: ", oil_ref_date_price)
-        print("REF_LAST_DATE_PRICE: ", oil_last_date_price)
-        print("INDEX: ", market_data["oil"])
-    except Exception as ex:
-        print(ex)
-        market_data["oil"] = -1.0
-
+def benchmark_windows(end_date: dt.date) -> list:
+    """
+    Date windows of the benchmarks table of the email, which shows the first and the last days since the reference date
+    """
+    reference_date = INDEX_HISTORY_REFERENCE_DATE.date()
+    lookback = dt.timedelta(days=FILL_FORWARD_LOOKBACK)
+    if end_date - reference_date <= 2 * lookback:
+        return [(reference_date - lookback, end_date)]
+    return [(reference_date - lookback, reference_date + lookback), (end_date - lookback, end_date)]
 
-    try:
-        coal_df = fetch_benchmark_dataframe(db, name='coal', symbol='PTCWCI', type='spot', start_date=start_date, end_date=end_date, frequency='B')
-        coal_ref_date_price = coal_df.loc[INDEX_HISTORY_REFERENCE_DATE]['value']
-        coal_last_date_price = coal_df.iloc[-1]['value']
-        coal_index = coal_last_date_price / coal_ref_date_price
-        market_data["coal"] = float(coal_index)
-        benchmarks_df = pd.concat([benchmarks_df, coal_df["value_usd"].rename("coal")], axis=1)
-        print("\n---------COAL-----------")
-        print("REF_DATE_PRICE: ", coal_ref_date_price)
-        print("REF_LAST_DATE_PRICE: ", coal_last_date_price)
-        print("INDEX: ", market_data["coal"])
-    except Exception as ex:
-        print(ex)
-        market_data["coal"] = -1.0
 
+def get_benchmarks(db: Session, end_date: dt.date) -> pd.DataFrame:
+    benchmarks_df = read_index_series(db, INDEX_REGISTRY, benchmark_windows(end_date))
+    benchmarks_df.fillna(method="pad", inplace=True)
+    benchmarks_df.fillna(method="backfill", inplace=True)
+    return benchmarks_df[(benchmarks_df.index >= pd.Timestamp(INDEX_HISTORY_REFERENCE_DATE)) & (benchmarks_df.index <= pd.Timestamp(end_date))]
 
-    try:
-        gas_df = fetch_benchmark_dataframe(db, name='gas', symbol='PTTFM1', type='spot', start_date=start_date, end_date=end_date, frequency='B')
-        gas_ref_date_price = gas_df.loc[INDEX_HISTORY_REFERENCE_DATE]['value']
-        gas_last_date_price = gas_df.iloc[-1]['value']
-        gas_index = gas_last_date_price / gas_ref_date_price
-        market_data["gas"] = float(gas_index)
-        benchmarks_df = pd.concat([benchmarks_df, gas_df["value_usd"].rename("gas")], axis=1)
-        print("\n---------GAS-----------")
-        print("REF_DATE_PRICE: ", gas_ref_date_price)
-        print("REF_LAST_DATE_PRICE: ", gas_last_date_price)
-        print("INDEX: ", market_data["gas"])
-    except Exception as ex:
-        print(ex)
-        market_data["gas"] = -1.0
 
+def get_index_history(db: Session, start_date: dt.date, end_date: dt.date) -> pd.DataFrame:
+    """
+    Indexes of every benchmark of the registry from start_date to end_date, NaN where they can't be computed
+    """
+    history = read_index_history(db, INDEX_REGISTRY, INDEX_HISTORY_REFERENCE_DATE.date(), start_date, end_date)
+    for index, value in history.iloc[-1].items():
+        print(f"\n---------{index.upper()}-----------")
+        print("INDEX: ", value)
+    return history
 
-    try:
-        carbon_df = fetch_benchmark_dataframe(db, name='carbon', symbol='PCEC', type='spot', start_date=start_date, end_date=end_date, frequency='B')
-        carbon_ref_date_price = carbon_df.loc[INDEX_HISTORY_REFERENCE_DATE]['value']
-        carbon_last_date_price = carbon_df.iloc[-1]['value']
-        carbon_index = carbon_last_date_price / carbon_ref_date_price
-        market_data["carbon"] = float(carbon_index)
-        benchmarks_df = pd.concat([benchmarks_df, carbon_df["value_usd"].rename("carbon")], axis=1)
-        print("\n---------CARBON-----------")
-        print("REF_DATE_PRICE: ", carbon_ref_date_price)
-        print("REF_LAST_DATE_PRICE: ", carbon_last_date_price)
-        print("INDEX: ", market_data["carbon"])
-    except Exception as ex:
-        print(ex)
-        market_data["carbon"] = -1.0
 
+def first_missing_index_date(db: Session, end_date: dt.date) -> dt.date:
+    """
+    First date after the last indexes stored before end_date, so missed days are computed too; end_date at the latest
+    """
+    last_dates = crud.benchmark_index.read_series_dates(db, end_date=end_date - dt.timedelta(days=1), first=False)
+    last_dates = [last_dates[spec.index] for spec in INDEX_REGISTRY if spec.index in last_dates]
+    return min(last_dates) + dt.timedelta(days=1) if last_dates else end_date
 
-    try:
-        equity_df = fetch_benchmark_dataframe(db, name='equity', symbol='DJESG', type='spot', start_date=start_date, end_date=end_date, frequency='B')
-        equity_ref_date_price = equity_df.loc[INDEX_HISTORY_REFERENCE_DATE]['value']
-        equity_last_date_price = equity_df.iloc[-1]['value']
-        equity_index = equity_last_date_price / equity_ref_date_price
-        market_data["equity"] = float(equity_index)
-        benchmarks_df = pd.concat([benchmarks_df, equity_df["value_usd"].rename("equity")], axis=1)
-        print("\n---------EQUITY-----------")
-        print("REF_DATE_PRICE: ", equity_ref_date_price)
-        print("REF_LAST_DATE_PRICE: ", equity_last_date_price)
-        print("INDEX: ", market_data["equity"])
-    except Exception as ex:
-        print(ex)
-        market_data["equity"] = -1.0
-    
 
-    try:
-        credit_df = fetch_benchmark_dataframe(db, name='credit', symbol='SNPGBI', type='spot', start_date=start_date, end_date=end_date, frequency='B')
-        credit_ref_date_price = credit_df.loc[INDEX_HISTORY_REFERENCE_DATE]['value']
-        credit_last_date_price = credit_df.iloc[-1]['value']
-        credit_index = credit_last_date_price / credit_ref_date_price
-        market_data["credit"] = float(credit_index)
-        benchmarks_df = pd.concat([benchmarks_df, credit_df["value_usd"].rename("credit")], axis=1)
-        print("\n---------CREDIT-----------")
-        print("REF_DATE_PRICE: ", credit_ref_date_price)
-        print("REF_LAST_DATE_PRICE: ", credit_last_date_price)
-        print("INDEX: ", market_data["credit"])
-    except Exception as ex:
-        print(ex)
-        market_data["credit"] = -1.0
-    
-    benchmarks_df.fillna(method="pad", inplace=True)
-    benchmarks_df.fillna(method="backfill", inplace=True)
-    benchmarks_df = benchmarks_df[(benchmarks_df.index >= INDEX_HISTORY_REFERENCE_DATE.date()) & (benchmarks_df.index <= end_date)] 
-    return benchmarks_df, market_data
+def index_rows(history: pd.DataFrame) -> list:
+    return [BenchmarkIndex(date=date.date(), benchmark=benchmark, value=value)
+            for date, row in history.iterrows() for benchmark, value in row.items() if not pd.isnull(value)]
 
 
 def difference(new: float, previous: float) -> str:
@@ -345,7 +232,7 @@ def interest_curve_table_html(db: Session, date: dt.date):
     return head + body
 
 
-def interest_curve(db: Session, date: dt.date):
+def interest_curve(db: Session, date: dt.date) -> InterestCurve:
     benchmarks = crud.benchmark.read_benchmarks(db, date, "EUA", "forward")
     benchmarks = sorted(benchmarks, key=lambda benchmark: benchmark.expiry_date)
 
@@ -359,33 +246,48 @@ def interest_curve(db: Session, date: dt.date):
         value["times"].append((benchmark.expiry_date - date).days / 365)
         value["rates"].append(benchmark.close / spot_benchmark.close - 1)
 
-    crud.interest_curve.create(
-        db=db,
-        interest_curve=InterestCurve(date=date, curve="eua_curve", value=value)
-    )
+    return InterestCurve(date=date, curve="eua_curve", value=value)
+
+
+def interest_curves(db: Session, dates, errors: list) -> list:
+    """
+    Curve of each date; a date whose curve cannot be built (e.g. no EUA spot benchmark yet) is recorded in errors and
+    skipped, so the other dates and the indexes are still written
+    """
+    curves = []
+    for date in dates:
+        try:
+            curves.append(interest_curve(db, date))
+        except Exception:
+            errors.append({f"Error trying to build the {date} interest curve": formatted_exception()})
+    return curves
 
 
 def main(db: Session):
     try:
         current_system_date = get_system_date(db)
-        benchmarks_df, indexes = get_indexes(db, current_system_date)
+        start_date = first_missing_index_date(db, current_system_date)
+        history = get_index_history(db, start_date, current_system_date).fillna(-1.0)
+        indexes = history.iloc[-1].to_dict()
+        benchmarks_df = get_benchmarks(db, current_system_date)
         previous_indexes = get_previous_indexes(db)
 
         errors = []
         benchmarks = indexes.keys()
-        for benchmark in benchmarks:
-            try:
-                crud.benchmark_index.create(db, BenchmarkIndex(
-                    date=current_system_date,
-                    benchmark=benchmark,
-                    value=indexes[benchmark]
-                ))
-            except Exception:
-                errors.append({f"Error trying to insert new '{benchmark}' index": formatted_exception()})
-        
-        interest_curve(db, current_system_date)
-
-        shifted_date = shift_system_date(db)
+        curves = interest_curves(db, history.index.date, errors)
+        try:
+            # indexes and curves are written in one transaction, replacing the ones of a previous run
+            crud.benchmark_index.upsert(db, index_rows(history), commit=False)
+            crud.interest_curve.upsert(db, curves, commit=False)
+            db.commit()
+            written = True
+        except Exception:
+            db.rollback()
+            errors.append({f"Error trying to write the indexes and curves from {start_date}": formatted_exception()})
+            written = False
+
+        # nothing was stored, keep the system date so the next run retries the same dates
+        shifted_date = shift_system_date(db) if written else current_system_date
         status = "Failed" if errors else "Completed"
 
         email_client.send_indexes_email(BenchmarkIndexEmailTemplate(
@@ -411,6 +313,30 @@ def main(db: Session):
         ))
 
 
+def backfill(db: Session, start_date: dt.date, end_date: dt.date):
+    """
+    Recompute the indexes and curves from start_date to end_date and overwrite the stored ones, in one transaction
+    """
+    history = get_index_history(db, start_date, end_date)
+    indexes = index_rows(history)
+    errors = []
+    curves = interest_curves(db, history.index.date, errors)
+    crud.benchmark_index.upsert(db, indexes, commit=False)
+    crud.interest_curve.upsert(db, curves, commit=False)
+    db.commit()
+    for error in errors:
+        print("[-]", error)
+    print(f"{len(indexes)} indexes and {len(curves)} curves written from {start_date} to {end_date}")
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End of day benchmark indexes of the system date and the days missed before it")
+    parser.add_argument("--backfill", nargs=2, metavar=("START_DATE", "END_DATE"), type=dt.date.fromisoformat,
+                        help="recompute the indexes and curves of a date range instead")
+    args = parser.parse_args()
+
     with DatabaseContextManager() as db:
-        main(db)
+        if args.backfill:
+            backfill(db, *args.backfill)
+        else:
+            main(db)
@@ -0,0 +1,50 @@
+import io
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+from starlette.responses import Response
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+COLUMNAR_MEDIA_TYPES = [ARROW_MEDIA_TYPE, PARQUET_MEDIA_TYPE]
+
+
+def columnar_media_type(request: Request) -> Optional[str]:
+    """
+    The columnar format asked for in the Accept header, None for the default JSON response
+
+    :raises HTTPException: 406 when a columnar format is asked for but pyarrow is not installed
+    """
+    accept = request.headers.get("accept", "")
+    media_type = next((media_type for media_type in COLUMNAR_MEDIA_TYPES if media_type in accept), None)
+    if media_type is not None:
+        _pyarrow()
+    return media_type
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError as ex:
+        print("[-]", ex)
+        raise HTTPException(status.HTTP_406_NOT_ACCEPTABLE, "Columnar responses are not available, request application/json")
+
+
+def columnar_response(columns: dict, media_type: str) -> Response:
+    """
+    Response body holding columns as one Arrow table, written as an Arrow IPC stream or a Parquet file
+
+    :param columns: Column name to NumPy array or list, all of the same length; NaN is written as null
+    """
+    pa = _pyarrow()
+    table = pa.table({name: pa.array(values, from_pandas=True) for name, values in columns.items()})
+
+    sink = io.BytesIO()
+    if media_type == PARQUET_MEDIA_TYPE:
+        import pyarrow.parquet as pq
+        pq.write_table(table, sink)
+    else:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return Response(content=sink.getvalue(), media_type=media_type)
@@ -0,0 +1,422 @@
+import datetime as dt
+import json
+from typing import Callable, Iterable, Iterator, List, NamedTuple
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+
+from core.drift import batch_drifts
+from core.interpolate import Interpolate
+from core.weights import ModelMetadata
+from core.static import API_RESPONSE_ERROR_CODE_STRING, API_RESPONSE_ERROR_MESSAGE_STRING, INSTRUMENT_NO_BID_OR_ASK, \
+    get_error_string_by_error_code
+from schemas.project import ProjectPricing
+from schemas.standardized_instrument import InstrumentType
+
+VRE_FIELDS = ["mid", "bid", "ask", "vintage_discount_factor", "drift", "project_drift", "sdg_drift", "interest_rate"]
+
+MISSING_SUPPORT_DATA = "We're unable to price your project(s) due to missing support data"
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class History(NamedTuple):
+    """
+    Struct-of-arrays history result: each field is a (dates, projects) array, projects in model output order
+    """
+    dates: list
+    fields: dict
+    metadata: list
+    metadata_of_day: np.ndarray
+    benchmarks: np.ndarray
+    beta: np.ndarray
+    sigma: np.ndarray
+    corsia_dates: list
+
+    def valid_count(self) -> int:
+        return int(np.count_nonzero(~np.isnan(self.fields["mid"])))
+
+
+def _distinct(values) -> tuple:
+    """
+    Distinct objects of values (by identity) and, per value, the position of its object in that list
+    """
+    distinct, positions, index = [], {}, np.empty(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        if id(value) not in positions:
+            positions[id(value)] = len(distinct)
+            distinct.append(value)
+        index[i] = positions[id(value)]
+    return distinct, index
+
+
+def _model_outputs(df: pd.DataFrame) -> tuple:
+    """
+    beta as a (dates, projects, benchmarks) tensor and sigma as (dates, projects)
+    """
+    # dates sharing a model share its output object, so each output is converted once
+    outputs, output_of_day = _distinct(list(df["output"]))
+    beta = np.stack([np.asarray(output["beta"]) for output in outputs])[output_of_day]
+    sigma = np.stack([np.asarray(output["sigma"])[:, 0] for output in outputs])[output_of_day]
+    return beta, sigma
+
+
+def run_models(models: pd.Series, run: Callable) -> list:
+    """
+    One forward pass per distinct model of the history frame, its output shared by every date using it
+
+    :param models: The "model" column of the history frame
+    :param run: Runs a model, e.g. lambda model: run_model(mappings, model)
+    :return: The output of each date's model
+    """
+    distinct, model_of_day = _distinct(list(models))
+    outputs = [run(model) for model in distinct]
+    return [outputs[i] for i in model_of_day]
+
+
+def _benchmarks(df: pd.DataFrame, metadata: List[ModelMetadata], group_of_day: np.ndarray, count: int) -> np.ndarray:
+    """
+    Benchmark index levels as (dates, benchmarks), in each date's model output order
+    """
+    benchmarks = np.empty((len(df), count), dtype=np.float64)
+    for group, value in enumerate(metadata):
+        names = value.benchmarks[:count]
+        if len(names) < count or any(name not in df.columns for name in names):
+            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, MISSING_SUPPORT_DATA)
+        days = group_of_day == group
+        benchmarks[days] = df.loc[days, names].to_numpy(dtype=np.float64)
+    return benchmarks
+
+
+def _horizon(horizon) -> dt.date:
+    if horizon == "spot":
+        return None
+    if isinstance(horizon, str):
+        # "decYYYY", see schemas.project.ProjectPricing.validate_horizon
+        return dt.date(int(horizon[-4:]), 12, 1)
+    return horizon
+
+
+def _interest_rates(df: pd.DataFrame, project_pricings: List[ProjectPricing]) -> np.ndarray:
+    """
+    EUA curve rate at each forward project's horizon, as (dates, projects); 0 for spot projects
+    """
+    rates = np.zeros((len(df), len(project_pricings)), dtype=np.float64)
+    horizons = [_horizon(project_pricing.horizon) for project_pricing in project_pricings]
+    forward = [position for position, horizon in enumerate(horizons) if horizon is not None]
+    if not forward:
+        return rates
+
+    dates = np.array(df.index, dtype="datetime64[D]")
+    days = np.array([horizons[position] for position in forward], dtype="datetime64[D]")[None, :] - dates[:, None]
+    if np.any(days < np.timedelta64(0, "D")):
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, "Horizon date must be greater-than or inside the pricing date range")
+    t = days.astype(np.int64) / 365
+
+    # one interpolator per distinct curve, each evaluated once for all of its days and forward projects
+    curves, curve_of_day = _distinct(list(df["eua_curve"]))
+    for i, curve in enumerate(curves):
+        day = curve_of_day == i
+        try:
+            rates[np.ix_(day, forward)] = Interpolate(curve["times"], curve["rates"])(t[day])
+        except ValueError as ex:
+            print("[-]", ex)
+            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, MISSING_SUPPORT_DATA)
+    return rates
+
+
+def _vintage(metadata: List[ModelMetadata], project_pricings: List[ProjectPricing], now: dt.datetime) -> tuple:
+    """
+    Vintage discount factor and CORSIA eligibility of each project, as (metadata, projects) arrays
+    """
+    vintage_discount_factor = np.empty((len(metadata), len(project_pricings)))
+    corsia = np.zeros((len(metadata), len(project_pricings)), dtype=bool)
+    for group, value in enumerate(metadata):
+        for position, project_pricing in enumerate(project_pricings):
+            project = project_pricing.project
+            project_categories = [x.split('.')[0] for x in project.project]
+            t = (now - dt.datetime(int(project.vintage), 12, 31, 23, 59)).days / 365
+            vintage_discount_factor[group, position] = np.average(
+                [np.exp(value.vintage_discount_factors[category] * t) for category in project_categories]
+            )
+            corsia[group, position] = project.corsia == 1 and int(project.vintage) >= value.corsia_min_year
+    return vintage_discount_factor, corsia
+
+
+def vintage_discount(metadata: pd.Series, project_pricings: List[ProjectPricing], now: dt.datetime) -> np.ndarray:
+    """
+    Factor turning the prices of price_vre_history(..., discount=False) into the discounted ones, as (dates, projects);
+    1 where a CORSIA eligible project takes the transaction bid/ask
+
+    :param metadata: Model metadata of each date
+    """
+    distinct, group_of_day = _distinct(list(metadata))
+    vintage_discount_factor, corsia = _vintage(distinct, project_pricings, now)
+    return np.where(corsia, 1., vintage_discount_factor)[group_of_day]
+
+
+def price_vre_history(df: pd.DataFrame, project_pricings: List[ProjectPricing], now: dt.datetime = None, inputs: dict = None,
+                      discount: bool = True) -> History:
+    """
+    Price every mapped project for every date of the history frame at once
+
+    :param df: History frame indexed by date with "output", "metadata", benchmark index, BID/ASK and "eua_curve" columns
+    :param project_pricings: The mapped projects, in model output order
+    :param now: Time the vintage ages are measured at, defaults to the current time
+    :param inputs: The model input matrices of the mapped projects, the drifts are read from their project and sdg
+                   mappings when given
+    :param discount: False leaves the model prices before the vintage discount, which is the only part moving with now;
+                     multiply them by vintage_discount to discount them
+    :return: History with VRE_FIELDS as (dates, projects) float64 arrays
+    """
+    metadata, group_of_day = _distinct(list(df["metadata"]))
+    beta, sigma = _model_outputs(df)
+    benchmarks = _benchmarks(df, metadata, group_of_day, beta.shape[-1])
+    interest_rate = _interest_rates(df, project_pricings)
+
+    # forward horizons compound the first and third benchmarks with the curve rate, as the scalar formula did
+    adjusted = np.repeat(benchmarks[:, None, :], len(project_pricings), axis=1)
+    adjusted[:, :, 0] = benchmarks[:, None, 0] * (1 + interest_rate)
+    adjusted[:, :, 2] = benchmarks[:, None, 2] * (1 + interest_rate)
+
+    B = np.sum(np.multiply(beta, adjusted), axis=-1)
+    S = np.exp((sigma ** 2.) / 2.)
+
+    # config-dependent factors only vary with the model metadata, not with the date
+    vintage_discount_factor, corsia = _vintage(metadata, project_pricings, now or dt.datetime.now())
+    project_drift = np.empty((len(metadata), len(project_pricings)))
+    sdg_drift = np.empty((len(metadata), len(project_pricings)))
+    versions = [project_pricing.project.version for project_pricing in project_pricings]
+    for group, value in enumerate(metadata):
+        drifts = batch_drifts(value.drift, inputs["project"], inputs["sdg"], versions) if inputs is not None else None
+        if drifts is not None:
+            project_drift[group], sdg_drift[group] = drifts
+            continue
+        for position, project_pricing in enumerate(project_pricings):
+            project = project_pricing.project
+            project_drift[group, position] = np.mean([value.drift["project"][category] for category in project.project])
+            sdg_drift[group, position] = np.prod([value.drift["sdg"][sdg] for sdg in project.sdg])
+
+    vintage_discount_factor = vintage_discount_factor[group_of_day]
+    project_drift = project_drift[group_of_day]
+    sdg_drift = sdg_drift[group_of_day]
+    corsia = corsia[group_of_day]
+    drift = project_drift * sdg_drift
+
+    # the scalar formula multiplied float64 scalars into the float32 model output; keep NumPy's promotion for it
+    dtype = np.result_type(np.float64(0.), S)
+    if discount:
+        mid = (vintage_discount_factor * B).astype(dtype) * S * drift.astype(dtype)
+    else:
+        mid = B.astype(dtype) * S * drift.astype(dtype)
+
+    # bid-ask spread; multipliers stay in the model's float32 precision, as in the scalar formula
+    spread = np.array([value.bid_ask_spread or 0. for value in metadata])[group_of_day][:, None]
+    half_spread = (spread / 2.).astype(sigma.dtype)
+    width = (np.exp(sigma ** 2.) - 1) ** 0.5
+    bid = np.where(spread != 0, (1 - half_spread * width) * mid, mid)
+    ask = np.where(spread != 0, (1 + half_spread * width) * mid, mid)
+
+    # CORSIA eligible projects take the latest transaction bid/ask instead of the model price
+    if corsia.any():
+        if InstrumentType.BID not in df.columns or InstrumentType.ASK not in df.columns:
+            raise HTTPException(status.HTTP_404_NOT_FOUND, {
+                API_RESPONSE_ERROR_CODE_STRING: INSTRUMENT_NO_BID_OR_ASK,
+                API_RESPONSE_ERROR_MESSAGE_STRING: get_error_string_by_error_code(INSTRUMENT_NO_BID_OR_ASK)
+            })
+        transaction_bid = df[InstrumentType.BID].to_numpy(dtype=np.float64)[:, None]
+        transaction_ask = df[InstrumentType.ASK].to_numpy(dtype=np.float64)[:, None]
+        mid = np.where(corsia, 0.5 * (transaction_bid + transaction_ask), mid)
+        bid = np.where(corsia, transaction_bid, bid)
+        ask = np.where(corsia, transaction_ask, ask)
+
+    fields = {
+        "mid": mid,
+        "bid": bid,
+        "ask": ask,
+        "vintage_discount_factor": vintage_discount_factor,
+        "drift": drift,
+        "project_drift": project_drift,
+        "sdg_drift": sdg_drift,
+        "interest_rate": interest_rate
+    }
+    return History(
+        dates=list(df.index),
+        # column-major, so each project's series is contiguous for serialization
+        fields={field: np.asfortranarray(fields[field], dtype=np.float64) for field in VRE_FIELDS},
+        metadata=metadata,
+        metadata_of_day=group_of_day,
+        benchmarks=benchmarks,
+        beta=beta,
+        sigma=sigma,
+        corsia_dates=list(df["corsia_date"]) if "corsia_date" in df.columns else [None] * len(df)
+    )
+
+
+def price_platts_history(df: pd.DataFrame, indexes: List[str]) -> History:
+    """
+    Platts mid prices for every mapped scenario for every date of the history frame at once
+
+    :param indexes: The scenario index of each mapped scenario, in model output order
+    :return: History with "mid" and "drift" as (dates, scenarios) float64 arrays
+    """
+    metadata, group_of_day = _distinct(list(df["metadata"]))
+    beta, sigma = _model_outputs(df)
+    benchmarks = _benchmarks(df, metadata, group_of_day, beta.shape[-1])
+
+    B = 0.0
+    for i in range(beta.shape[-1]):
+        B = B + benchmarks[:, None, i] * beta[:, :, i].astype(np.float64)
+    S = np.exp((sigma ** 2.) / 2.)
+
+    # B and the drift are Python floats in the scalar formula, so the product stays in the model's float32
+    drift = np.array([[value.drift[index] for index in indexes] for value in metadata])[group_of_day]
+    mid = B.astype(S.dtype) * S * drift.astype(S.dtype)
+    return History(
+        dates=list(df.index),
+        fields={
+            "mid": np.asfortranarray(mid, dtype=np.float64),
+            "drift": np.asfortranarray(drift, dtype=np.float64)
+        },
+        metadata=metadata,
+        metadata_of_day=group_of_day,
+        benchmarks=benchmarks,
+        beta=beta,
+        sigma=sigma,
+        corsia_dates=[None] * len(df)
+    )
+
+
+def _nullable(values: np.ndarray) -> list:
+    return [None if value != value else value for value in values.tolist()]
+
+
+def _diagnostics(history: History, project: int) -> tuple:
+    """
+    Per date index levels, betas and sigma of one project, as plain Python values
+    """
+    names = [value.benchmarks[:history.beta.shape[-1]] for value in history.metadata]
+    names_of_day = [names[i] for i in history.metadata_of_day.tolist()]
+    indexes = [dict(zip(day_names, levels)) for day_names, levels in zip(names_of_day, history.benchmarks.tolist())]
+    betas = [dict(zip(day_names, beta)) for day_names, beta in zip(names_of_day, history.beta[:, project].tolist())]
+    weights = [history.metadata[i].weights for i in history.metadata_of_day.tolist()]
+    return indexes, betas, history.sigma[:, project].tolist(), weights
+
+
+def serialize_vre_history(history: History, project: int, corsia: int, verbose: bool = False) -> list:
+    """
+    Response "history" of one project, read column-wise from the History arrays
+
+    :param project: Position of the project in the model output
+    """
+    fields = history.fields
+    bids = _nullable(fields["bid"][:, project])
+    asks = _nullable(fields["ask"][:, project])
+    if not verbose:
+        return [{"date": date, "bid": bid, "ask": ask} for date, bid, ask in zip(history.dates, bids, asks)]
+
+    indexes, betas, sigmas, weights = _diagnostics(history, project)
+    spreads = [history.metadata[i].bid_ask_spread for i in history.metadata_of_day.tolist()]
+    columns = zip(
+        history.dates, bids, asks, indexes, betas, sigmas, weights, _nullable(fields["mid"][:, project]),
+        fields["vintage_discount_factor"][:, project].tolist(), spreads, fields["drift"][:, project].tolist(),
+        fields["project_drift"][:, project].tolist(), fields["sdg_drift"][:, project].tolist(),
+        history.corsia_dates, fields["interest_rate"][:, project].tolist()
+    )
+    return [{
+        "date": date,
+        "bid": bid,
+        "ask": ask,
+        "indexes": index,
+        "beta": beta,
+        "sigma": sigma,
+        "weights": weight,
+        "mid": mid,
+        "vintage_discount_factor": vintage_discount_factor,
+        "bid_ask_spread": spread,
+        "drift": drift,
+        "drift_breakdown": {"project": project_drift, "sdg": sdg_drift},
+        "corsia": {"date": corsia_date if corsia else ""},
+        "interest_rate": interest_rate
+    } for (
+        date, bid, ask, index, beta, sigma, weight, mid, vintage_discount_factor, spread, drift, project_drift,
+        sdg_drift, corsia_date, interest_rate
+    ) in columns]
+
+
+def serialize_platts_history(history: History, project: int, verbose: bool = False) -> list:
+    """
+    Response "history" of one Platts scenario, read column-wise from the History arrays
+
+    :param project: Position of the scenario in the model output
+    """
+    prices = history.fields["mid"][:, project].tolist()
+    if not verbose:
+        return [{"date": date, "price": price} for date, price in zip(history.dates, prices)]
+
+    indexes, betas, sigmas, weights = _diagnostics(history, project)
+    columns = zip(history.dates, prices, indexes, betas, sigmas, history.fields["drift"][:, project].tolist(), weights)
+    return [{
+        "date": date,
+        "price": price,
+        "indexes": index,
+        "beta": beta,
+        "sigma": sigma,
+        "drift": drift,
+        "weights": weight
+    } for date, price, index, beta, sigma, drift, weight in columns]
+
+
+def history_columns(history: History, scenarios: List[int], verbose: bool = False) -> dict:
+    """
+    Long format columns of a History, one row per (scenario, date), taken straight from the arrays
+
+    :param scenarios: Position in the request of each project of the model output
+    :return: Column name to array; Platts histories have "price" where VRE ones have "bid" and "ask"
+    """
+    days, projects = len(history.dates), len(scenarios)
+
+    def per_day(values) -> np.ndarray:
+        return np.tile(np.asarray(values), projects)
+
+    def per_project(values: np.ndarray) -> np.ndarray:
+        # fields are column-major, so raveling in F order lays out each project's dates contiguously
+        return np.ravel(values, order="F")
+
+    columns = {
+        "scenario": np.repeat(np.asarray(scenarios, dtype=np.int64), days),
+        "date": per_day(np.array(history.dates, dtype="datetime64[D]"))
+    }
+    platts = "bid" not in history.fields
+    if platts:
+        columns["price"] = per_project(history.fields["mid"])
+    else:
+        columns["bid"] = per_project(history.fields["bid"])
+        columns["ask"] = per_project(history.fields["ask"])
+    if not verbose:
+        return columns
+
+    fields = ["drift"] if platts else [field for field in VRE_FIELDS if field not in ("bid", "ask")]
+    for field in fields:
+        columns[field] = per_project(history.fields[field])
+    columns["sigma"] = per_project(history.sigma).astype(np.float64)
+    columns["weights"] = per_day([history.metadata[i].weights for i in history.metadata_of_day.tolist()])
+    if not platts:
+        columns["bid_ask_spread"] = per_day(
+            [np.nan if history.metadata[i].bid_ask_spread is None else history.metadata[i].bid_ask_spread
+             for i in history.metadata_of_day.tolist()]
+        )
+    return columns
+
+
+def ndjson_lines(records: Iterable[dict]) -> Iterator[str]:
+    """
+    One JSON document per line for each record, encoded as the default JSON response would encode it.
+    Records are pulled one at a time, so only the record being written is held in memory.
+    """
+    for record in records:
+        yield json.dumps(
+            jsonable_encoder(record), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ) + "\n"
@@ -0,0 +1,153 @@
+import datetime as dt
+import hashlib
+import json
+from typing import Callable, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import crud
+from helpers.history import History
+
+CACHED_FIELDS = ["mid", "bid", "ask"]
+PLATTS_CACHED_FIELDS = ["mid"]
+
+
+def fingerprint(*parts) -> str:
+    """
+    Content hash of what a scenario's model output and price depend on, besides the model and the date
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _sources(platts: bool) -> list:
+    return [crud.benchmark_index] if platts else [crud.benchmark_index, crud.standardized_instrument, crud.interest_curve]
+
+
+def _settled_date(db: Session, sources: list, start_date: dt.date, end_date: dt.date) -> Optional[dt.date]:
+    """
+    First date from which every support data series has a row inside the window, so prices are forward filled from
+    rows in the window and do not depend on where it starts (before it, the dataframes are back filled instead).
+
+    :return: None when a series has no row in the window and prices depend on the whole window
+    """
+    settled = start_date
+    for source in sources:
+        series = source.read_series_dates(db)
+        first_dates = source.read_series_dates(db, start_date, end_date)
+        if not series or set(first_dates) != set(series):
+            return None
+        settled = max(settled, *first_dates.values())
+    return settled
+
+
+def _anchor_date(db: Session, sources: list, date: dt.date) -> dt.date:
+    # earliest window start still holding, for every series, the row date is forward filled from
+    return min(min(source.read_series_dates(db, end_date=date, first=False).values()) for source in sources)
+
+
+def _fill(fields: dict, index: dict, history: History, columns: List[int], first_date: dt.date, last_date: dt.date) -> None:
+    positions = [(index[date], i) for i, date in enumerate(history.dates) if first_date <= date <= last_date]
+    if not positions:
+        return
+    rows, source_rows = np.array(positions).T
+    for field, values in fields.items():
+        values[rows] = history.fields[field][source_rows][:, columns]
+
+
+def cached_history(
+    db: Session,
+    model_name: str,
+    model_version: str,
+    generation: int,
+    scenarios: List[str],
+    start_date: dt.date,
+    end_date: dt.date,
+    system_date: dt.date,
+    compute: Callable,
+    platts: bool = False
+) -> History:
+    """
+    Daily mid/bid/ask (mid only for Platts) of every scenario, reading the dates already priced from the history_cache
+    table and computing only the others.
+
+    Cached prices are keyed by (model name, version, model_config generation, scenario fingerprint, date) and
+    are dropped on benchmark_index, standardized_instrument, interest_curve and model_config writes for that
+    date or earlier. Rows of a superseded generation are not written, and purged when the model registry polls the
+    new one. Only dates before the system date are cached.
+
+    :param scenarios: Fingerprint of each mapped scenario, in model output order
+    :param compute: compute(start_date, end_date) -> History of every mapped scenario over that window
+    :return: History holding the cached fields only (no per-day diagnostics)
+    """
+    sources = _sources(platts)
+    settled = _settled_date(db, sources, start_date, end_date)
+    if settled is None:
+        return compute(start_date, end_date)
+
+    # repeated scenarios share one cache entry and one column
+    distinct = list(dict.fromkeys(scenarios))
+    column = {scenario: i for i, scenario in enumerate(distinct)}
+    first_columns = [scenarios.index(scenario) for scenario in distinct]
+
+    dates = [start_date + dt.timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    index = {date: i for i, date in enumerate(dates)}
+    names = PLATTS_CACHED_FIELDS if platts else CACHED_FIELDS
+    fields = {field: np.full((len(dates), len(distinct)), np.nan) for field in names}
+    cached = np.zeros((len(dates), len(distinct)), dtype=bool)
+
+    last_cached_date = min(end_date, system_date - dt.timedelta(days=1))
+    if settled <= last_cached_date:
+        rows = crud.history_cache.read(db, model_name, model_version, generation, distinct, settled, last_cached_date)
+        if rows:
+            row_scenarios, row_dates, *values = zip(*rows)
+            rows, columns = np.array([index[date] for date in row_dates]), np.array([column[scenario] for scenario in row_scenarios])
+            cached[rows, columns] = True
+            for field, value in zip(["mid", "bid", "ask"], values):
+                if field in fields:
+                    fields[field][rows, columns] = np.array(value, dtype=np.float64)
+
+    missing = np.flatnonzero(~cached[index[settled]:].all(axis=1))
+    first_missing = dates[index[settled] + missing[0]] if len(missing) else None
+
+    windows = []
+    if settled > start_date:
+        # the leading dates are back filled from the first rows of the window, price them with the same window
+        windows.append((start_date, settled, start_date, settled - dt.timedelta(days=1)))
+    if first_missing is not None:
+        anchor = _anchor_date(db, sources, first_missing)
+        if windows and anchor <= settled:
+            windows = [(start_date, end_date, start_date, end_date)]
+        else:
+            windows.append((anchor, end_date, first_missing, end_date))
+
+    for window_start, window_end, first_date, last_date in windows:
+        _fill(fields, index, compute(window_start, window_end), first_columns, first_date, last_date)
+
+    # a pod still pricing from its previous snapshot does not cache prices under a superseded generation
+    if first_missing is not None and first_missing <= last_cached_date and crud.model_config.read_generation(db) == generation:
+        new = np.argwhere(~cached[index[first_missing]:index[last_cached_date] + 1]) + [index[first_missing], 0]
+        crud.history_cache.create(db, [{
+            "model_name": model_name,
+            "model_version": model_version,
+            "generation": generation,
+            "scenario": distinct[position],
+            "date": dates[row],
+            **{field: _nullable(fields[field][row, position]) for field in names}
+        } for row, position in new.tolist()])
+
+    expand = [column[scenario] for scenario in scenarios]
+    return History(
+        dates=dates,
+        fields={field: np.asfortranarray(values[:, expand]) for field, values in fields.items()},
+        metadata=[],
+        metadata_of_day=np.zeros(len(dates), dtype=np.int64),
+        benchmarks=None,
+        beta=None,
+        sigma=None,
+        corsia_dates=[None] * len(dates)
+    )
+
+
+def _nullable(value: float) -> Optional[float]:
+    return float(value) if value == value else None
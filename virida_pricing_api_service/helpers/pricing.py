@@ -1,11 +1,10 @@
 import json
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 from scipy.stats import norm
 import math
 import random
-import tensorflow as tf
 import datetime as dt
 import asyncio
 import aiohttp
@@ -17,18 +16,19 @@ from schemas.project import  ProjectMapping, ProjectPricing
 from config import import_class
 import os
 
-from core.ratecurve import RatesCurve
+from core.drift import MappingColumns, batch_drifts, mapping_columns, set_mapping_columns
+from core.ratecurve import rates_curve
 from sqlalchemy.orm import Session
 
 import httpclient
 from schemas.api_key import AuthDetail, AuthType
 
-from core.helpers import get_market_data_v5_v6, get_market_data
+from core.market_data import market_data as market_data_snapshot, market_data_v5_v6 as market_data_v5_v6_snapshot
 from core.static import VINTAGE_DISCOUNT_FACTORS, VINTAGE_PROJECT_CATEGORY_DISCOUNT_FACTORS, \
     VINTAGE_PROJECT_CATEGORY_DISCOUNT_FACTORS_LEGACY, EUA_SPOT_REFERENCE_USD, SCALING_STD, SCALING_INTERCEPT, \
     BIDASK_SIGMA_PCT, BIDASK_SPREAD, BIDASK_ADDON_SPREAD, CORSIA_MIN_YEAR, API_RESPONSE_ERROR_CODE_STRING, \
     INSTRUMENT_NO_BID_OR_ASK, API_RESPONSE_ERROR_MESSAGE_STRING, get_error_string_by_error_code, \
-    PRICING_CONFIG_CORSIA_MISSING, PRICING_CONFIG_VRE_MODEL_DRIFT_MISSING
+    PRICING_CONFIG_CORSIA_MISSING, PRICING_CONFIG_VRE_MODEL_DRIFT_MISSING, STATIC_ATTRIBUTES_URL
 
 config = import_class(os.environ['APP_SETTINGS'])
 
@@ -53,6 +53,33 @@ async def get_mappings(aiohttp_session: ClientSession, auth_detail: AuthDetail,
     return (status_code, response_data)
 
 
+async def load_mapping_columns(aiohttp_session: ClientSession, auth_detail: AuthDetail, project_pricings: List[ProjectPricing]) -> None:
+    """
+    Read the one-hot column order of the mapping versions of the projects from the static service, once per version and
+    process. A version that cannot be read is retried on the next request, its drifts are looked up per project meanwhile.
+    """
+    if auth_detail.type == AuthType.API_KEY:
+        headers = {"X-API-KEY": auth_detail.value}
+    else:
+        headers = {"Authorization": f"Bearer {auth_detail.value}"}
+
+    for version in set(project_pricing.project.version for project_pricing in project_pricings):
+        if version is None or mapping_columns(version) is not None:
+            continue
+        try:
+            columns = {}
+            for attribute in ["project", "sdg"]:
+                status_code, response_data = await httpclient.get(
+                    session=aiohttp_session, url=f"{STATIC_ATTRIBUTES_URL}/{attribute}/columns?version={version}", headers=headers
+                )
+                if status_code != status.HTTP_200_OK:
+                    raise ValueError(f"status {status_code}: {response_data}")
+                columns[attribute] = tuple(response_data)
+            set_mapping_columns(version, MappingColumns(**columns))
+        except Exception as exception:
+            print(f"[-] Exception occured while getting the mapping columns of version {version}: ", exception)
+
+
 def get_platts_mappings(indexes: list) -> list:
     mappings = {
         "1": [1, 0, 0, 0, 0, 0],
@@ -70,7 +97,104 @@ def _gbm_expectation(t, mu):
 
 
 def _corsia(x, c1, c2, c3):
-    return x * (1. + c1 * norm.pdf(math.log(c2 * x), loc=0., scale=c3))
+    # element-wise, so it takes a single mid or the mids of a whole batch
+    return x * (1. + c1 * norm.pdf(np.log(c2 * x), loc=0., scale=c3))
+
+
+def _padded(rows: List[list], fill: float) -> tuple:
+    """
+    Ragged per-project lists as one (projects, longest list) float64 matrix padded with fill, and the list lengths
+    """
+    counts = np.array([len(row) for row in rows], dtype=np.int64)
+    matrix = np.full((len(rows), max(counts.max(initial=0), 1)), fill, dtype=np.float64)
+    matrix[np.arange(matrix.shape[1]) < counts[:, None]] = [value for row in rows for value in row]
+    return matrix, counts
+
+
+def _vintage_ages(project_pricings: List[ProjectPricing], now: dt.datetime) -> np.ndarray:
+    return np.array([
+        (now - dt.datetime(year=int(project_pricing.project.vintage), month=12, day=31, hour=23, minute=59, second=0)).days
+        for project_pricing in project_pricings
+    ]) / 365
+
+
+def _vintage_discount_factors(project_pricings: List[ProjectPricing], model_id: str, is_model_5or6: bool) -> np.ndarray:
+    """
+    Vintage discount factor of every project of the batch: the average GBM expectation over its project categories,
+    or the legacy per-vintage table for the v5/v6b models
+    """
+    if is_model_5or6 and model_id not in ["800-8x800-2_v6c_weights", "800-8x800-2_v6d_weights"]:
+        # legacy logic for vintage
+        return np.array([VINTAGE_DISCOUNT_FACTORS[project_pricing.project.vintage] for project_pricing in project_pricings], dtype=np.float64)
+
+    # project category based approach for vintage
+    if is_model_5or6:
+        categories = [[int(int(x) / 10) for x in project_pricing.project.project] for project_pricing in project_pricings]
+        discount_factors = VINTAGE_PROJECT_CATEGORY_DISCOUNT_FACTORS_LEGACY
+    else:
+        categories = [[x.split('.')[0] for x in project_pricing.project.project] for project_pricing in project_pricings]
+        discount_factors = VINTAGE_PROJECT_CATEGORY_DISCOUNT_FACTORS
+    mu, counts = _padded([[discount_factors[x] for x in row] for row in categories], 0.)
+    t = _vintage_ages(project_pricings, dt.datetime.now())
+
+    expectations = _gbm_expectation(t[:, None], mu)
+    return np.where(np.arange(mu.shape[1]) < counts[:, None], expectations, 0.).sum(axis=1) / counts
+
+
+def _model_drifts(project_pricings: List[ProjectPricing], vre_model_drift: dict, inputs: dict) -> tuple:
+    """
+    Project drift (mean over the project classes) and SDG drift (product over the SDGs) of every project of the batch,
+    from the compiled drift table when the mappings are in its column order
+    """
+    drifts = batch_drifts(vre_model_drift, inputs["project"], inputs["sdg"], [project_pricing.project.version for project_pricing in project_pricings])
+    if drifts is not None:
+        return drifts
+
+    project_drift, counts = _padded([[vre_model_drift['project'][x] for x in project_pricing.project.project] for project_pricing in project_pricings], 0.)
+    sdg_drift, _ = _padded([[vre_model_drift['sdg'][sdg] for sdg in project_pricing.project.sdg] for project_pricing in project_pricings], 1.)
+    return project_drift.sum(axis=1) / counts, sdg_drift.prod(axis=1)
+
+
+def _bid_ask(mid: np.ndarray, sigma: np.ndarray) -> tuple:
+    # bid-ask spread (common logic for CORSIA eligible assets and non CORSIA eligible assets)
+    if abs(BIDASK_SPREAD) > 0:
+        bid_mult = 1 - (BIDASK_SPREAD / 2.) * (np.exp(sigma ** 2.) - 1) ** 0.5
+        ask_mult = 1 + (BIDASK_SPREAD / 2.) * (np.exp(sigma ** 2.) - 1) ** 0.5
+        return bid_mult * mid, ask_mult * mid
+    return mid, mid
+
+
+def _forward_benchmarks(benchmarks: np.ndarray, horizons: List[str], market_data: dict) -> np.ndarray:
+    """
+    Benchmarks of every project of the batch, EUA and brent carried to the project's forward horizon
+    """
+    benchmarks = np.repeat(benchmarks[None, :], len(horizons), axis=0)
+    forward_horizons = sorted(set(horizon for horizon in horizons if horizon != 'spot'))
+    if not forward_horizons:
+        return benchmarks
+
+    usd_rate_curve = rates_curve('USD', market_data['interest_rates'])
+
+    # 1. get spot and forward
+    # 2. calculate rc from rate_curve for expiry date
+    # 3. c = rc-math.log(future/spot)
+    # 4 adjust all benchmarks with
+    # x[key] = math.exp(rc-c)*benchmarks[key]
+    eua_spot_eur = market_data['prices']['spot']['eua']['value']
+    forwards = market_data['prices']['forward']['eua']
+    rates = usd_rate_curve.get_rates([dt.datetime.strptime(forwards[horizon]['expiry_date'], '%Y-%m-%d') for horizon in forward_horizons])
+    carry = {}
+    for horizon, rate in zip(forward_horizons, rates):
+        convenience_yield = rate - math.log(forwards[horizon]['value'] / eua_spot_eur)
+        carry[horizon] = np.exp(rate - convenience_yield)
+
+    # we compute benchmarks forward for EUA and for brent
+    # eua, c02, brent, treasury
+    forward = np.array([horizon != 'spot' for horizon in horizons])
+    factors = np.array([carry.get(horizon, 1.) for horizon in horizons])[forward]
+    benchmarks[forward, 0] = benchmarks[forward, 0] * factors  # eua
+    benchmarks[forward, 2] = benchmarks[forward, 2] * factors  # brent
+    return benchmarks
 
 
 def validate(project_mappings: List[ProjectMapping]):
@@ -112,10 +236,10 @@ def get_valid_indexes(project_mappings: List[ProjectMapping]) -> list:
     return indexes
 
 
-def run_model(
-    project_mappings: List[ProjectMapping],
-    tensorflow_model: object,
-):
+def model_inputs(project_mappings: List[ProjectMapping]) -> Optional[dict]:
+    """
+    Model input matrices of the mapped projects, one row per mapping in order; None when no project is mapped
+    """
     geographies: list = []
     standards: list = []
     projects: list = []
@@ -139,12 +263,23 @@ def run_model(
     if not standards or not geographies or not projects or not sdgs:
         return None
 
-    return tensorflow_model({
+    return {
         "standard": np.array(standards, dtype=np.float32),
         "geography": np.array(geographies, dtype=np.float32),
         "project": np.array(projects, dtype=np.float32),
         "sdg": np.array(sdgs, dtype=np.float32)
-    })
+    }
+
+
+def run_model(
+    project_mappings: List[ProjectMapping],
+    tensorflow_model: object,
+):
+    inputs = model_inputs(project_mappings)
+    if inputs is None:
+        return None
+
+    return tensorflow_model(inputs)
 
 
 def run_platts_model(scenarios: List[List[int]], model: object):
@@ -168,356 +303,256 @@ def calculate(db: Session, project_pricings: List[ProjectPricing], project_mappi
             API_RESPONSE_ERROR_CODE_STRING: PRICING_CONFIG_VRE_MODEL_DRIFT_MISSING,
             API_RESPONSE_ERROR_MESSAGE_STRING: get_error_string_by_error_code(PRICING_CONFIG_VRE_MODEL_DRIFT_MISSING)
         })
-    pricings: list = []
-    valid_indexes: list = []
+    pricings: list = [None] * len(project_mappings)
 
     formula: int = config_data["formula"]
     model_id: str = config_data["model_id"]
     is_model_5or6: bool = model_id in ["800-8x800-2_v5b_weights", "800-8x800-2_v6b_weights", "800-8x800-2_v6c_weights", "800-8x800-2_v6d_weights"]
-    market_data: dict = get_market_data_v5_v6(db=db) if is_model_5or6 else get_market_data(db=db)
+    # immutable snapshot shared with the other requests
+    market_data: dict = market_data_v5_v6_snapshot.get(db) if is_model_5or6 else market_data_snapshot.get(db)
     tensorflow_model = config_data["model"]
 
-    geographies: list = []
-    standards: list = []
-    projects: list = []
-    sdgs: list = []
-
+    valid_indexes: list = []
     for index, project_mapping in enumerate(project_mappings):
-        mapping: dict = project_mapping.mapping
-        if mapping is None:
-            project_pricing: ProjectPricing = project_pricings[index]
-            pricings.append({
-                "project": project_pricing.project,
-                "horizon": project_pricing.horizon,
-                "status": project_mapping.status,
-                "description": project_mapping.description,
-                "formula": None,
-                "sigma": None,
-                "beta": None,
-                "mid": None,
-                "bid": None,
-                "ask": None,
-                "vintage_discount_factor": None,
-                "eua_forward": None,
-                "model_id": None
-            })
+        if project_mapping.mapping is not None:
+            valid_indexes.append(index)
             continue
 
-        valid_indexes.append(index)
-
-        country = np.array(mapping.get("country")) if mapping.get("country") is not None else [0]
-        region = np.array(mapping.get("region")) if mapping.get("region") is not None else [0]
-        subregion = np.array(mapping.get("subregion")) if mapping.get("subregion") is not None else [0]
-        geography = np.bitwise_or(np.bitwise_or(country, region), subregion)
-        geographies.append(geography)
-
-        standards.append(mapping["standard"])
-        projects.append(mapping["project"])
-        sdgs.append(mapping["sdg"])
-    
-    tensorflow_output = tensorflow_model({
-        "standard": np.array(standards, dtype=np.float32),
-        "geography": np.array(geographies, dtype=np.float32),
-        "project": np.array(projects, dtype=np.float32),
-        "sdg": np.array(sdgs, dtype=np.float32)
-    })
-
-    projects_priced_count: int = 0
-
-    for index, valid_index in enumerate(valid_indexes):
-        project_pricing: ProjectPricing = project_pricings[valid_index]
-        project_mapping: ProjectMapping = project_mappings[valid_index]
-
-        if is_model_5or6:
-            eua_forward = market_data[project_pricing.horizon]  # forward EUA in USD, not that if horizon is spot, eua_forward = eua_spot
-            eua_spot = market_data["spot"]  # spot EUA in USD
-
-            # project category based approach for vintage
-            if model_id in ["800-8x800-2_v6c_weights", "800-8x800-2_v6d_weights"]:
-                project_category_list = [int(int(x) / 10) for x in project_pricing.project.project]
-                t = (dt.datetime.now() - dt.datetime(year=int(project_pricing.project.vintage),
-                                                     month=12, day=31, hour=23, minute=59, second=0)).days / 365
-                vintage_discount_factors = [_gbm_expectation(t, VINTAGE_PROJECT_CATEGORY_DISCOUNT_FACTORS_LEGACY[x]) for x in project_category_list]
-                vintage_discount_factor = np.average(vintage_discount_factors)
-            # legacy logic for vintage
-            else:
-                vintage_discount_factor = VINTAGE_DISCOUNT_FACTORS[project_pricing.project.vintage]
-        else:
-            # project category based approach for vintage
-            project_category_list = [x.split('.')[0] for x in project_pricing.project.project]
-            t = (dt.datetime.now() - dt.datetime(year=int(project_pricing.project.vintage),
-                                                    month=12, day=31, hour=23, minute=59, second=0)).days / 365
-            vintage_discount_factors = [_gbm_expectation(t, VINTAGE_PROJECT_CATEGORY_DISCOUNT_FACTORS[x]) for x in project_category_list]
-            vintage_discount_factor = np.average(vintage_discount_factors)
-
-        if formula == 1:
-            beta = float(tf.keras.backend.eval(tensorflow_output['beta'])[index][0])
-            sigma = float(np.exp(tf.keras.backend.eval(tensorflow_output['log_sigma'])[index][0]))
-            mid = vintage_discount_factor * np.exp(beta * np.log(eua_forward))
-            bid = vintage_discount_factor * np.exp(beta * np.log(eua_forward) - BIDASK_SIGMA_PCT * sigma)
-            ask = vintage_discount_factor * np.exp(beta * np.log(eua_forward) + BIDASK_SIGMA_PCT * sigma)
-
-            pricings.insert(valid_index, {
-                "project": project_pricing.project,
-                "horizon": project_pricing.horizon,
-                "status": project_mapping.status,
-                "description": project_mapping.description,
-                "formula": formula,
-                "sigma": sigma,
-                "beta": beta,
-                "mid": mid,
-                "bid": bid,
-                "ask": ask,
-                "vintage_discount_factor": vintage_discount_factor,
-                "eua": eua_forward,
-                "model_id": model_id
-            })
-        elif formula == 2:
-            beta = float(tf.keras.backend.eval(tensorflow_output['beta'])[index][0])
-            sigma = float(np.exp(tf.keras.backend.eval(tensorflow_output['log_sigma'])[index][0]))
-            mid = vintage_discount_factor * np.exp(beta - 0.5 * sigma * sigma) * eua_forward
-            bid = vintage_discount_factor * np.exp(beta - 0.5 * sigma * sigma - BIDASK_SIGMA_PCT * sigma) * eua_forward
-            ask = vintage_discount_factor * np.exp(beta - 0.5 * sigma * sigma + BIDASK_SIGMA_PCT * sigma) * eua_forward
-
-            pricings.insert(valid_index, {
-                "project": project_pricing.project,
-                "horizon": project_pricing.horizon,
-                "status": project_mapping.status,
-                "description": project_mapping.description,
+        project_pricing: ProjectPricing = project_pricings[index]
+        pricings[index] = {
+            "project": project_pricing.project,
+            "horizon": project_pricing.horizon,
+            "status": project_mapping.status,
+            "description": project_mapping.description,
+            "formula": None,
+            "sigma": None,
+            "beta": None,
+            "mid": None,
+            "bid": None,
+            "ask": None,
+            "vintage_discount_factor": None,
+            "eua_forward": None,
+            "model_id": None
+        }
+
+    if not valid_indexes:
+        return (pricings, 0)
+
+    # one forward pass for the batch, each output converted to NumPy once
+    inputs: dict = model_inputs(project_mappings)
+    tensorflow_output = {key: np.asarray(value) for key, value in tensorflow_model(inputs).items()}
+
+    # the whole batch is post-processed with array expressions, row i is project valid_indexes[i]
+    valid_pricings: List[ProjectPricing] = [project_pricings[valid_index] for valid_index in valid_indexes]
+    horizons: list = [project_pricing.horizon for project_pricing in valid_pricings]
+    vintage_discount_factor = _vintage_discount_factors(valid_pricings, model_id, is_model_5or6)
+
+    if is_model_5or6:
+        eua_forward = np.array([market_data[horizon] for horizon in horizons])  # forward EUA in USD, not that if horizon is spot, eua_forward = eua_spot
+        eua_spot = market_data["spot"]  # spot EUA in USD
+
+    results: list = []
+    if formula == 1:
+        beta = tensorflow_output['beta'][:, 0].astype(np.float64)
+        sigma = np.exp(tensorflow_output['log_sigma'][:, 0]).astype(np.float64)
+        mid = vintage_discount_factor * np.exp(beta * np.log(eua_forward))
+        bid = vintage_discount_factor * np.exp(beta * np.log(eua_forward) - BIDASK_SIGMA_PCT * sigma)
+        ask = vintage_discount_factor * np.exp(beta * np.log(eua_forward) + BIDASK_SIGMA_PCT * sigma)
+
+        results = [{
+            "formula": formula,
+            "sigma": sigma_,
+            "beta": beta_,
+            "mid": mid_,
+            "bid": bid_,
+            "ask": ask_,
+            "vintage_discount_factor": vintage_discount_factor_,
+            "eua": eua_forward_,
+            "model_id": model_id
+        } for sigma_, beta_, mid_, bid_, ask_, vintage_discount_factor_, eua_forward_ in zip(
+            sigma.tolist(), beta.tolist(), mid.tolist(), bid.tolist(), ask.tolist(), vintage_discount_factor.tolist(), eua_forward.tolist()
+        )]
+    elif formula == 2:
+        beta = tensorflow_output['beta'][:, 0].astype(np.float64)
+        sigma = np.exp(tensorflow_output['log_sigma'][:, 0]).astype(np.float64)
+        mid = vintage_discount_factor * np.exp(beta - 0.5 * sigma * sigma) * eua_forward
+        bid = vintage_discount_factor * np.exp(beta - 0.5 * sigma * sigma - BIDASK_SIGMA_PCT * sigma) * eua_forward
+        ask = vintage_discount_factor * np.exp(beta - 0.5 * sigma * sigma + BIDASK_SIGMA_PCT * sigma) * eua_forward
+
+        results = [{
+            "formula": formula,
+            "sigma": sigma_,
+            "beta": beta_,
+            "mid": mid_,
+            "bid": bid_,
+            "ask": ask_,
+            "vintage_discount_factor": vintage_discount_factor_,
+            "eua": eua_forward_,
+            "model_id": model_id
+        } for sigma_, beta_, mid_, bid_, ask_, vintage_discount_factor_, eua_forward_ in zip(
+            sigma.tolist(), beta.tolist(), mid.tolist(), bid.tolist(), ask.tolist(), vintage_discount_factor.tolist(), eua_forward.tolist()
+        )]
+    elif formula == 3:
+        # steps to compute scaler:
+        # 0a. calculate eua_forward reference (if spot, take EUA_SPOT_REFERENCE_USD, otherwise eua_reference = EUA_SPOT_REFERENCE_USD * eua_forward / eua_spot)
+        # 0b. calculate eua_forward current (if spot, take eua_spot, otherwise taken eua_forward [i.e eua_forward]
+        # 1. calculate project price with EUA reference [price_ref]
+        # 2. calculate project price with EUA current [price_current]
+        # 3. x = log(price_ref/price_current)
+        # 4. scaler = norm.cdf(x,loc=0.,scale=std)+0.5 [std defined in core static]
+        # 5. compute price as per formula 2 and multiply by scaler
+        beta = tensorflow_output['beta'][:, 0].astype(np.float64)
+        sigma = np.exp(tensorflow_output['log_sigma'][:, 0]).astype(np.float64)
+
+        # scaler calculation:
+        spot = np.array([horizon == 'spot' for horizon in horizons])
+        eua_reference = np.where(spot, EUA_SPOT_REFERENCE_USD, EUA_SPOT_REFERENCE_USD * eua_forward / eua_spot)
+        eua_current = np.where(spot, eua_spot, eua_forward)
+
+        price_mid_with_ref = vintage_discount_factor * np.exp(beta - 0.5 * sigma * sigma) * eua_reference
+        price_mid_with_current = vintage_discount_factor * np.exp(beta - 0.5 * sigma * sigma) * eua_current
+        x = np.log(price_mid_with_ref / price_mid_with_current)
+        scaler = norm.cdf(x, loc=0., scale=SCALING_STD) + SCALING_INTERCEPT
+
+        # project pricing with scaler
+        mid = vintage_discount_factor * np.exp(beta - 0.5 * sigma * sigma) * eua_forward * scaler
+        # the add-on spread is seeded by the day, so it is the same for every project
+        seed = (dt.datetime.now() - dt.datetime(1970, 1, 1)).days
+        random.seed(seed)
+        add_on_spread = random.uniform(-BIDASK_ADDON_SPREAD, BIDASK_ADDON_SPREAD)
+        all_in_spread = BIDASK_SPREAD + add_on_spread
+        bid = mid * (1. - all_in_spread)
+        ask = mid * (1. + all_in_spread)
+
+        if verbose:
+            results = [{
                 "formula": formula,
-                "sigma": sigma,
-                "beta": beta,
-                "mid": mid,
-                "bid": bid,
-                "ask": ask,
-                "vintage_discount_factor": vintage_discount_factor,
-                "eua": eua_forward,
+                "scaler": scaler_,
+                "sigma": sigma_,
+                "beta": beta_,
+                "mid": mid_,
+                "bid": bid_,
+                "ask": ask_,
+                "spread": all_in_spread,
+                "vintage_discount_factor": vintage_discount_factor_,
+                "eua_spot_usd": eua_spot,
+                "eua_forward_usd": eua_forward_,
                 "model_id": model_id
-
-            })
-        elif formula == 3:
-            # steps to compute scaler:
-            # 0a. calculate eua_forward reference (if spot, take EUA_SPOT_REFERENCE_USD, otherwise eua_reference = EUA_SPOT_REFERENCE_USD * eua_forward / eua_spot)
-            # 0b. calculate eua_forward current (if spot, take eua_spot, otherwise taken eua_forward [i.e eua_forward]
-            # 1. calculate project price with EUA reference [price_ref]
-            # 2. calculate project price with EUA current [price_current]
-            # 3. x = log(price_ref/price_current)
-            # 4. scaler = norm.cdf(x,loc=0.,scale=std)+0.5 [std defined in core static]
-            # 5. compute price as per formula 2 and multiply by scaler
-            beta = float(tf.keras.backend.eval(tensorflow_output['beta'])[index][0])
-            sigma = float(np.exp(tf.keras.backend.eval(tensorflow_output['log_sigma'])[index][0]))
-
-            # scaler calculation:
-
-            if project_pricing.horizon == 'spot':
-                eua_reference = EUA_SPOT_REFERENCE_USD
-                eua_current = eua_spot
-            else:
-                eua_reference = EUA_SPOT_REFERENCE_USD * eua_forward / eua_spot
-                eua_current = eua_forward
-
-            price_mid_with_ref = vintage_discount_factor * np.exp(beta - 0.5 * sigma * sigma) * eua_reference
-            price_mid_with_current = vintage_discount_factor * np.exp(beta - 0.5 * sigma * sigma) * eua_current
-            x = math.log(price_mid_with_ref / price_mid_with_current)
-            scaler = norm.cdf(x, loc=0., scale=SCALING_STD) + SCALING_INTERCEPT
-
-            # project pricing with scaler
-            mid = vintage_discount_factor * np.exp(beta - 0.5 * sigma * sigma) * eua_forward * scaler
-            seed = (dt.datetime.now() - dt.datetime(1970, 1, 1)).days
-            random.seed(seed)
-            add_on_spread = random.uniform(-BIDASK_ADDON_SPREAD, BIDASK_ADDON_SPREAD)
-            all_in_spread = BIDASK_SPREAD + add_on_spread
-            bid = mid * (1. - all_in_spread)
-            ask = mid * (1. + all_in_spread)
-
-            if verbose:
-                pricings.insert(valid_index, {
-                    "project": project_pricing.project,
-                    "horizon": project_pricing.horizon,
-                    "status": project_mapping.status,
-                    "description": project_mapping.description,
-                    "formula": formula,
-                    "scaler": scaler,
-                    "sigma": sigma,
-                    "beta": beta,
-                    "mid": mid,
-                    "bid": bid,
-                    "ask": ask,
-                    "spread": all_in_spread,
-                    "vintage_discount_factor": vintage_discount_factor,
-                    "eua_spot_usd": eua_spot,
-                    "eua_forward_usd": eua_forward,
-                    "model_id": model_id
-                })
-            else:
-                pricings.insert(valid_index, {
-                    "project": project_pricing.project,
-                    "horizon": project_pricing.horizon,
-                    "status": project_mapping.status,
-                    "description": project_mapping.description,
-                    "bid": bid,
-                    "ask": ask,
-                })
-        elif formula == 4:
-            # get beta and sigma (tf already returns exp() of beta/sigma)
-            beta = tensorflow_output['beta'].numpy()[index]
-            sigma = tensorflow_output['sigma'].numpy()[index][0]
-
-            # benchmarks ('eua', 'co2', 'brent', 'treasury')
-            benchmarks = np.array([
-                market_data['indices']['eua']['value'],
-                market_data['indices']['co2']['value'],
-                market_data['indices']['brent']['value'],
-                market_data['indices']['treasury']['value']])
-
-            # sequence:
-            # spot / forward
-            # vintage
-            # corsia
-            # bid-ask
-
-            # spot pricing
-            if project_pricing.horizon == 'spot':
-                S = np.exp((sigma ** 2.) / 2.)
-                B = np.sum(np.multiply(beta, benchmarks))
-                project_drift = np.mean([VRE_MODEL_DRIFT['project'][x] for x in project_pricing.project.project]) 
-                sdg_drift = np.prod([VRE_MODEL_DRIFT['sdg'][sdg] for sdg in project_pricing.project.sdg]) 
-                model_drift = project_drift * sdg_drift
-                mid = vintage_discount_factor * S * B * model_drift
-            # forward pricing
-            else:
-                usd_rate_curve = RatesCurve(valuation_date=dt.datetime.now(),
-                                            currency='USD',
-                                            tenor=[x['tenor'] for x in market_data['interest_rates']],
-                                            rate=[x['rate'] for x in market_data['interest_rates']])
-
-                # 1. get spot and forward
-                # 2. calculate rc from rate_curve for expiry date
-                # 3. c = rc-math.log(future/spot)
-                # 4 adjust all benchmarks with
-                # x[key] = math.exp(rc-c)*benchmarks[key]
-
-                eua_spot_eur = market_data['prices']['spot']['eua']['value']
-                eua_forward_eur = market_data['prices']['forward']['eua'][project_pricing.horizon]['value']
-                expiry_date = dt.datetime.strptime(market_data['prices']['forward']['eua'][project_pricing.horizon]['expiry_date'], '%Y-%m-%d')
-                rate = usd_rate_curve.get_rate(expiry_date)
-                convenience_yield = rate - math.log(eua_forward_eur / eua_spot_eur)
-
-                # we compute benchmarks forward for EUA and for brent
-                # eua, c02, brent, treasury
-                benchmarks[0] = benchmarks[0] * np.exp(rate - convenience_yield)  # eua
-                benchmarks[2] = benchmarks[2] * np.exp(rate - convenience_yield)  # brent
-                S = np.exp((sigma ** 2.) / 2.)
-                B = np.sum(np.multiply(beta, benchmarks))
-                project_drift = np.mean([VRE_MODEL_DRIFT['project'][x] for x in project_pricing.project.project]) 
-                sdg_drift = np.prod([VRE_MODEL_DRIFT['sdg'][sdg] for sdg in project_pricing.project.sdg]) 
-                model_drift = project_drift * sdg_drift
-                mid = vintage_discount_factor * S * B * model_drift
-
-            # CORSIA modelling enabled
+            } for scaler_, sigma_, beta_, mid_, bid_, ask_, vintage_discount_factor_, eua_forward_ in zip(
+                scaler.tolist(), sigma.tolist(), beta.tolist(), mid.tolist(), bid.tolist(), ask.tolist(),
+                vintage_discount_factor.tolist(), eua_forward.tolist()
+            )]
+        else:
+            results = [{"bid": bid_, "ask": ask_} for bid_, ask_ in zip(bid.tolist(), ask.tolist())]
+    elif formula == 4:
+        # get beta and sigma (tf already returns exp() of beta/sigma)
+        beta = tensorflow_output['beta']
+        sigma = tensorflow_output['sigma'][:, 0].astype(np.float64)
+
+        # benchmarks ('eua', 'co2', 'brent', 'treasury')
+        benchmarks = np.array([
+            market_data['indices']['eua']['value'],
+            market_data['indices']['co2']['value'],
+            market_data['indices']['brent']['value'],
+            market_data['indices']['treasury']['value']])
+
+        # sequence:
+        # spot / forward
+        # vintage
+        # corsia
+        # bid-ask
+
+        # spot pricing, forward horizons carry the EUA and brent benchmarks to the expiry
+        benchmarks = _forward_benchmarks(benchmarks, horizons, market_data)
+        S = np.exp((sigma ** 2.) / 2.)
+        B = np.sum(np.multiply(beta, benchmarks), axis=1)
+        project_drift, sdg_drift = _model_drifts(valid_pricings, VRE_MODEL_DRIFT, inputs)
+        model_drift = project_drift * sdg_drift
+        mid = vintage_discount_factor * S * B * model_drift
+
+        corsia_eligible = np.array([
+            project_pricing.project.corsia == 1 and int(project_pricing.project.vintage) >= CORSIA_MIN_YEAR
+            for project_pricing in valid_pricings
+        ])
+        corsia_dates: list = [None] * len(valid_pricings)
+
+        # CORSIA modelling enabled
+        if CORSIA_ENABLED:
+            # mid computed previouly is replaced if model mid is lower than CORSIA model mid
+            if corsia_eligible.any():
+                corsia_mid = _corsia(mid, CORSIA_C1, CORSIA_C2, CORSIA_C3)
+                mid = np.where(corsia_eligible & (mid < corsia_mid), corsia_mid, mid)
+
+            # bid-ask spread (common logic for CORSIA eligible assets and non CORSIA eligible assets)
+            bid, ask = _bid_ask(mid, sigma)
+        # CORSIA modelling disabled (i.e. we get price from transaction price stored in standardized_instrument  instead of modelling price)
+        else:
+            # bid-ask spread (common logic for non CORSIA eligible assets)
+            bid, ask = _bid_ask(mid, sigma)
+            if corsia_eligible.any():
+                # retrieve latest bid/ask from standardized_instrument table
+                corsia_bid, corsia_ask, corsia_date = crud.standardized_instrument.read_latest_bid_ask(db=db)
+                if corsia_bid is None or corsia_ask is None:
+                    raise HTTPException(status.HTTP_404_NOT_FOUND, {
+                        API_RESPONSE_ERROR_CODE_STRING: INSTRUMENT_NO_BID_OR_ASK,
+                        API_RESPONSE_ERROR_MESSAGE_STRING: get_error_string_by_error_code(INSTRUMENT_NO_BID_OR_ASK)
+                    })
+                corsia_mid = 0.5 * (corsia_bid + corsia_ask)
+
+                # if model mid is lower than CORSIA standardized instrument mid, replace bid/ask/mid with standardized instrument
+                # if model mid is higher or equal than CORSIA standardized instrument mid, we keep the model mid
+                replaced = corsia_eligible & (mid < corsia_mid)
+                bid = np.where(replaced, corsia_bid, bid)
+                ask = np.where(replaced, corsia_ask, ask)
+                mid = np.where(replaced, corsia_mid, mid)
+                corsia_dates = [corsia_date if value else None for value in replaced.tolist()]
+
+        if verbose:
             if CORSIA_ENABLED:
-                # check CORSIA eligibility
-                if project_pricing.project.corsia == 1 and int(project_pricing.project.vintage) >= CORSIA_MIN_YEAR:
-                    # mid computed previouly is replaced
-                    corsia_mid = _corsia(mid, CORSIA_C1, CORSIA_C2, CORSIA_C3)
-
-                    # if model mid is lower than CORSIA model mid
-                    if mid < corsia_mid:
-                        mid = corsia_mid
-
-                # bid-ask spread (common logic for CORSIA eligible assets and non CORSIA eligible assets)
-                if abs(BIDASK_SPREAD) > 0:
-                    bid_mult = 1 - (BIDASK_SPREAD / 2.) * (np.exp(sigma ** 2.) - 1) ** 0.5
-                    ask_mult = 1 + (BIDASK_SPREAD / 2.) * (np.exp(sigma ** 2.) - 1) ** 0.5
-                    bid = bid_mult * mid
-                    ask = ask_mult * mid
-                else:
-                    bid, ask = mid, mid
-            # CORSIA modelling disabled (i.e. we get price from transaction price stored in standardized_instrument  instead of modelling price)
+                corsia_diagnostics = [{
+                    "C1": CORSIA_C1,
+                    "C2": CORSIA_C2,
+                    "C3": CORSIA_C3
+                }] * len(valid_pricings)
             else:
-                corsia_date, corsia_ask, corsia_date = None, None, None
-                if project_pricing.project.corsia == 1 and int(project_pricing.project.vintage) >= CORSIA_MIN_YEAR:
-                    # retrieve latest bid/ask from standardized_instrument table
-                    corsia_bid, corsia_ask, corsia_date = crud.standardized_instrument.read_latest_bid_ask(db=db)
-                    if corsia_bid is None or corsia_ask is None:
-                        raise HTTPException(status.HTTP_404_NOT_FOUND, {
-                            API_RESPONSE_ERROR_CODE_STRING: INSTRUMENT_NO_BID_OR_ASK,
-                            API_RESPONSE_ERROR_MESSAGE_STRING: get_error_string_by_error_code(INSTRUMENT_NO_BID_OR_ASK)
-                        })
-                    corsia_mid = 0.5 * (corsia_bid + corsia_ask)
-
-                    # if model mid is lower than CORSIA standardized instrument mid, replace bid/ask/mid with standardized instrument
-                    if mid < corsia_mid:
-                        bid, ask, mid = corsia_bid, corsia_ask, corsia_mid
-                    # if model mid is higher or equal than CORSIA standardized instrument mid, we keep the model mid
-                    else:
-                        corsia_date = None
-                        # bid-ask spread (common logic for non CORSIA eligible assets)
-                        if abs(BIDASK_SPREAD) > 0:
-                            bid_mult = 1 - (BIDASK_SPREAD / 2.) * (np.exp(sigma ** 2.) - 1) ** 0.5
-                            ask_mult = 1 + (BIDASK_SPREAD / 2.) * (np.exp(sigma ** 2.) - 1) ** 0.5
-                            bid = bid_mult * mid
-                            ask = ask_mult * mid
-                        else:
-                            bid, ask = mid, mid
-                else:
-                    # bid-ask spread (common logic for non CORSIA eligible assets)
-                    if abs(BIDASK_SPREAD) > 0:
-                        bid_mult = 1 - (BIDASK_SPREAD / 2.) * (np.exp(sigma ** 2.) - 1) ** 0.5
-                        ask_mult = 1 + (BIDASK_SPREAD / 2.) * (np.exp(sigma ** 2.) - 1) ** 0.5
-                        bid = bid_mult * mid
-                        ask = ask_mult * mid
-                    else:
-                        bid, ask = mid, mid
-
-
-            if verbose:
-                if CORSIA_ENABLED:
-                    corsia_diagnostic = {
-                        "C1": CORSIA_C1,
-                        "C2": CORSIA_C2,
-                        "C3": CORSIA_C3
-                    }
-                else:
-                    corsia_diagnostic = {
-                        "date": corsia_date.strftime("%Y-%m-%d") if corsia_date is not None else ''
-                    }
-                pricings.insert(valid_index, {
-                    "project": project_pricing.project,
-                    "horizon": project_pricing.horizon,
-                    "status": project_mapping.status,
-                    "description": project_mapping.description,
-                    "formula": formula,
-                    "market_data": market_data,
-                    "model_id": model_id,
-                    "vintage_discount_factor": vintage_discount_factor,
-                    "benchmarks": benchmarks.tolist(),
-                    "exp_beta": beta.tolist(),
-                    "exp_sigma": float(sigma),
-                    "mid": float(mid),
-                    "bid": float(bid),
-                    "ask": float(ask),
-                    "project_drift": project_drift,
-                    "sdg_drift": sdg_drift,
-                    "CORSIA": corsia_diagnostic
-                })
-            else:
-                pricings.insert(valid_index, {
-                    "project": project_pricing.project,
-                    "horizon": project_pricing.horizon,
-                    "status": project_mapping.status,
-                    "description": project_mapping.description,
-                    "bid": float(bid),
-                    "ask": float(ask),
-                })
+                corsia_diagnostics = [{
+                    "date": corsia_date.strftime("%Y-%m-%d") if corsia_date is not None else ''
+                } for corsia_date in corsia_dates]
+            results = [{
+                "formula": formula,
+                "market_data": market_data,
+                "model_id": model_id,
+                "vintage_discount_factor": vintage_discount_factor_,
+                "benchmarks": benchmarks_,
+                "exp_beta": beta_,
+                "exp_sigma": sigma_,
+                "mid": mid_,
+                "bid": bid_,
+                "ask": ask_,
+                "project_drift": project_drift_,
+                "sdg_drift": sdg_drift_,
+                "CORSIA": corsia_diagnostic
+            } for vintage_discount_factor_, benchmarks_, beta_, sigma_, mid_, bid_, ask_, project_drift_, sdg_drift_, corsia_diagnostic in zip(
+                vintage_discount_factor.tolist(), benchmarks.tolist(), beta.tolist(), sigma.tolist(), mid.tolist(),
+                np.asarray(bid, dtype=np.float64).tolist(), np.asarray(ask, dtype=np.float64).tolist(),
+                project_drift.tolist(), sdg_drift.tolist(), corsia_diagnostics
+            )]
         else:
-            pricings.insert(valid_index, {
-                "project": project_pricing.project,
-                "horizon": project_pricing.horizon,
-                "status": project_mapping.status,
-                "description": project_mapping.description,
-                "message": f"pricing formula {formula} not found"
-            })
-        
-        projects_priced_count = projects_priced_count + 1
-    return (pricings, projects_priced_count)
+            results = [{"bid": bid_, "ask": ask_} for bid_, ask_ in zip(
+                np.asarray(bid, dtype=np.float64).tolist(), np.asarray(ask, dtype=np.float64).tolist()
+            )]
+    else:
+        results = [{"message": f"pricing formula {formula} not found"}] * len(valid_indexes)
+
+    for valid_index, result in zip(valid_indexes, results):
+        project_pricing: ProjectPricing = project_pricings[valid_index]
+        project_mapping: ProjectMapping = project_mappings[valid_index]
+        pricings[valid_index] = {
+            "project": project_pricing.project,
+            "horizon": project_pricing.horizon,
+            "status": project_mapping.status,
+            "description": project_mapping.description,
+            **result
+        }
+
+    return (pricings, len(valid_indexes))
@@ -21,6 +21,19 @@ class Benchmark(Base):
     timestamp = Column('timestamp', DateTime(), nullable=True)
 
 
+class BenchmarkAnchor(Base):
+    __tablename__ = 'benchmark_anchor'
+
+    # value of a benchmark at an index reference date, as forward (or backward) filled from source_date
+    name = Column('name', String(20), nullable=False, primary_key=True)
+    type = Column('type', String(20), nullable=False, primary_key=True)
+    symbol = Column('symbol', String(20), nullable=False, primary_key=True)
+    date = Column('date', Date(), nullable=False, primary_key=True)
+    source_date = Column('source_date', Date(), nullable=False)
+    close = Column('close', Float(), nullable=False)
+    currency = Column('currency', String(3), nullable=True)
+
+
 class BenchmarkIndex(Base):
     __tablename__ = 'benchmark_index'
 
@@ -89,6 +102,31 @@ class ModelConfig(Base):
     config = Column(JSON, index=True)
 
 
+class ModelConfigGeneration(Base):
+    __tablename__ = 'model_config_generation'
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+
+
+class MarketDataGeneration(Base):
+    __tablename__ = 'market_data_generation'
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+
+
+class HistoryCache(Base):
+    __tablename__ = 'history_cache'
+    model_name = Column(String(256), primary_key=True)
+    model_version = Column(String(256), primary_key=True)
+    generation = Column(Integer, primary_key=True)
+    scenario = Column(String(64), primary_key=True)
+    date = Column(Date, primary_key=True, index=True)
+    # double precision, so cached prices read back exactly as computed
+    mid = Column(Float(precision=53), nullable=True)
+    bid = Column(Float(precision=53), nullable=True)
+    ask = Column(Float(precision=53), nullable=True)
+
+
 class System(Base):
     __tablename__ = 'system'
     date = Column(Date, primary_key=True, index=True)
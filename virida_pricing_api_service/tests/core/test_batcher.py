@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.batcher import DynamicBatcher
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, inputs: dict) -> dict:
+        self.calls += 1
+        return {"beta": inputs["standard"] * 2., "sigma": inputs["sdg"].sum(axis=1, keepdims=True)}
+
+
+def test_batcher_splits_outputs_per_caller():
+    model = CountingModel()
+    batcher = DynamicBatcher(model, window_ms=50, max_rows=1000)
+
+    def call(i):
+        rows = i + 1
+        return i, batcher({
+            "standard": np.full((rows, 8), i, dtype=np.float32),
+            "sdg": np.ones((rows, 17), dtype=np.float32)
+        })
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(call, range(8)))
+
+    for i, output in results:
+        assert output["beta"].shape == (i + 1, 8)
+        assert np.all(output["beta"] == i * 2.)
+        assert np.all(output["sigma"] == 17.)
+    assert model.calls < len(results)
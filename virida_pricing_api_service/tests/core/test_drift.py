@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from core import drift as drift_module
+from core.drift import MappingColumns, batch_drifts, compile_drift
+
+# 23 project classes, the width of the deployed v7 models' project input
+COLUMNS = MappingColumns(
+    project=tuple([f"afolu.0{i}" for i in range(1, 6)] + [f"eefs.0{i}" for i in range(1, 6)] + [f"ga.0{i}" for i in range(1, 7)]
+                  + [f"re.0{i}" for i in range(1, 8)]),
+    sdg=tuple(str(sdg) for sdg in range(1, 18))
+)
+
+
+@pytest.fixture(autouse=True)
+def mapping_columns(monkeypatch):
+    monkeypatch.setattr(drift_module, "_mapping_columns", {3: COLUMNS})
+
+
+def mapping(values: list, columns: tuple) -> list:
+    row = [0] * len(columns)
+    for value in values:
+        row[columns.index(value)] += 1
+    return row
+
+
+def test_batch_drifts_match_per_project_lookups():
+    rng = np.random.default_rng(1)
+    drift = {
+        "project": {project: float(rng.uniform(0.8, 1.2)) for project in COLUMNS.project},
+        "sdg": {sdg: float(rng.uniform(0.9, 1.1)) for sdg in COLUMNS.sdg}
+    }
+    projects = [["afolu.01"], ["re.02", "ga.01"], ["eefs.05", "eefs.05", "re.07"]]
+    sdgs = [["13"], ["1", "10", "1"], []]
+
+    project_drift, sdg_drift = batch_drifts(
+        drift,
+        np.array([mapping(values, COLUMNS.project) for values in projects], dtype=np.float32),
+        np.array([mapping(values, COLUMNS.sdg) for values in sdgs], dtype=np.float32),
+        [3, 3, 3]
+    )
+
+    np.testing.assert_allclose(project_drift, [np.mean([drift["project"][x] for x in values]) for values in projects], rtol=1e-15)
+    np.testing.assert_allclose(sdg_drift, [np.prod([drift["sdg"][x] for x in values]) for values in sdgs], rtol=1e-15)
+    assert project_drift[0] == drift["project"]["afolu.01"]
+
+
+def test_batch_drifts_follow_the_column_order_of_the_mapping_version():
+    drift = {"project": {project: float(i) + 1. for i, project in enumerate(COLUMNS.project)}, "sdg": {"13": 0.9}}
+    drift_module.set_mapping_columns(4, COLUMNS._replace(project=COLUMNS.project[::-1]))
+    projects = np.array([[1] + [0] * 22])
+
+    # the same first column is afolu.01 in version 3 and re.07 in version 4
+    assert batch_drifts(drift, projects, np.array([mapping(["13"], COLUMNS.sdg)]), [3])[0] == drift["project"]["afolu.01"]
+    assert batch_drifts(drift, projects, np.array([mapping(["13"], COLUMNS.sdg)]), [4])[0] == drift["project"]["re.07"]
+
+
+def test_batch_drifts_fall_back_outside_of_the_table():
+    drift = {"project": {"afolu.01": 1.1}, "sdg": {"13": 0.9}}
+    sdgs = np.array([mapping(["13"], COLUMNS.sdg)])
+    projects = np.array([mapping(["afolu.01"], COLUMNS.project)])
+
+    assert batch_drifts(drift, projects, sdgs, [3]) == (np.array([1.1]), np.array([0.9]))
+    # mapping versions with no column order read yet, or mixed in one batch
+    assert batch_drifts(drift, projects, sdgs, [2]) is None
+    assert batch_drifts(drift, np.repeat(projects, 2, axis=0), np.repeat(sdgs, 2, axis=0), [3, 2]) is None
+    # mappings of another width are not in the version's column order
+    assert batch_drifts(drift, np.array([[1, 0, 0]]), sdgs, [3]) is None
+    # a class with no drift value is left to the per-project lookups (and their KeyError)
+    assert batch_drifts(drift, np.array([mapping(["re.01"], COLUMNS.project)]), sdgs, [3]) is None
+
+
+def test_compile_drift_once_per_config():
+    drift = {"project": {"afolu.01": 1.1}, "sdg": {"13": 0.9}}
+
+    assert compile_drift(drift, COLUMNS) is compile_drift({"sdg": {"13": 0.9}, "project": {"afolu.01": 1.1}}, COLUMNS)
+    assert compile_drift(drift, COLUMNS) is not compile_drift({"project": {"afolu.01": 1.2}, "sdg": {"13": 0.9}}, COLUMNS)
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+import pytest
+
+from core.executor import InferenceExecutor, InferenceQueueFullException, InferenceTimeoutException
+
+
+@pytest.mark.asyncio
+async def test_run_returns_result():
+    executor = InferenceExecutor(max_workers=1, max_queue_depth=1, timeout=5)
+    assert await executor.run(lambda x, y: x + y, 1, y=2) == 3
+
+    metrics = executor.metrics()
+    assert metrics["completed"] == 1
+    assert metrics["queue_depth"] == 0
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_run_rejects_when_queue_is_full():
+    executor = InferenceExecutor(max_workers=1, max_queue_depth=0, timeout=5)
+    release = threading.Event()
+
+    running = asyncio.ensure_future(executor.run(release.wait))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(InferenceQueueFullException):
+        await executor.run(lambda: None)
+
+    release.set()
+    await running
+    assert executor.metrics()["rejected"] == 1
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_run_times_out():
+    executor = InferenceExecutor(max_workers=1, max_queue_depth=1, timeout=0.05)
+    release = threading.Event()
+
+    with pytest.raises(InferenceTimeoutException):
+        await executor.run(release.wait)
+
+    release.set()
+    assert executor.metrics()["timed_out"] == 1
+    executor.shutdown()
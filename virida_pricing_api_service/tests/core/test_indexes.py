@@ -0,0 +1,154 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import crud
+from core.helpers import read_market_data
+from core.indexes import INDEX_REGISTRY, benchmark_index, read_index_history, read_index_series
+from core.static import INDEX_REFERENCE_DATE, CO2_INDEX_LOOKBACK
+from crud.benchmark import fetch_benchmark_dataframe
+from database import Base
+from models import Benchmark, BenchmarkAnchor, Forex, InterestRate, MarketDataGeneration
+from schemas.benchmark import BenchmarkDelete, BenchmarkUpdate
+
+BENCHMARKS = [("EUA", "CKSPT", "EUR"), ("CO2", "CO2SM", "PPM"), ("BRENTEU", "BRENTEU", "USD"), ("T10Y3M", "T10Y3M", "USD")]
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Benchmark.__table__, BenchmarkAnchor.__table__, Forex.__table__,
+                                             InterestRate.__table__, MarketDataGeneration.__table__])
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    rng = np.random.default_rng(7)
+    for date in pd.bdate_range("2018-11-01", "2021-03-05").date:
+        session.add(Forex(date=date, currency="EUR", close=0.8 + 0.1 * rng.random()))
+        for i, (name, symbol, currency) in enumerate(BENCHMARKS):
+            # CO2 is daily, the others skip a few business days but not the reference date
+            if name == "CO2" or date == INDEX_REFERENCE_DATE.date() or rng.random() > 0.1:
+                session.add(Benchmark(date=date, name=name, symbol=symbol, type="spot", currency=currency,
+                                      close=float(np.float32(10. * (i + 1) + rng.random()))))
+        for year in (2021, 2022, 2023):
+            session.add(Benchmark(date=date, name="EUA", symbol=f"MOZ{year % 100}", type="forward", currency="EUR",
+                                  expiry_date=dt.date(year, 12, 15), close=float(np.float32(30. + rng.random()))))
+        for tenor in ("1M", "3M", "1Y"):
+            if rng.random() > 0.3:
+                session.add(InterestRate(date=date, currency="USD", tenor=tenor, rate=float(np.float32(0.01 * rng.random()))))
+    session.commit()
+    yield session
+    session.close()
+
+
+def full_history_indices(db) -> dict:
+    eua_df = fetch_benchmark_dataframe(db, name='EUA', symbol='CKSPT', type='spot', start_date=INDEX_REFERENCE_DATE, frequency='D', ccy_convert=True)
+    co2_df = fetch_benchmark_dataframe(db, name='CO2', symbol='CO2SM', type='spot', start_date=(INDEX_REFERENCE_DATE - dt.timedelta(days=370)), frequency='D')
+    co2_df['roc'] = co2_df['value'].pct_change(periods=CO2_INDEX_LOOKBACK)
+    brent_df = fetch_benchmark_dataframe(db, name='BRENTEU', symbol='BRENTEU', type='spot', start_date=INDEX_REFERENCE_DATE, frequency='D')
+    treasury_df = fetch_benchmark_dataframe(db, name='T10Y3M', symbol='T10Y3M', type='spot', start_date=INDEX_REFERENCE_DATE, frequency='D')
+    return {
+        'eua': eua_df.iloc[-1]['value_usd'] / eua_df.iloc[0]['value_usd'],
+        'co2': np.exp(100. * (co2_df.iloc[-1]['roc'] - co2_df[co2_df.index >= INDEX_REFERENCE_DATE].iloc[0]['roc'])),
+        'brent': brent_df.iloc[-1]['value'] / brent_df.iloc[0]['value'],
+        'treasury': np.exp((treasury_df.iloc[-1]['value'] - treasury_df.iloc[0]['value']) / 9.75),
+    }
+
+
+def test_indices_match_the_full_history_computation(db):
+    market_data = read_market_data(db)
+
+    for index, value in full_history_indices(db).items():
+        assert market_data['indices'][index]['value'] == pytest.approx(value, rel=1e-12)
+    assert market_data['indices']['co2']['date'] == '2021-03-05'
+    assert market_data['prices']['spot']['eua']['currency'] == 'EUR'
+    assert db.query(BenchmarkAnchor).count() == 5  # the CO2 rate of change is anchored a year before too
+
+
+def test_anchors_are_computed_once_and_invalidated_by_earlier_writes(db):
+    reference_date = dt.date(2020, 1, 1)
+    first = benchmark_index(db, 'BRENTEU', 'BRENTEU', 'spot', 'ratio', reference_date, date=dt.date(2020, 6, 1))
+
+    # rows read through the anchor do not change the reference
+    db.query(Benchmark).filter_by(name='BRENTEU').filter(Benchmark.date <= reference_date).update({Benchmark.close: 1.})
+    db.commit()
+    assert benchmark_index(db, 'BRENTEU', 'BRENTEU', 'spot', 'ratio', reference_date, date=dt.date(2020, 6, 1)) == first
+
+    # later writes keep the anchor, writes on or before the reference date drop it
+    crud.benchmark.delete(db, BenchmarkDelete(date=dt.date(2021, 3, 5), name='BRENTEU', type='spot', symbol='BRENTEU'))
+    anchor = crud.benchmark_anchor.read(db, 'BRENTEU', 'BRENTEU', 'spot', reference_date)
+    assert anchor is not None
+    crud.benchmark.update(db, BenchmarkUpdate(date=anchor.source_date, name='BRENTEU', type='spot', symbol='BRENTEU', close=2.))
+    assert crud.benchmark_anchor.read(db, 'BRENTEU', 'BRENTEU', 'spot', reference_date) is None
+
+    index = benchmark_index(db, 'BRENTEU', 'BRENTEU', 'spot', 'ratio', reference_date, date=dt.date(2020, 6, 1))
+    assert index.reference == 2.
+    assert index.latest == first.latest
+
+
+def test_market_data_is_read_in_two_round_trips(db):
+    reference_date = INDEX_REFERENCE_DATE.date()
+    read_market_data(db)  # anchors the reference values
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.get_bind(), "before_cursor_execute", count)
+    market_data = read_market_data(db)
+    event.remove(db.get_bind(), "before_cursor_execute", count)
+    assert len(statements) == 2
+
+    eua = benchmark_index(db, 'EUA', 'CKSPT', 'spot', 'ratio', reference_date, ccy_convert=True)
+    co2 = benchmark_index(db, 'CO2', 'CO2SM', 'spot', 'roc', reference_date)
+    assert market_data['indices']['eua'] == {'value': eua.value, 'date': eua.benchmark.date.strftime('%Y-%m-%d')}
+    assert market_data['indices']['co2'] == {'value': co2.value, 'date': co2.benchmark.date.strftime('%Y-%m-%d')}
+    assert market_data['prices']['forward']['eua'] == {
+        contract.expiry_date.strftime('%b%Y').lower(): {'value': contract.close, 'currency': 'EUR', 'date': contract.date.strftime('%Y-%m-%d'),
+                                                       'expiry_date': contract.expiry_date.strftime('%Y-%m-%d')}
+        for contract in crud.benchmark.read_latest_benchmarks(db, name='EUA', type='forward')
+    }
+    assert sorted(market_data['interest_rates'], key=lambda rate: rate['tenor']) == [
+        {'date': rate.date.strftime('%Y-%m-%d'), 'currency': rate.currency, 'tenor': rate.tenor, 'rate': rate.rate}
+        for rate in sorted(crud.interest_rate.read_latest_interest_rates(db), key=lambda rate: rate.tenor)
+    ]
+
+
+def test_index_series_are_read_in_one_round_trip_and_aligned(db):
+    specs = [spec for spec in INDEX_REGISTRY if spec.index in ('eua', 'co2', 'brent')]
+    windows = [(dt.date(2019, 12, 2), dt.date(2020, 1, 31)), (dt.date(2021, 2, 1), dt.date(2021, 3, 3))]
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.get_bind(), "before_cursor_execute", count)
+    df = read_index_series(db, specs, windows)
+    event.remove(db.get_bind(), "before_cursor_execute", count)
+    assert len(statements) == 1
+
+    # daily, as CO2 is
+    assert list(df.columns) == ['eua', 'co2', 'brent']
+    assert len(df) == sum((end - start).days + 1 for start, end in windows)
+    for start, end in windows:
+        eua = fetch_benchmark_dataframe(db, name='EUA', symbol='CKSPT', type='spot', start_date=start, end_date=end, frequency='B', ccy_convert=True)
+        brent = fetch_benchmark_dataframe(db, name='BRENTEU', symbol='BRENTEU', type='spot', start_date=start, end_date=end, frequency='B')
+        np.testing.assert_allclose(df.loc[eua.index, 'eua'], eua['value_usd'], rtol=1e-12)
+        np.testing.assert_allclose(df.loc[brent.index, 'brent'], brent['value_usd'], rtol=1e-12)
+
+
+def test_index_history_matches_the_index_of_each_date(db):
+    reference_date = dt.date(2020, 1, 1)
+    specs = [spec for spec in INDEX_REGISTRY if spec.index in ('eua', 'co2', 'brent', 'treasury')]
+
+    history = read_index_history(db, specs, reference_date, dt.date(2021, 1, 29), dt.date(2021, 2, 8))
+
+    assert list(history.index.date) == [dt.date(2021, 1, 29) + dt.timedelta(days=day) for day in range(11)]
+    for date, row in history.iterrows():
+        for spec in specs:
+            index = benchmark_index(db, spec.name, spec.symbol, spec.type, spec.kind, reference_date, date=date.date(), ccy_convert=spec.ccy_convert)
+            assert row[spec.index] == pytest.approx(index.value, rel=1e-12)
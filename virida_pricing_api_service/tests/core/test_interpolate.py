@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from core.interpolate import Interpolate
+
+TIMES, RATES = [0.1, 0.5, 1., 2., 5.], [0.01, 0.02, 0.015, 0.03, 0.04]
+
+
+def test_interpolate_flat_left_linear_inside_extrapolated_right():
+    interpolate = Interpolate(TIMES, RATES)
+
+    assert interpolate(0.) == 0.01
+    assert interpolate(0.1) == 0.01
+    assert interpolate(0.3) == pytest.approx(0.015)
+    assert interpolate(1.) == 0.02 + ((1. - 0.5) / (1. - 0.5)) * (0.015 - 0.02)
+    assert interpolate(5.) == 0.04
+    assert interpolate(8.) == pytest.approx(0.04 + (0.01 / 3.) * 3.)
+    assert isinstance(interpolate(0.3), float)
+
+
+def test_interpolate_arrays_match_scalar_calls():
+    interpolate = Interpolate(TIMES, RATES)
+    x = np.array([[0., 0.05, 0.1, 0.3], [0.5, 0.75, 1., 3.], [5., 7.5, 2., 1.5]])
+
+    result = interpolate(x)
+
+    assert result.shape == x.shape
+    np.testing.assert_array_equal(result, [[interpolate(value) for value in row] for row in x.tolist()])
+
+
+def test_interpolate_rejects_invalid_curves_and_negative_values():
+    with pytest.raises(ValueError):
+        Interpolate([0.1, 0.5], [0.01])
+    with pytest.raises(ValueError):
+        Interpolate([0.5, 0.1], [0.01, 0.02])
+    with pytest.raises(ValueError):
+        Interpolate(TIMES, RATES)(np.array([1., -0.5]))
+    with pytest.raises(ValueError):
+        Interpolate([0.1], [0.01])(1.)
@@ -0,0 +1,92 @@
+import copy
+import datetime as dt
+import json
+import pickle
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+from core.market_data import MarketDataCache, freeze
+from database import Base
+from models import Forex, MarketDataGeneration
+from schemas.forex import ForexCreate
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Forex.__table__, MarketDataGeneration.__table__])
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+class Reader:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, db):
+        self.calls += 1
+        return {"indices": {"eua": {"value": float(self.calls)}}, "interest_rates": [{"tenor": "3M", "rate": 0.01}]}
+
+
+def write_forex(db, day: int):
+    crud.forex.create(db, ForexCreate(date=dt.date(2021, 1, day), currency="USD", close=1.2, timestamp=dt.datetime(2021, 1, day, 18)))
+
+
+def test_snapshot_is_built_once_and_rebuilt_after_a_write(db):
+    read = Reader()
+    cache = MarketDataCache(read, dict, ttl=0)
+
+    first = cache.get(db)
+    assert cache.get(db) is first
+    assert read.calls == 1
+
+    write_forex(db, 1)
+    second = cache.get(db)
+    assert read.calls == 2
+    assert second["indices"]["eua"]["value"] == 2.
+    assert crud.market_data.read_generation(db) == 1
+
+
+def test_snapshot_skips_the_database_until_the_ttl_is_over(db):
+    read = Reader()
+    cache = MarketDataCache(read, dict, ttl=3600)
+    cache.get(db)
+
+    write_forex(db, 1)
+    assert cache.get(db)["indices"]["eua"]["value"] == 1.
+
+    cache.invalidate()
+    assert cache.get(db)["indices"]["eua"]["value"] == 2.
+
+
+def test_snapshot_falls_back_when_market_data_cannot_be_read(db):
+    def fail(db):
+        raise ValueError("no rows")
+
+    assert MarketDataCache(fail, lambda: {"indices": {}}, ttl=0).get(db) == {"indices": {}}
+
+    read = Reader()
+    cache = MarketDataCache(read, lambda: {"indices": {}}, ttl=0)
+    snapshot = cache.get(db)
+    cache._read = fail
+    write_forex(db, 1)
+    assert cache.get(db) is snapshot
+
+
+def test_snapshot_is_read_only_but_serializable():
+    snapshot = freeze({"indices": {"eua": {"value": 1.5}}, "interest_rates": [{"tenor": "3M", "rate": 0.01}]})
+
+    with pytest.raises(TypeError):
+        snapshot["indices"]["eua"]["value"] = 2.
+    with pytest.raises(TypeError):
+        snapshot.update({"prices": {}})
+    with pytest.raises(AttributeError):
+        snapshot["interest_rates"].append({})
+
+    assert json.loads(json.dumps(snapshot)) == {"indices": {"eua": {"value": 1.5}}, "interest_rates": [{"tenor": "3M", "rate": 0.01}]}
+    assert pickle.loads(pickle.dumps(snapshot)) == snapshot
+    assert copy.deepcopy(snapshot) == snapshot
@@ -0,0 +1,68 @@
+import shutil
+
+import numpy as np
+import tensorflow as tf
+
+from core import loader, weight_store
+from core.models import ViridaPrices, Platts
+from core.numpy_models import NumpyViridaPrices, NumpyPlatts, export_weights
+
+INPUTS = {'project': 23, 'standard': 8, 'geography': 250, 'sdg': 17}
+OUTPUTS = {'beta': ['eua', 'co2', 'brent', 'treasury'], 'sigma': ['sigma']}
+UNITS = {'input': 64, 'hidden': [64] * 8}
+
+
+def test_numpy_virida_prices_matches_tensorflow():
+    model = ViridaPrices(inputs=INPUTS, units=UNITS, outputs=OUTPUTS, seed=7)
+    model.warmup()
+    numpy_model = NumpyViridaPrices(inputs=INPUTS, units=UNITS, outputs=OUTPUTS, weights=export_weights(model))
+
+    for rows in [1, 10, 100]:
+        inputs = {key: np.random.randint(0, 2, (rows, width)).astype(np.float32) for key, width in INPUTS.items()}
+        expected = model(inputs)
+        actual = numpy_model(inputs)
+        for key in OUTPUTS:
+            np.testing.assert_allclose(actual[key], np.asarray(expected[key]), rtol=1e-5, atol=1e-5)
+
+
+def test_numpy_platts_matches_tensorflow():
+    units = {'hidden': [32] * 4}
+    model = Platts(inputs={'index': 6}, units=units, outputs=OUTPUTS, seed=7)
+    model.warmup()
+    numpy_model = NumpyPlatts(inputs={'index': 6}, units=units, outputs=OUTPUTS, weights=export_weights(model))
+
+    inputs = {'index': np.eye(6, dtype=np.float32)}
+    expected = model(inputs)
+    actual = numpy_model(inputs)
+    for key in OUTPUTS:
+        np.testing.assert_allclose(actual[key], np.asarray(expected[key]), rtol=1e-5, atol=1e-5)
+
+
+def test_numpy_platts_matches_tensorflow_on_the_shipped_checkpoint(tmp_path, monkeypatch):
+    checkpoint = f"{weight_store.MODEL_WEIGHTS_DIRECTORY}/platts-1.0.0-v2"
+    # the artifact is written next to a copy of the checkpoint, not into core/data
+    for path in [f"{checkpoint}.index", f"{checkpoint}.data-00000-of-00001"]:
+        shutil.copy(path, tmp_path)
+    monkeypatch.setattr(weight_store, "MODEL_WEIGHTS_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(weight_store, "_artifacts", {})
+    monkeypatch.setattr(loader, "MODEL_BACKEND", "numpy")
+
+    # 6 indexes in, 2x300 hidden units, 7 outputs
+    units = {'hidden': [300, 300]}
+    outputs = {'beta': ['eua', 'co2', 'brent', 'treasury', 'gas', 'coal'], 'sigma': ['sigma']}
+    numpy_model = loader.load_model("Platts", inputs={'index': 6}, units=units, outputs=outputs, weights="platts-1.0.0-v2")
+    assert isinstance(numpy_model, NumpyPlatts)
+
+    model = Platts(inputs={'index': 6}, units=units, outputs=outputs)
+    model.load_weights(checkpoint).expect_partial()
+    model.warmup()
+    # both sides hold the trained weights, not a fresh initialisation
+    reader = tf.train.load_checkpoint(checkpoint)
+    np.testing.assert_array_equal(model._layers[0].kernel.numpy(), reader.get_tensor("_layers/0/kernel/.ATTRIBUTES/VARIABLE_VALUE"))
+
+    rng = np.random.default_rng(7)
+    for inputs in [np.eye(6, dtype=np.float32), rng.integers(0, 2, (100, 6)).astype(np.float32)]:
+        expected = model({'index': inputs})
+        actual = numpy_model({'index': inputs})
+        for key in outputs:
+            np.testing.assert_allclose(actual[key], np.asarray(expected[key]), rtol=1e-5, atol=1e-6)
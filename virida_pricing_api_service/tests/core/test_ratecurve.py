@@ -0,0 +1,29 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+
+from core.ratecurve import RatesCurve, rates_curve
+
+INTEREST_RATES = [{"tenor": "2Y", "rate": 0.03}, {"tenor": "1M", "rate": 0.005}, {"tenor": "6M", "rate": 0.015}, {"tenor": "10D", "rate": 0.001}]
+
+
+def test_get_rates_matches_get_rate():
+    curve = RatesCurve(valuation_date=dt.datetime(2021, 3, 1, 14, 30), currency='USD',
+                       tenor=[x["tenor"] for x in INTEREST_RATES], rate=[x["rate"] for x in INTEREST_RATES])
+    dates = [dt.datetime(2021, 3, 2), dt.datetime(2021, 3, 5), dt.datetime(2021, 6, 30), dt.datetime(2022, 12, 15), dt.datetime(2025, 1, 1)]
+
+    np.testing.assert_array_equal(curve.get_rates(dates), [curve.get_rate(date) for date in dates])
+    np.testing.assert_array_equal(curve.get_rates(np.array(dates, dtype="datetime64[D]")), [curve.get_rate(date) for date in dates])
+
+    with pytest.raises(Exception):
+        curve.get_rates([dt.datetime(2021, 3, 5), dt.datetime(2021, 3, 1)])
+
+
+def test_rates_curve_is_built_once_per_rates_and_currency():
+    curve = rates_curve('USD', INTEREST_RATES)
+
+    assert rates_curve('USD', [dict(x) for x in INTEREST_RATES]) is curve
+    assert rates_curve('EUR', INTEREST_RATES) is not curve
+    assert rates_curve('USD', INTEREST_RATES[:3]) is not curve
+    assert curve.abscissas[0] == 10 / 365.
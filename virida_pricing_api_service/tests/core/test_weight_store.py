@@ -0,0 +1,45 @@
+import numpy as np
+
+from core import weight_store
+
+
+def test_weight_store_round_trip_is_shared_and_read_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(weight_store, "MODEL_WEIGHTS_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(weight_store, "_artifacts", {})
+
+    arrays = {
+        "layer/0/kernel": np.random.rand(23, 5).astype(np.float32),
+        "layer/0/bias": np.random.rand(5).astype(np.float32)
+    }
+    weight_store.write("test-weights", arrays)
+
+    first = weight_store.get("test-weights")
+    second = weight_store.get("test-weights")
+
+    assert first is second
+    for key, array in arrays.items():
+        np.testing.assert_array_equal(first[key], array)
+        assert not first[key].flags.writeable
+        assert first[key].ctypes.data % 64 == 0
+
+
+def test_convert_reads_the_checkpoint_without_building_the_model(tmp_path, monkeypatch):
+    from core.models import ViridaPrices
+    from core.numpy_models import export_weights
+
+    monkeypatch.setattr(weight_store, "MODEL_WEIGHTS_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(weight_store, "_artifacts", {})
+    model = ViridaPrices(inputs={'project': 23, 'sdg': 17}, units={'input': 8, 'hidden': [8] * 2},
+                         outputs={'beta': ['eua', 'co2'], 'sigma': ['sigma']}, seed=7)
+    model.warmup()
+    model.save_weights(f"{tmp_path}/test-weights")
+    # an index with no data shard is left to the conversion on first use
+    (tmp_path / "index-only.index").write_bytes(b"")
+
+    assert weight_store.convert_all() == ["test-weights"]
+
+    arrays = weight_store.get("test-weights")
+    expected = export_weights(model)
+    assert sorted(arrays) == sorted(expected)
+    for key, array in expected.items():
+        np.testing.assert_array_equal(arrays[key], array)
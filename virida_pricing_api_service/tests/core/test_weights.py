@@ -0,0 +1,169 @@
+import time
+import datetime as dt
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud
+from core import weights
+from core.weights import ModelRegistry
+from database import Base
+from models import ModelConfig, ModelConfigGeneration, HistoryCache
+from schemas.model_config import ModelConfig as ModelConfigSchema
+
+CONFIG = {
+    "class": "ViridaPrices",
+    "inputs": {"project": 23},
+    "structure": {"input": 800},
+    "outputs": {"beta": ["eua", "co2"]},
+    "weights": "v7.0.7.12",
+    "drift": 0.01
+}
+
+
+def sqlite_session_factory(path):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine, tables=[ModelConfig.__table__, ModelConfigGeneration.__table__, HistoryCache.__table__])
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    @contextmanager
+    def session():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    return session
+
+
+def wait_for_reload(registry):
+    deadline = time.time() + 5
+    while registry.status()["reloading"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert not registry.status()["reloading"]
+
+
+def test_config_rows_sharing_weights_reuse_one_model():
+    registry = ModelRegistry(build=lambda row: object())
+
+    row = {"class": "ViridaPrices", "inputs": {}, "structure": {}, "outputs": {}, "weights": "v7.0.7.12"}
+    df = pd.DataFrame([
+        {**row, "drift": 0.01},
+        {**row, "drift": 0.02},
+        {**row, "weights": "v7.0.7.11", "drift": 0.02}
+    ])
+    models = df.apply(lambda row: registry._model(row), axis=1)
+
+    assert models[0] is models[1]
+    assert models[0] is not models[2]
+    assert len(registry.instances) == 2
+
+
+def test_frames_expand_config_per_model():
+    configs = [
+        SimpleNamespace(date=dt.date(2021, 1, 1), model_name="virida", model_version="7.0.7", config=CONFIG),
+        SimpleNamespace(date=dt.date(2021, 1, 1), model_name="platts", model_version="1.0.0", config={"index": {"a": 1}}),
+        SimpleNamespace(date=dt.date(2021, 2, 1), model_name="virida", model_version="7.0.7", config={"drift": 0.02})
+    ]
+    frames = {(df.iloc[0]["name"], df.iloc[0]["version"]): df for df in weights._frames(configs)}
+
+    virida = frames[("virida", "7.0.7")]
+    assert "index" not in virida.columns
+    assert list(virida["drift"]) == [0.01, 0.02]
+    assert virida.iloc[1]["inputs"] == {"project": 23}
+    assert frames[("platts", "1.0.0")].iloc[0]["index"] == {"a": 1}
+
+
+def test_metadata_is_parsed_once_per_distinct_config():
+    configs = [
+        SimpleNamespace(date=dt.date(2021, 1, day), model_name="virida", model_version="7.0.7", config=config)
+        for day, config in [(1, CONFIG), (2, CONFIG), (3, {**CONFIG, "drift": 0.02})]
+    ]
+    df = weights._frames(configs)[0]
+    cache = {}
+    metadata = list(df.apply(lambda row: weights._metadata(row, cache), axis=1))
+
+    assert metadata[0] is metadata[1]
+    assert metadata[1] is not metadata[2]
+    assert metadata[0].benchmarks == ["eua", "co2"]
+    assert metadata[2].drift == 0.02
+    assert metadata[0].corsia_min_year is None
+
+
+def test_reload_runs_in_background_and_coalesces(monkeypatch):
+    registry = ModelRegistry(build=lambda row: object())
+    calls = []
+
+    def swap():
+        time.sleep(0.1)
+        calls.append(1)
+
+    monkeypatch.setattr(registry, "_swap", swap)
+
+    for _ in range(3):
+        registry.reload()
+    assert not calls
+
+    wait_for_reload(registry)
+    assert 1 <= len(calls) <= 2
+
+
+def test_config_change_on_one_instance_is_picked_up_by_another(tmp_path):
+    session = sqlite_session_factory(tmp_path / "weights.db")
+    with session() as db:
+        crud.model_config.create(db, ModelConfigSchema(
+            date=dt.date(2021, 1, 1), model_name="virida", model_version="7.0.7", config=CONFIG
+        ))
+
+    first = ModelRegistry(session_factory=session, build=lambda row: object())
+    second = ModelRegistry(session_factory=session, build=lambda row: object())
+    first.load()
+    second.load()
+    assert not second.poll()
+
+    # a config-only change made through the first instance
+    with session() as db:
+        crud.model_config.create(db, ModelConfigSchema(
+            date=dt.date(2021, 6, 1), model_name="virida", model_version="7.0.7", config={**CONFIG, "drift": 0.02}
+        ))
+
+    assert second.poll()
+    wait_for_reload(second)
+
+    df = second.get("virida", "7.0.7", dt.date(2021, 5, 1), dt.date(2021, 7, 1))
+    assert list(df["drift"]) == [0.01, 0.02]
+    assert df.iloc[0]["outputs"] == {"beta": ["eua", "co2"]}
+    assert df.iloc[0]["model"] is df.iloc[1]["model"]
+    assert second.status()["generation"] == 2
+    assert second.status()["version"] == 2
+
+
+def test_poll_purges_history_cache_rows_of_other_generations(tmp_path):
+    session = sqlite_session_factory(tmp_path / "weights.db")
+    with session() as db:
+        crud.model_config.create(db, ModelConfigSchema(
+            date=dt.date(2021, 1, 1), model_name="virida", model_version="7.0.7", config=CONFIG
+        ))
+    registry = ModelRegistry(session_factory=session, build=lambda row: object())
+    registry.load()
+
+    with session() as db:
+        crud.model_config.create(db, ModelConfigSchema(
+            date=dt.date(2021, 6, 1), model_name="virida", model_version="7.0.7", config={**CONFIG, "drift": 0.02}
+        ))
+        generation = crud.model_config.read_generation(db)
+        # written after the model_config write by a pod still on its previous snapshot
+        crud.history_cache.create(db, [
+            {"model_name": "platts", "model_version": "1.0.0", "generation": g, "scenario": "a", "date": dt.date(2021, 1, 4), "mid": 1.}
+            for g in [generation - 1, generation]
+        ])
+
+    assert registry.poll()
+    wait_for_reload(registry)
+
+    with session() as db:
+        assert [row.generation for row in db.query(HistoryCache).all()] == [generation]
@@ -0,0 +1,62 @@
+import datetime as dt
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.mysql import DOUBLE
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+import crud
+from database import Base
+from models import BenchmarkIndex, HistoryCache, InterestCurve
+from schemas.benchmark_index import BenchmarkIndex as BenchmarkIndexSchema
+from schemas.interest_curve import InterestCurve as InterestCurveSchema
+
+
+@compiles(DOUBLE, "sqlite")
+def sqlite_double(type_, compiler, **kwargs):
+    return "REAL"
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[BenchmarkIndex.__table__, InterestCurve.__table__, HistoryCache.__table__])
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+def indexes(value: float) -> list:
+    return [BenchmarkIndexSchema(date=dt.date(2021, 1, 1) + dt.timedelta(days=day), benchmark=benchmark, value=value + day)
+            for day in range(30) for benchmark in ("eua", "co2")]
+
+
+def test_benchmark_index_upsert_writes_rows_in_one_statement_and_reruns(db):
+    inserts = []
+
+    def count(conn, cursor, statement, *args):
+        if statement.startswith("INSERT"):
+            inserts.append(statement)
+
+    event.listen(db.get_bind(), "before_cursor_execute", count)
+    crud.benchmark_index.upsert(db, indexes(1.))
+    crud.benchmark_index.upsert(db, indexes(2.)[10:])
+    event.remove(db.get_bind(), "before_cursor_execute", count)
+
+    assert len(inserts) == 2
+    rows = {(row.date, row.benchmark): row.value for row in db.query(BenchmarkIndex).all()}
+    assert len(rows) == 60
+    assert rows[(dt.date(2021, 1, 5), "co2")] == 5.
+    assert rows[(dt.date(2021, 1, 6), "co2")] == 7.
+
+
+def test_interest_curve_upsert_is_one_transaction_with_the_caller(db):
+    curve = InterestCurveSchema(date=dt.date(2021, 1, 4), curve="eua_curve", value={"times": [0.5], "rates": [0.01]})
+    crud.interest_curve.upsert(db, [curve], commit=False)
+    db.rollback()
+    assert db.query(InterestCurve).count() == 0
+
+    crud.interest_curve.upsert(db, [curve])
+    crud.interest_curve.upsert(db, [InterestCurveSchema(date=curve.date, curve=curve.curve, value={"times": [1.], "rates": [0.02]})])
+    assert [row.value for row in db.query(InterestCurve).all()] == [{"times": [1.], "rates": [0.02]}]
@@ -0,0 +1,26 @@
+import io
+import datetime as dt
+
+import numpy as np
+import pytest
+
+from helpers.columnar import columnar_response, ARROW_MEDIA_TYPE, PARQUET_MEDIA_TYPE
+
+pa = pytest.importorskip("pyarrow")
+
+
+def test_columnar_response_round_trip():
+    columns = {
+        "scenario": np.array([0, 0, 2]),
+        "date": np.array([dt.date(2021, 1, 1), dt.date(2021, 1, 2), dt.date(2021, 1, 1)], dtype="datetime64[D]"),
+        "bid": np.array([1.5, np.nan, 2.5])
+    }
+
+    arrow = pa.ipc.open_stream(columnar_response(columns, ARROW_MEDIA_TYPE).body).read_all()
+    import pyarrow.parquet as pq
+    parquet = pq.read_table(io.BytesIO(columnar_response(columns, PARQUET_MEDIA_TYPE).body))
+
+    for table in (arrow, parquet):
+        assert table.column("scenario").to_pylist() == [0, 0, 2]
+        assert table.column("date").to_pylist() == [dt.date(2021, 1, 1), dt.date(2021, 1, 2), dt.date(2021, 1, 1)]
+        assert table.column("bid").to_pylist() == [1.5, None, 2.5]
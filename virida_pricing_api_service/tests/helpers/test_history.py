@@ -0,0 +1,260 @@
+import datetime as dt
+import json
+
+import numpy as np
+import pandas as pd
+
+from core.interpolate import Interpolate
+from core import drift
+from core.drift import MappingColumns
+from core.weights import ModelMetadata
+from helpers.history import price_vre_history, price_platts_history, run_models, serialize_vre_history, \
+    serialize_platts_history, ndjson_lines, history_columns, vintage_discount, VRE_FIELDS
+from schemas.project import Project, ProjectPricing
+
+BENCHMARKS = ["eua", "co2", "brent", "treasury"]
+# one-hot column order of the test mappings (version 3), 23 project classes as the deployed v7 models
+COLUMNS = MappingColumns(
+    project=tuple(["afolu.01", "afolu.02", "afolu.03"] + [f"ga.0{i}" for i in range(1, 10)] + [f"re.{i:02d}" for i in range(1, 12)]),
+    sdg=tuple(str(sdg) for sdg in range(1, 18))
+)
+DAYS, PROJECTS = 30, 6
+
+
+def history_frame(rng, metadata: list, projects: int = PROJECTS) -> pd.DataFrame:
+    dates = [dt.date(2021, 1, 1) + dt.timedelta(days=i) for i in range(DAYS)]
+    df = pd.DataFrame(index=dates)
+    df["metadata"] = [metadata[i * len(metadata) // DAYS] for i in range(DAYS)]
+    df["output"] = [{
+        "beta": rng.uniform(0, 2, (projects, 4)).astype(np.float32),
+        "sigma": rng.uniform(0, 1, (projects, 1)).astype(np.float32)
+    } for _ in range(DAYS)]
+    for benchmark in BENCHMARKS:
+        df[benchmark] = rng.uniform(10, 50, DAYS)
+    df["BID"] = rng.uniform(5, 10, DAYS)
+    df["ASK"] = df["BID"] + 1
+    df["eua_curve"] = [{"times": [0.1, 0.5, 1., 2., 5.], "rates": list(rng.uniform(0, 0.05, 5))}] * DAYS
+    return df
+
+
+def metadata(rng, bid_ask_spread: float) -> ModelMetadata:
+    return ModelMetadata(
+        benchmarks=BENCHMARKS,
+        drift={
+            "project": {"afolu.01": rng.uniform(0.8, 1.2), "re.01": rng.uniform(0.8, 1.2)},
+            "sdg": {"13": rng.uniform(0.9, 1.1), "7": rng.uniform(0.9, 1.1)},
+            "1": rng.uniform(0.9, 1.1)
+        },
+        vintage_discount_factors={"afolu": rng.uniform(-0.1, 0), "re": rng.uniform(-0.1, 0)},
+        corsia_min_year=2016,
+        bid_ask_spread=bid_ask_spread,
+        weights="weights"
+    )
+
+
+def scalar_mid(row: pd.Series, position: int, project_pricing: ProjectPricing) -> float:
+    """ The per-row formula the engine replaces (spot, non-CORSIA) """
+    metadata = row["metadata"]
+    beta = row["output"]["beta"][position]
+    sigma = np.asarray(row["output"]["sigma"])[position]
+    B = np.sum(np.multiply(beta, [row[benchmark] for benchmark in metadata.benchmarks]))
+    S = np.exp((sigma ** 2.) / 2.)
+    project = project_pricing.project
+    t = (dt.datetime.now() - dt.datetime(int(project.vintage), 12, 31, 23, 59)).days / 365
+    vintage_discount_factor = np.average(
+        [np.exp(metadata.vintage_discount_factors[x.split('.')[0]] * t) for x in project.project]
+    )
+    drift = np.mean([metadata.drift["project"][x] for x in project.project]) * np.prod([metadata.drift["sdg"][x] for x in project.sdg])
+    return float(vintage_discount_factor * B * S * drift)
+
+
+def test_vre_history_matches_per_row_formula():
+    rng = np.random.default_rng(1)
+    df = history_frame(rng, [metadata(rng, 0.2), metadata(rng, 0.)])
+    project_pricings = [
+        ProjectPricing.construct(
+            project=Project.construct(project=["afolu.01", "re.01"][:1 + i % 2], sdg=["7", "13"], vintage=str(2015 + i), corsia=0),
+            horizon="spot"
+        ) for i in range(PROJECTS)
+    ]
+
+    history = price_vre_history(df, project_pricings)
+    results = history.fields
+
+    for position, project_pricing in enumerate(project_pricings):
+        expected = [scalar_mid(row, position, project_pricing) for _, row in df.iterrows()]
+        np.testing.assert_array_equal(results["mid"][:, position], expected)
+    assert np.all(results["interest_rate"] == 0)
+    assert np.all(results["bid"][DAYS // 2:] == results["mid"][DAYS // 2:])
+    assert np.all(results["bid"][:DAYS // 2] < results["mid"][:DAYS // 2])
+
+
+def test_vre_history_forward_and_corsia():
+    rng = np.random.default_rng(2)
+    df = history_frame(rng, [metadata(rng, 0.2)], projects=2)
+    project_pricings = [
+        ProjectPricing.construct(project=Project.construct(project=["re.01"], sdg=["13"], vintage="2018", corsia=1), horizon="spot"),
+        ProjectPricing.construct(project=Project.construct(project=["re.01"], sdg=["13"], vintage="2018", corsia=0), horizon=dt.date(2023, 12, 1))
+    ]
+
+    history = price_vre_history(df, project_pricings)
+    results = history.fields
+
+    np.testing.assert_array_equal(results["bid"][:, 0], df["BID"])
+    np.testing.assert_array_equal(results["mid"][:, 0], 0.5 * (df["BID"] + df["ASK"]))
+    curve = df["eua_curve"].iloc[0]
+    expected = [Interpolate(curve["times"], curve["rates"])((dt.date(2023, 12, 1) - date).days / 365) for date in df.index]
+    np.testing.assert_array_equal(results["interest_rate"][:, 1], expected)
+
+
+def test_vre_history_discounted_when_read():
+    rng = np.random.default_rng(8)
+    df = history_frame(rng, [metadata(rng, 0.2), metadata(rng, 0.)], projects=3)
+    project_pricings = [
+        ProjectPricing.construct(project=Project.construct(project=["afolu.01", "re.01"], sdg=["13"], vintage="2016", corsia=0), horizon="spot"),
+        ProjectPricing.construct(project=Project.construct(project=["re.01"], sdg=["7"], vintage="2019", corsia=1), horizon="spot"),
+        ProjectPricing.construct(project=Project.construct(project=["afolu.01"], sdg=["13"], vintage="2020", corsia=0), horizon=dt.date(2023, 12, 1))
+    ]
+    now = dt.datetime(2021, 6, 1, 12)
+
+    expected = price_vre_history(df, project_pricings, now).fields
+    undiscounted = price_vre_history(df, project_pricings, now, discount=False).fields
+    factor = vintage_discount(df["metadata"], project_pricings, now)
+
+    assert np.all(factor[:, 1] == 1)
+    for field in ["mid", "bid", "ask"]:
+        np.testing.assert_allclose(undiscounted[field] * factor, expected[field], rtol=1e-6)
+
+
+def test_vre_history_reads_drifts_from_the_mapping_matrices(monkeypatch):
+    monkeypatch.setattr(drift, "_mapping_columns", {3: COLUMNS})
+    compiled = []
+    monkeypatch.setattr("helpers.history.batch_drifts", lambda *args: compiled.append(drift.batch_drifts(*args)) or compiled[-1])
+    rng = np.random.default_rng(7)
+    df = history_frame(rng, [metadata(rng, 0.2), metadata(rng, 0.)])
+    project_pricings = [
+        ProjectPricing.construct(
+            project=Project.construct(project=["afolu.01", "re.01"][:1 + i % 2], sdg=["7", "13", "13"][:1 + i % 3], vintage=str(2015 + i), corsia=0),
+            horizon="spot"
+        ) for i in range(PROJECTS)
+    ]
+    inputs = {
+        "project": np.array([[float(project in pricing.project.project) for project in COLUMNS.project] for pricing in project_pricings], dtype=np.float32),
+        "sdg": np.array([[pricing.project.sdg.count(sdg) for sdg in COLUMNS.sdg] for pricing in project_pricings], dtype=np.float32)
+    }
+
+    expected = price_vre_history(df, project_pricings).fields
+    results = price_vre_history(df, project_pricings, inputs=inputs).fields
+    assert len(compiled) == 2 and all(drifts is not None for drifts in compiled)
+
+    for field in VRE_FIELDS:
+        np.testing.assert_allclose(results[field], expected[field], rtol=1e-6)
+    np.testing.assert_allclose(results["drift"], expected["drift"], rtol=1e-15)
+
+
+def test_platts_history_matches_per_row_formula():
+    rng = np.random.default_rng(3)
+    df = history_frame(rng, [metadata(rng, 0.)])
+
+    mid = price_platts_history(df, ["1"] * PROJECTS).fields["mid"]
+
+    for position in range(PROJECTS):
+        expected = []
+        for _, row in df.iterrows():
+            beta = 0.0
+            for i, benchmark in enumerate(BENCHMARKS):
+                beta = beta + (row[benchmark] * float(row["output"]["beta"][position][i]))
+            sigma = np.exp((np.asarray(row["output"]["sigma"])[position] ** 2.) / 2.)
+            expected.append(float(beta * sigma * row["metadata"].drift["1"]))
+        np.testing.assert_array_equal(mid[:, position], expected)
+
+
+def test_run_models_runs_each_distinct_model_once():
+    first, second = object(), object()
+    models = pd.Series([first, first, second, first, second])
+    calls = []
+
+    def run(model):
+        calls.append(model)
+        return {"model": model}
+
+    outputs = run_models(models, run)
+
+    assert calls == [first, second]
+    assert [output["model"] for output in outputs] == list(models)
+    assert outputs[0] is outputs[1]
+
+
+def test_serialize_vre_history_reads_project_columns():
+    rng = np.random.default_rng(4)
+    df = history_frame(rng, [metadata(rng, 0.2)], projects=2)
+    df.loc[df.index[0], "eua"] = np.nan
+    df["corsia_date"] = df.index
+    project_pricings = [
+        ProjectPricing.construct(project=Project.construct(project=["re.01"], sdg=["13"], vintage="2018", corsia=0), horizon="spot")
+    ] * 2
+    history = price_vre_history(df, project_pricings)
+
+    assert history.valid_count() == 2 * (DAYS - 1)
+    records = serialize_vre_history(history, 1, corsia=0)
+    assert records[0] == {"date": df.index[0], "bid": None, "ask": None}
+    assert records[1]["bid"] == history.fields["bid"][1, 1]
+
+    verbose = serialize_vre_history(history, 1, corsia=1, verbose=True)[1]
+    assert verbose["indexes"] == df.loc[df.index[1], BENCHMARKS].to_dict()
+    assert verbose["beta"] == {name: float(value) for name, value in zip(BENCHMARKS, df["output"].iloc[1]["beta"][1])}
+    assert verbose["sigma"] == float(df["output"].iloc[1]["sigma"][1][0])
+    assert verbose["mid"] == history.fields["mid"][1, 1]
+    assert verbose["bid_ask_spread"] == 0.2
+    assert verbose["corsia"] == {"date": df.index[1]}
+    assert verbose["drift_breakdown"]["project"] == history.fields["project_drift"][1, 1]
+
+
+def test_serialize_platts_history():
+    rng = np.random.default_rng(5)
+    df = history_frame(rng, [metadata(rng, 0.)])
+    history = price_platts_history(df, ["1"] * PROJECTS)
+
+    records = serialize_platts_history(history, 3, verbose=True)
+
+    assert [record["price"] for record in records] == list(history.fields["mid"][:, 3])
+    assert records[0]["drift"] == df["metadata"].iloc[0].drift["1"]
+    assert records[0]["weights"] == "weights"
+
+
+def test_ndjson_lines_encodes_records_one_at_a_time():
+    pulled = []
+
+    def records():
+        for i in range(3):
+            pulled.append(i)
+            yield {"project": Project.construct(project=["re.01"], vintage="2018"), "history": [{"date": dt.date(2021, 1, i + 1), "bid": None}]}
+
+    lines = ndjson_lines(records())
+
+    first = next(lines)
+    assert pulled == [0]
+    assert first.endswith("\n") and "\n" not in first[:-1]
+    record = json.loads(first)
+    assert record["project"]["project"] == ["re.01"]
+    assert record["history"] == [{"date": "2021-01-01", "bid": None}]
+    assert len(list(lines)) == 2
+
+
+def test_history_columns_are_long_format():
+    rng = np.random.default_rng(6)
+    df = history_frame(rng, [metadata(rng, 0.2)], projects=2)
+    project_pricings = [
+        ProjectPricing.construct(project=Project.construct(project=["re.01"], sdg=["13"], vintage="2018", corsia=0), horizon="spot")
+    ] * 2
+    history = price_vre_history(df, project_pricings)
+
+    columns = history_columns(history, [1, 3], verbose=True)
+
+    assert list(columns["scenario"]) == [1] * DAYS + [3] * DAYS
+    assert list(columns["date"][DAYS:]) == list(np.array(df.index, dtype="datetime64[D]"))
+    np.testing.assert_array_equal(columns["bid"][DAYS:], history.fields["bid"][:, 1])
+    np.testing.assert_array_equal(columns["sigma"][:DAYS], history.sigma[:, 0])
+    assert set(columns) == {"scenario", "date", "bid", "ask", "mid", "vintage_discount_factor", "drift", "project_drift",
+                            "sdg_drift", "interest_rate", "sigma", "weights", "bid_ask_spread"}
+    assert all(len(values) == 2 * DAYS for values in columns.values())
@@ -0,0 +1,140 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.mysql import DOUBLE
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+import crud
+from database import Base
+from helpers.history import History
+from helpers.history_cache import cached_history
+from models import BenchmarkIndex, HistoryCache, InterestCurve, ModelConfigGeneration, StandardizedInstrument
+from schemas.benchmark_index import BenchmarkIndex as BenchmarkIndexSchema
+from schemas.standardized_instrument import InstrumentType
+
+FIRST_DATE = dt.date(2021, 1, 1)
+SYSTEM_DATE = dt.date(2021, 3, 1)
+
+
+@compiles(DOUBLE, "sqlite")
+def sqlite_double(type_, compiler, **kwargs):
+    return "REAL"
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[
+        BenchmarkIndex.__table__, HistoryCache.__table__, InterestCurve.__table__, ModelConfigGeneration.__table__,
+        StandardizedInstrument.__table__
+    ])
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(ModelConfigGeneration(id=1, generation=1))
+    for day in range(59):
+        date = FIRST_DATE + dt.timedelta(days=day)
+        session.add(BenchmarkIndex(date=date, benchmark="eua", value=20. + day))
+        # sparse series: prices before its first row in a window are back filled, after it forward filled
+        if day % 7 == 3:
+            session.add(BenchmarkIndex(date=date, benchmark="co2", value=400. + day))
+        if day % 7 < 5:
+            session.add(StandardizedInstrument(instrument="CET", source="ACX", date=date, type=InstrumentType.BID, price=5. + day))
+            session.add(StandardizedInstrument(instrument="CET", source="ACX", date=date, type=InstrumentType.ASK, price=6. + day))
+        if day % 7 == 1:
+            session.add(InterestCurve(date=date, curve="eua_curve", value={"times": [1., 2.], "rates": [0.01 * day, 0.02]}))
+    session.commit()
+    yield session
+    session.close()
+
+
+class Pricer:
+    def __init__(self, db):
+        self.db = db
+        self.windows = []
+
+    def __call__(self, start_date: dt.date, end_date: dt.date) -> History:
+        self.windows.append((start_date, end_date))
+        df = crud.benchmark_index.read_dataframe(self.db, start_date, end_date)
+        mid = (df["eua"] * df["co2"]).to_numpy()[:, None] * np.array([1., 2.])
+        return History(list(df.index), {"mid": np.asfortranarray(mid)}, [], None, None, None, None, [None] * len(df))
+
+
+class VrePricer(Pricer):
+    def __call__(self, start_date: dt.date, end_date: dt.date) -> History:
+        self.windows.append((start_date, end_date))
+        df = pd.concat([
+            crud.benchmark_index.read_dataframe(self.db, start_date, end_date),
+            crud.standardized_instrument.read_dataframe(self.db, start_date, end_date),
+            crud.interest_curve.read_dataframe(self.db, start_date, end_date)
+        ], axis=1)
+        rate = np.array([curve["rates"][0] for curve in df["eua_curve"]])
+        mid = (df["eua"] * (1 + rate)).to_numpy()[:, None] * np.array([1., 2.])
+        fields = {"mid": mid, "bid": mid - df["BID"].to_numpy()[:, None], "ask": mid + df["ASK"].to_numpy()[:, None]}
+        return History(list(df.index), {field: np.asfortranarray(value) for field, value in fields.items()}, [], None, None, None, None, [None] * len(df))
+
+
+def history(db, pricer, start_date, end_date):
+    return cached_history(db, "platts", "1.0.0", 1, ["a", "b"], start_date, end_date, SYSTEM_DATE, pricer, platts=True)
+
+
+def vre_history(db, pricer, start_date, end_date):
+    return cached_history(db, "vre", "1.0.0", 1, ["a", "b"], start_date, end_date, SYSTEM_DATE, pricer)
+
+
+def test_cached_history_matches_full_computation(db):
+    start_date, end_date = dt.date(2021, 1, 2), dt.date(2021, 2, 10)
+    expected = Pricer(db)(start_date, end_date).fields["mid"]
+
+    pricer = Pricer(db)
+    np.testing.assert_array_equal(history(db, pricer, start_date, end_date).fields["mid"], expected)
+
+    # only the leading back filled dates are priced again
+    pricer = Pricer(db)
+    np.testing.assert_array_equal(history(db, pricer, start_date, end_date).fields["mid"], expected)
+    assert pricer.windows == [(start_date, dt.date(2021, 1, 4))]
+
+    # a longer range only prices the new days, from the last rows they are forward filled from
+    pricer = Pricer(db)
+    end_date = dt.date(2021, 2, 20)
+    np.testing.assert_array_equal(history(db, pricer, start_date, end_date).fields["mid"], Pricer(db)(start_date, end_date).fields["mid"])
+    assert pricer.windows[-1] == (dt.date(2021, 2, 8), end_date)
+
+
+def test_support_data_write_invalidates_later_dates(db):
+    start_date, end_date = dt.date(2021, 1, 4), dt.date(2021, 2, 10)
+    history(db, Pricer(db), start_date, end_date)
+
+    crud.benchmark_index.create(db, BenchmarkIndexSchema(date=dt.date(2021, 1, 20), benchmark="co2", value=500.))
+    assert db.query(HistoryCache).filter(HistoryCache.date >= dt.date(2021, 1, 20)).count() == 0
+    assert db.query(HistoryCache).count() == 2 * 16
+
+    pricer = Pricer(db)
+    np.testing.assert_array_equal(history(db, pricer, start_date, end_date).fields["mid"], Pricer(db)(start_date, end_date).fields["mid"])
+    assert pricer.windows == [(dt.date(2021, 1, 20), end_date)]
+
+
+def test_vre_cached_history_reads_every_support_series(db):
+    start_date, end_date = dt.date(2021, 1, 3), dt.date(2021, 2, 10)
+    expected = VrePricer(db)(start_date, end_date).fields
+
+    for _ in range(2):
+        pricer = VrePricer(db)
+        results = vre_history(db, pricer, start_date, end_date).fields
+        for field in ["mid", "bid", "ask"]:
+            np.testing.assert_array_equal(results[field], expected[field])
+
+    # the curve is the sparsest series: the dates before its first row in the window are priced again
+    assert pricer.windows == [(start_date, dt.date(2021, 1, 9))]
+    assert crud.standardized_instrument.read_latest_bid_ask(db) == (63., 64., dt.date(2021, 2, 28))
+
+
+def test_superseded_generation_is_not_cached(db):
+    start_date, end_date = dt.date(2021, 1, 4), dt.date(2021, 2, 10)
+    # a pod still pricing from its previous snapshot after a model_config write
+    stale = cached_history(db, "platts", "1.0.0", 0, ["a", "b"], start_date, end_date, SYSTEM_DATE, Pricer(db), platts=True)
+
+    np.testing.assert_array_equal(stale.fields["mid"], Pricer(db)(start_date, end_date).fields["mid"])
+    assert db.query(HistoryCache).count() == 0
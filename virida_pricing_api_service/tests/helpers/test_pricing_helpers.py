@@ -2,10 +2,16 @@ from typing import List
 from aiohttp import ClientSession
 from fastapi import status
 from pydantic import parse_obj_as
+import datetime as dt
+import numpy as np
 import pytest
 
-from helpers.pricing import get_mappings
-from schemas.project import ProjectPricing
+from core.static import VINTAGE_PROJECT_CATEGORY_DISCOUNT_FACTORS
+from core import drift
+from core.drift import MappingColumns
+from helpers import pricing
+from helpers.pricing import get_mappings, load_mapping_columns, _model_drifts, _vintage_discount_factors
+from schemas.project import Project, ProjectPricing
 from schemas.api_key import AuthDetail, AuthType
 
 
@@ -58,3 +64,63 @@ async def test_get_mappings_for_valid_and_invalid_pricings(aiohttp_session: Clie
         project_pricings=parsed_pricings
     )
     assert status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_batch_drifts_and_vintage_discount_factors_match_per_project_formulas():
+    drift = {"project": {"afolu.01": 0.9, "re.01": 1.1, "ga.02": 1.05}, "sdg": {"7": 1.02, "13": 0.97, "15": 1.01}}
+    project_pricings = [
+        ProjectPricing.construct(project=Project.construct(project=projects, sdg=sdgs, vintage=vintage), horizon="spot")
+        for projects, sdgs, vintage in [(["re.01"], ["13"], "2018"), (["afolu.01", "ga.02", "re.01"], ["7", "13", "15"], "2014"), (["ga.02"], [], "2020")]
+    ]
+
+    # mappings narrower than the drift table take the per-project lookups
+    project_drift, sdg_drift = _model_drifts(project_pricings, drift, {"project": np.ones((3, 1)), "sdg": np.ones((3, 1))})
+    vintage_discount_factor = _vintage_discount_factors(project_pricings, "model", False)
+
+    for i, project_pricing in enumerate(project_pricings):
+        project = project_pricing.project
+        assert project_drift[i] == np.mean([drift["project"][x] for x in project.project])
+        assert sdg_drift[i] == np.prod([drift["sdg"][x] for x in project.sdg])
+        t = (dt.datetime.now() - dt.datetime(int(project.vintage), 12, 31, 23, 59)).days / 365
+        expected = np.average([np.exp(VINTAGE_PROJECT_CATEGORY_DISCOUNT_FACTORS[x.split('.')[0]] * t) for x in project.project])
+        assert vintage_discount_factor[i] == expected
+
+
+def test_model_drifts_take_the_compiled_table_at_the_deployed_width(monkeypatch):
+    columns = MappingColumns(project=tuple(f"ga.{i:02d}" for i in range(1, 24)), sdg=tuple(str(sdg) for sdg in range(1, 18)))
+    monkeypatch.setattr(drift, "_mapping_columns", {3: columns})
+    monkeypatch.setattr(pricing, "batch_drifts", lambda *args: drift.batch_drifts(*args) or pytest.fail("fell back to the lookups"))
+    vre_model_drift = {"project": {x: 1. + i / 100 for i, x in enumerate(columns.project)}, "sdg": {x: 1. - i / 100 for i, x in enumerate(columns.sdg)}}
+    project_pricings = [
+        ProjectPricing.construct(project=Project.construct(project=projects, sdg=sdgs, vintage="2018"), horizon="spot")
+        for projects, sdgs in [(["ga.01"], ["13"]), (["ga.05", "ga.23"], ["7", "13"])]
+    ]
+    inputs = {
+        "project": np.array([[float(x in p.project.project) for x in columns.project] for p in project_pricings], dtype=np.float32),
+        "sdg": np.array([[float(x in p.project.sdg) for x in columns.sdg] for p in project_pricings], dtype=np.float32)
+    }
+
+    project_drift, sdg_drift = _model_drifts(project_pricings, vre_model_drift, inputs)
+
+    np.testing.assert_allclose(project_drift, [1., (1.04 + 1.22) / 2], rtol=1e-15)
+    np.testing.assert_allclose(sdg_drift, [0.88, 0.94 * 0.88], rtol=1e-15)
+
+
+@pytest.mark.asyncio
+async def test_load_mapping_columns_reads_each_version_once(monkeypatch):
+    monkeypatch.setattr(drift, "_mapping_columns", {})
+    urls = []
+
+    async def get(session, url, headers=None):
+        urls.append(url)
+        return status.HTTP_200_OK, ["b", "a"] if "/project/" in url else ["13"]
+
+    monkeypatch.setattr(pricing.httpclient, "get", get)
+    project_pricings = [ProjectPricing.construct(project=Project.construct(version=3), horizon="spot")] * 2
+    auth_detail = AuthDetail(type=AuthType.API_KEY, value="key", decoded={})
+
+    await load_mapping_columns(None, auth_detail, project_pricings)
+    await load_mapping_columns(None, auth_detail, project_pricings)
+
+    assert drift.mapping_columns(3) == MappingColumns(project=("b", "a"), sdg=("13",))
+    assert [url.rsplit("/attributes/", 1)[1] for url in urls] == ["project/columns?version=3", "sdg/columns?version=3"]
@@ -30,6 +30,18 @@ def get_attributes(attribute: str, version: Optional[int] = DEFAULT_MAPPING_VERS
     return [value.property for value in attributes]
 
 
+@router.get("/attributes/{attribute}/columns", response_model=List[str], dependencies=[Depends(authenticate)], tags=["static"])
+def get_attribute_columns(attribute: str, version: Optional[int] = DEFAULT_MAPPING_VERSION, db: Session = Depends(get_db)):
+    """
+    Properties of the attribute in the column order of its one-hot mapping, so consumers can align tables on the mapping
+    """
+    attributes = crud.static.read(db, attribute, version)
+    if not attributes:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Attribute does not exist")
+
+    return [value.property for value in sorted(attributes, key=lambda value: value.mapping.index("1"))]
+
+
 @router.post("/projects/validate", response_model=List[ProjectValidation], dependencies=[Depends(authenticate)], tags=["static"])
 async def validate_projects(projects: List[Project]):
     return [ProjectValidation(project=project, status="OK", description="") for project in projects]
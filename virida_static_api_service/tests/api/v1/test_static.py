@@ -17,6 +17,14 @@ def test_get_attributes(client: TestClient, attribute_name: str, authorization_h
     assert response_body is not None
 
 
+def test_get_attribute_columns(client: TestClient, authorization_header: dict):
+    response = client.get(f"{ATTRIBUTES_ROUTE}/project/columns", params={"version": 2}, headers=authorization_header)
+    assert response.status_code == status.HTTP_200_OK
+    columns = response.json()
+    assert len(columns) == 28
+    assert columns[:2] == ["afolu.01", "afolu.02"]
+
+
 def test_attribute_not_found(client: TestClient, random_string: str, authorization_header: dict):
     response = client.get(f"{ATTRIBUTES_ROUTE}/{random_string}", headers=authorization_header)
     assert response.status_code == status.HTTP_404_NOT_FOUND